@@ -1,8 +1,10 @@
 ## Builtin Modules
 from collections import namedtuple
+from enum import IntEnum
 from functools import wraps
 from inspect import signature
 import json
+import struct
 
 
 MAPSYMBOLS = {
@@ -39,6 +41,8 @@ DESTROYEDSTATE = {"S":None, "E":"e"}
 SOLIDENTITIES = ("B","W","G")
 
 Coordinate = namedtuple("coordinate", ["column", "row"])
+## Pickle looks up classes by __qualname__
+Coordinate.__qualname__ = "Coordinate"
 
 SPIKETRANS = {ord(k):ord(v) for k,v in {"P":"p","p":"P"}.items()}
 
@@ -56,6 +60,16 @@ LASERTRANS = {
     "3":"left",
 }
 
+## Binary snapshots (GameplaySequence.to_bytes) store each cell as a mask of these entities (bit i is ENTITYBITS[i])
+ENTITYBITS = tuple(symbol for symbol in MAPSYMBOLS if symbol.strip())
+## Actions are stored as one byte: the index of the direction, plus 4 if spikes caused damage
+ACTIONCODES = {**{direction: i for i, direction in enumerate(DIRECTIONTRANS)}, **{direction.upper(): i + 4 for i, direction in enumerate(DIRECTIONTRANS)}}
+ACTIONNAMES = {code: action for action, code in ACTIONCODES.items()}
+## magic, version, width, height, flags (1: SparseMap, 2: haskey), willpower, number of actions, number of GameplayRules
+SNAPSHOTHEADER = "<4sBHHBIIB"
+SNAPSHOTMAGIC = b"HTGS"
+SNAPSHOTVERSION = 1
+
 class Map():
     @classmethod
     def validategrid(cls, grid):
@@ -74,6 +88,14 @@ class Map():
             for row in grid
             ]
     @classmethod
+    def entitymask(cls, cell: str):
+        """ Returns the bitmask of the entities in the cell (see ENTITYBITS) """
+        return sum(1 << i for i, entity in enumerate(ENTITYBITS) if entity in cell)
+    @classmethod
+    def maskentities(cls, mask: int):
+        """ Returns the (sorted) entities of a cell from its bitmask """
+        return "".join(sorted(entity for i, entity in enumerate(ENTITYBITS) if mask & (1 << i)))
+    @classmethod
     def parsegridstring(cls, gridstring: str):
         return [list(line.split(",")) for line in gridstring.splitlines()]
     @classmethod
@@ -120,6 +142,10 @@ class Map():
         if isinstance(grid, str): grid = Map.parsegridstring(grid)
         Map.validategrid(grid)
         self.grid= Map.cleangrid(grid)
+        ## Callbacks which receive (event, data) for each change to the Map (see Map.notify)
+        self.observers = []
+        ## The entities of the cells changed while the Map is observed, before they were changed (see Map.touch)
+        self.touched = {}
 
     @property
     def width(self):
@@ -129,7 +155,7 @@ class Map():
         return len(self.grid)
 
     def copy(self):
-        return Map([list(row) for row in self.grid])
+        return type(self)([list(row) for row in self.grid])
 
     def capcoord(self, coordinate: Coordinate):
         try:
@@ -170,6 +196,21 @@ class Map():
     def getadjacent(self, coord: Coordinate):
         return [self.capcoord((coord.column+deltax, coord.row+deltay)) for (deltax, deltay) in DIRECTIONTRANS.values()]
 
+    def neighbour(self, coord: Coordinate, direction: str):
+        """ Returns the coordinate the Character would move into from coord in the given direction.
+
+            May return coordinates outside of the map (see direction_to_coord). Subclasses may return None
+                if nothing can ever be moved into the coordinate (see compiled.CompiledMap).
+        """
+        return Map.direction_to_coord(direction, coord)
+
+    def islasered(self, coord: Coordinate):
+        """ Returns the coordinate of the first laser whose beam covers coord (None if it is not in a beam) """
+        for lasertype in LASERTRANS:
+            for laser in self.findall(lasertype):
+                if coord in self.generatelaser(laser): return laser
+        return None
+
     def moveentity(self, entity: str, start: Coordinate, target: Coordinate):
         """ Move an entity from the start to the target coordinate.
                 If start coord is invalid, raise AttributeError.
@@ -193,6 +234,9 @@ class Map():
         t = self.capcoord(target)
         if t is None: return None
         if Map.isblocking(self.getentities(t)): return None
+        if self.observers:
+            self.touch(s)
+            self.touch(t)
         
         ## Move entity to target
         self.grid[t.row][t.column]+=entity
@@ -201,6 +245,22 @@ class Map():
         self.grid[s.row][s.column] = self.grid[s.row][s.column].replace(entity, "")
         return t
 
+    def notify(self, event: str, **data):
+        """ Calls each observer with the event name and a dict of its data.
+
+            Events: "moved", "kicked", "destroyed", "keytaken", "gateopened", "spikestoggled" and "lasered".
+            GameplaySequence adds "action", "diff", "victory" and "gameover".
+            Callers should check self.observers first so that unobserved Maps do no extra work.
+        """
+        for observer in self.observers:
+            observer(event, data)
+
+    def touch(self, coord: Coordinate):
+        """ Records the entities of a (capped) coordinate before they are changed, so that the diff sent to observers
+            only compares the cells which changed (see GameplaySequence.notifydiff). Callers should check self.observers first.
+        """
+        if coord not in self.touched: self.touched[coord] = self.getentities(coord)
+
     def kick(self, entity: str, start: Coordinate, target: Coordinate):
         """ Kicks an entity from the start coord to the target coord
                 entity must be KICKABLE.
@@ -216,9 +276,13 @@ class Map():
                 ## Replace the entity with it's destroyed state (if it has one)
                 if (newentity := DESTROYEDSTATE.get(entity)):
                     self.createentity(newentity, start)
+                if self.observers:
+                    self.notify("kicked", entity = entity, start = start, target = None)
+                    self.notify("destroyed", entity = entity, coord = start, cause = "kicked")
                 return None
             ## None means the entity did not move (so it's still at start)
             result = start
+        if self.observers: self.notify("kicked", entity = entity, start = start, target = result)
         return result
 
     def removeentity(self, entity: str, coord: Coordinate):
@@ -229,12 +293,16 @@ class Map():
         c = self.capcoord(coord)
         if c is None: raise AttributeError("Invalid coordinate: {coord}")
         if not self.coordcontains(c, entity): raise ValueError(f"Entity is not at target coordinate: Coord-{c} Entity-{entity} Entities at Coord-{self.grid[c.row][c.column]}")
+        if self.observers: self.touch(c)
         self.grid[c.row][c.column] = self.grid[c.row][c.column].replace(entity, "")
 
     def cyclespikes(self):
         """ Cycles all spikes between Active and Inactive"""
+        if self.observers:
+            for coord in self.findall("P") + self.findall("p"): self.touch(coord)
         for r,row in enumerate(self.grid):
             self.grid[r] = [column.translate(SPIKETRANS) for column in row]
+        if self.observers: self.notify("spikestoggled")
 
     def spikeskeletons(self):
         """ Iterates over the map destroying any Skeleton currently on Active Spikes """
@@ -242,6 +310,7 @@ class Map():
             ## This assumes that removeentity removes all of given entity from coord
             if self.coordcontains(coord,"S") and self.coordcontains(coord, "P"):
                 self.removeentity("S", coord)
+                if self.observers: self.notify("destroyed", entity = "S", coord = coord, cause = "spikes")
 
     def generatelaser(self, laser: Coordinate):
         """ Returns a list of coordinates which the laser occupies when active. """
@@ -264,6 +333,7 @@ class Map():
         """
         c = self.capcoord(coord)
         if c is None: raise RuntimeError("Invalid Coordinate")
+        if self.observers: self.touch(c)
         self.grid[c.row][c.column]+= entity
 
     def nearest_entity(self, coord: Coordinate, entity: str):
@@ -277,6 +347,16 @@ class Map():
             for c in range(len(self.grid[0])):
                 yield Coordinate(c,r)
 
+    def occupied(self):
+        """ Yields (coordinate, entities) for each cell which has entities, in row order.
+
+            SparseMap only visits its occupied cells, so this should be used instead of grid (or iterating
+                over the Map) when only the entities on the Map are needed.
+        """
+        for r, row in enumerate(self.grid):
+            for c, entities in enumerate(row):
+                if entities: yield Coordinate(c, r), entities
+
     def __eq__(self,other):
         if isinstance(other, Map):
             return Map.cleangrid(self.grid) == Map.cleangrid(other.grid)
@@ -285,8 +365,173 @@ class Map():
     def __str__(self):
         return "\n".join(" ".join(row) for row in self.grid)
 
-    
-    
+    def snapshot(self):
+        """ Returns an immutable copy of the entities on the Map which can be passed to restore """
+        return tuple(tuple(row) for row in self.grid)
+
+    def restore(self, snapshot):
+        """ Restores the entities from a snapshot (the Map object itself, and therefore references to it, is kept) """
+        self.grid[:] = [list(row) for row in snapshot]
+
+class SparseMap(Map):
+    """ A Map which only stores occupied cells, for very large levels which are mostly empty.
+
+        Cells are stored in a dict of {(column, row): entities}; memory and the cost of each action scale with
+            the number of entities rather than the area of the Map. The Map API is unchanged, except that grid is
+            built on demand and cannot be modified in place: grid and iterating over the Map visit every cell
+            (and so should be avoided in hot paths), while occupied only visits the stored cells.
+        A SparseMap can be created from a grid, a grid string (empty cells are skipped while parsing) or using fromcells.
+    """
+    @classmethod
+    def parsesparse(cls, gridstring: str):
+        """ Parses a grid string (see Map.parsegridstring), returning (width, height, cells) """
+        cells, width, height = {}, None, 0
+        for row, line in enumerate(gridstring.splitlines()):
+            height += 1
+            column = 0
+            for column, entities in enumerate(line.split(",")):
+                if (entities := entities.strip()): cells[(column, row)] = entities
+            if width is None: width = column + 1
+            elif width != column + 1: raise ValueError("Grid has rows with differing lengths")
+        return width, height, cells
+
+    @classmethod
+    def fromcells(cls, width: int, height: int, cells: dict):
+        """ Creates a SparseMap of the given size from a dict of {(column, row): entities} (empty cells are optional) """
+        _map = cls.__new__(cls)
+        _map.setcells(width, height, cells)
+        return _map
+
+    def __init__(self, grid):
+        if isinstance(grid, str):
+            width, height, cells = SparseMap.parsesparse(grid)
+        else:
+            if len(grid) == 0: raise AttributeError("Grid must have rows")
+            width, height = len(grid[0]), len(grid)
+            if any(len(row) != width for row in grid): raise ValueError("Grid has rows with differing lengths")
+            cells = {(c, r): entities for r, row in enumerate(grid) for c, entities in enumerate(row) if entities}
+        self.setcells(width, height, cells)
+
+    def setcells(self, width: int, height: int, cells: dict):
+        """ Validates and sets the size and cells of the Map """
+        if height == 0: raise AttributeError("Grid must have rows")
+        if width == 0: raise ValueError("Grid rows must have columns")
+        self._width, self._height = width, height
+        self.cells = {}
+        for coord, entities in cells.items():
+            if not (0 <= coord[0] < width and 0 <= coord[1] < height): raise ValueError(f"Cell is outside the grid: {coord}")
+            if (entities := "".join(sorted(entities.replace(" ", "")))): self.cells[Coordinate(*coord)] = entities
+        if sum(entities.count("C") for entities in self.cells.values()) != 1: raise ValueError("Grid must have exactly 1 Character")
+        ## Spikes never move, so they are indexed to avoid searching for them when they cycle
+        self.spikes = {coord for coord, entities in self.cells.items() if "P" in entities or "p" in entities}
+        self.observers = []
+        self.touched = {}
+
+    @property
+    def width(self):
+        return self._width
+    @property
+    def height(self):
+        return self._height
+
+    @property
+    def grid(self):
+        grid = [["" for c in range(self._width)] for r in range(self._height)]
+        for (c, r), entities in self.cells.items():
+            grid[r][c] = entities
+        return grid
+
+    def copy(self):
+        return type(self).fromcells(self._width, self._height, self.cells)
+
+    def getentities(self, coord: Coordinate):
+        c = self.capcoord(coord)
+        return self.cells.get(c, "")
+
+    def coordcontains(self, coord: Coordinate, entity: str):
+        c = self.capcoord(coord)
+        if c is None: raise ValueError(f"Invalid coordinate: {coord}")
+        return entity in self.cells.get(c, "")
+
+    def setentities(self, coord: Coordinate, entities: str):
+        if entities: self.cells[coord] = entities
+        else: self.cells.pop(coord, None)
+
+    def findcharacter(self):
+        return next(coord for coord, entities in self.cells.items() if "C" in entities)
+
+    def findall(self, entity: str):
+        return sorted((coord for coord, entities in self.cells.items() if entity in entities), key = lambda coord: (coord.row, coord.column))
+
+    def iskickable(self, coord: Coordinate):
+        c = self.capcoord(coord)
+        if c is None: return False
+        return [entity for entity in self.cells.get(c, "") if entity in KICKABLEENTITIES]
+
+    def moveentity(self, entity: str, start: Coordinate, target: Coordinate):
+        s = self.capcoord(start)
+        if s is None: raise AttributeError(f"Invalid start coordinate: {start}")
+        if entity not in (entities := self.cells.get(s, "")):
+            raise ValueError(f'Entity not at start coord: {start}[{s}]->"{entities}"')
+        if isinstance(target, str):
+            target = Map.direction_to_coord(target, s)
+        t = self.capcoord(target)
+        if t is None: return None
+        if Map.isblocking(self.cells.get(t, "")): return None
+        if self.observers:
+            self.touch(s)
+            self.touch(t)
+        self.cells[t] = self.cells.get(t, "") + entity
+        self.setentities(s, entities.replace(entity, ""))
+        return t
+
+    def removeentity(self, entity: str, coord: Coordinate):
+        c = self.capcoord(coord)
+        if c is None: raise AttributeError("Invalid coordinate: {coord}")
+        if entity not in (entities := self.cells.get(c, "")): raise ValueError(f"Entity is not at target coordinate: Coord-{c} Entity-{entity} Entities at Coord-{entities}")
+        if self.observers: self.touch(c)
+        self.setentities(c, entities.replace(entity, ""))
+
+    def createentity(self, entity: str, coord: Coordinate):
+        c = self.capcoord(coord)
+        if c is None: raise RuntimeError("Invalid Coordinate")
+        if self.observers: self.touch(c)
+        self.cells[c] = self.cells.get(c, "") + entity
+        if entity in ("P", "p"): self.spikes.add(c)
+
+    def cyclespikes(self):
+        if self.observers:
+            for coord in self.spikes: self.touch(coord)
+        for coord in self.spikes:
+            self.cells[coord] = self.cells[coord].translate(SPIKETRANS)
+        if self.observers: self.notify("spikestoggled")
+
+    def spikeskeletons(self):
+        for coord in self.spikes:
+            if "S" in (entities := self.cells[coord]) and "P" in entities:
+                self.removeentity("S", coord)
+                if self.observers: self.notify("destroyed", entity = "S", coord = coord, cause = "spikes")
+
+    def __iter__(self):
+        for r in range(self._height):
+            for c in range(self._width):
+                yield Coordinate(c,r)
+
+    def occupied(self):
+        for coord in sorted(self.cells, key = lambda coord: (coord.row, coord.column)):
+            yield coord, self.cells[coord]
+
+    def __eq__(self, other):
+        if isinstance(other, SparseMap):
+            return (self._width, self._height, self.cells) == (other._width, other._height, other.cells)
+        return super().__eq__(other)
+
+    def snapshot(self):
+        return tuple(self.cells.items())
+
+    def restore(self, snapshot):
+        self.cells = dict(snapshot)
+
 class Character():
     def __init__(self, coord: tuple, willpower: int, _map: Map = None):
         self.haskey = False
@@ -324,7 +569,9 @@ class Character():
     def move(self, target: Coordinate,  _map: Map = None):
         """ Character.move returns the final location of the character, or None if the character took no action (moved into wall/non-kickable area). """
         if isinstance(target,str):
-            target = _map.direction_to_coord(target, self.coord)
+            target = _map.neighbour(self.coord, target)
+            ## Nothing can ever be moved into the target
+            if target is None: return None
         t = _map.moveentity("C", self.coord, target)
         ## Character did not move
         if t is None:
@@ -336,11 +583,14 @@ class Character():
                 t = self.coord
             ## Check if stopped because of gate and we have key
             ## checking haskey first is faster than checking coordcontains
-            elif self.haskey and _map.coordcontains(target, "G"):
+            ## (target may be off the map, in which case coordcontains would raise)
+            elif self.haskey and _map.capcoord(target) and _map.coordcontains(target, "G"):
                 ## Unlock Gate and try moving again
                 _map.removeentity("G", target)
+                if _map.observers: _map.notify("gateopened", coord = target)
                 return self.move(target, _map = _map)
         else:
+            if _map.observers: _map.notify("moved", entity = "C", start = self.coord, target = t)
             ## Character moved, so update character.coord
             self.coord = t
         ## Check if capturing Key
@@ -348,6 +598,7 @@ class Character():
             ## Remove key from map and set haskey flag
             self.haskey = True
             _map.removeentity("K", self.coord)
+            if _map.observers: _map.notify("keytaken", coord = self.coord)
         ## Returning result because Not-Moving does not cost willpower/should not be considered an action.
         ## No action == None (only returned from moveentity; kickable targets will always return an action)
         return t
@@ -363,6 +614,34 @@ class Character():
         if not _map.iskickable(target_to_kick): raise ValueError(f"Cannot kick entity in square: {target_to_kick}")
         return _map.kick(entity, target_to_kick, _map.opposingcoord(self.coord, target_to_kick))
 
+class Status(IntEnum):
+    """ The result of GameplaySequence.step.
+
+        NOOP: no action was taken (e.g. moving into a Wall)
+        MOVED/KICKED: an action was taken which did/did not move the Character
+        VICTORY: a GameplayRule's victory condition was met
+        GAMEOVER_WILLPOWER/GAMEOVER_LASER: the Character ran out of Willpower/was lasered
+        GAMEOVER: a GameplayRule raised GameOver without a more specific Status
+    """
+    NOOP = 0
+    MOVED = 1
+    KICKED = 2
+    VICTORY = 3
+    GAMEOVER = 4
+    GAMEOVER_WILLPOWER = 5
+    GAMEOVER_LASER = 6
+
+    @property
+    def terminal(self):
+        return self >= Status.VICTORY
+
+    @property
+    def gameover(self):
+        return self >= Status.GAMEOVER
+
+## The outcome of a terminal GameplaySequence.step: its Status and the Victory/GameOver Exception raised (and its class)
+Outcome = namedtuple("Outcome", ["status", "type", "exception"])
+
 class GameplaySequence():
     """ An effective gameplay loop: provides interfaces to have the character take actions and updates the current gamestate with each action.
     
@@ -375,9 +654,17 @@ class GameplaySequence():
             add an action; kicking a Block that cannot be moved, however, still counts as an action even
             though it does not succeed.
         Movement through Active Spikes is recorded with ALL CAPS.
+        step is the non-raising equivalent of move: it returns a Status instead of raising Victory/GameOver
+            (outcome is set to an Outcome holding the Exception which was raised when the Status is terminal).
     """
-    class GameOver(RuntimeError): pass
-    class Victory(RuntimeError): pass
+    class GameEnd(RuntimeError):
+        """ Base class of GameOver and Victory: status is the Status which step reports for the Exception """
+        status = None
+        def __init__(self, *args, status: Status = None):
+            super().__init__(*args)
+            if status is not None: self.status = status
+    class GameOver(GameEnd): status = Status.GAMEOVER
+    class Victory(GameEnd): status = Status.VICTORY
 
     def loadfromjson(file):
         with open(file, 'r') as f:
@@ -393,8 +680,48 @@ class GameplaySequence():
         gp.character.haskey = gameplay.get("haskey", False)
         return gp
 
-    def __init__(self, mapgrid: list, willpower: int, rulesets: list = True):
-        self._init_map = Map(mapgrid)
+    def tojson(self):
+        """ Returns the gamestate as a dict in the format read by loadfromjson """
+        return dict(grid = self.map.grid, willpower = self.character.willpower, rules = self.rulenames(),
+                    actions = list(self.actions), haskey = self.character.haskey)
+
+    def savetojson(self, file):
+        """ Writes the gamestate to file in the format read by loadfromjson """
+        with open(file, 'w') as f:
+            json.dump(self.tojson(), f)
+
+    @classmethod
+    def from_bytes(cls, data: bytes):
+        """ Decodes a GameplaySequence encoded by to_bytes """
+        magic, version, width, height, flags, willpower, actions, rules = struct.unpack_from(SNAPSHOTHEADER, data)
+        if magic != SNAPSHOTMAGIC: raise ValueError("Data is not a GameplaySequence snapshot")
+        if version != SNAPSHOTVERSION: raise ValueError(f"Unsupported snapshot version: {version}")
+        offset = struct.calcsize(SNAPSHOTHEADER)
+        rulesets = []
+        for i in range(rules):
+            length = data[offset]
+            name = data[offset + 1: offset + 1 + length].decode()
+            if name not in AVAILABLERULES: raise ValueError(f"GameplayRule is not in AVAILABLERULES: {name}")
+            rulesets.append(AVAILABLERULES[name])
+            offset += 1 + length
+        if flags & 1:
+            (count,) = struct.unpack_from("<I", data, offset)
+            offset += 4
+            cells = {(c, r): Map.maskentities(mask) for c, r, mask in struct.iter_unpack("<HHH", data[offset: offset + 6 * count])}
+            offset += 6 * count
+            _map = SparseMap.fromcells(width, height, cells)
+        else:
+            masks = struct.unpack_from(f"<{width * height}H", data, offset)
+            offset += 2 * width * height
+            _map = Map([[Map.maskentities(mask) for mask in masks[r * width: (r + 1) * width]] for r in range(height)])
+        gp = cls(_map, willpower, rulesets = rulesets)
+        gp.actions = [ACTIONNAMES[code] for code in data[offset: offset + actions]]
+        gp.character.haskey = bool(flags & 2)
+        return gp
+
+    def __init__(self, mapgrid: list, willpower: int, rulesets: list = True, mapclass: type = Map):
+        ## mapgrid may also be a Map (which is copied)
+        self._init_map = mapgrid.copy() if isinstance(mapgrid, Map) else mapclass(mapgrid)
         self.map = self._init_map.copy()
         self.character = Character(self.map.findcharacter(), willpower, _map = self.map)
         ## Lists the actions taken by the character
@@ -404,15 +731,84 @@ class GameplaySequence():
         for r in rulesets:
             if not issubclass(r, GameplayRule): raise TypeError("rulesets must be a list of GameplayRule classes")
         self.rulesets = list(rulesets)
+        ## The Outcome of the last terminal step
+        self.outcome = None
 
     def copy(self):
         """ Returns a deepcopy of the GameplaySequence """
-        grid = self.map.copy().grid
-        gp = GameplaySequence(grid, self.character.willpower, self.rulesets)
+        gp = GameplaySequence(self.map.copy(), self.character.willpower, self.rulesets)
         gp.actions = list(self.actions)
         gp.character.haskey = self.character.haskey
         return gp
 
+    def rulenames(self):
+        """ Returns the names of the GameplayRules. Raises a ValueError if a GameplayRule is not registered in AVAILABLERULES. """
+        names = []
+        for rule in self.rulesets:
+            if AVAILABLERULES.get(rule.__name__) is not rule:
+                raise ValueError(f"GameplayRule is not in AVAILABLERULES: {rule}")
+            names.append(rule.__name__)
+        return names
+
+    def to_bytes(self):
+        """ Encodes the gamestate in a compact binary form which can be decoded with from_bytes.
+
+            The Map is stored as a 2-byte mask of entities per cell (only the occupied cells of a SparseMap are stored),
+                each action as a single byte and the GameplayRules by name; Map observers are not stored.
+            Raises a ValueError if a GameplayRule is not registered in AVAILABLERULES.
+        """
+        rules = [name.encode() for name in self.rulenames()]
+        sparse = isinstance(self.map, SparseMap)
+        flags = sparse | self.character.haskey << 1
+        data = [struct.pack(SNAPSHOTHEADER, SNAPSHOTMAGIC, SNAPSHOTVERSION, self.map.width, self.map.height, flags,
+                            self.character.willpower, len(self.actions), len(rules))]
+        data.extend(struct.pack("<B", len(rule)) + rule for rule in rules)
+        if sparse:
+            data.append(struct.pack("<I", len(self.map.cells)))
+            data.extend(struct.pack("<HHH", c, r, Map.entitymask(entities)) for (c, r), entities in self.map.cells.items())
+        else:
+            masks = [Map.entitymask(cell) for row in self.map.grid for cell in row]
+            data.append(struct.pack(f"<{len(masks)}H", *masks))
+        data.append(bytes(ACTIONCODES[action] for action in self.actions))
+        return b"".join(data)
+
+    def __getstate__(self):
+        """ Pickles the attributes as they are (the Map and GameplayRule classes by reference); rules which
+            define REBUILD are stored as their REBUILD (see GameplayRule). to_bytes is the compact format.
+        """
+        state = dict(self.__dict__)
+        state['rulesets'] = [rule.REBUILD or rule for rule in self.rulesets]
+        return state
+
+    def __setstate__(self, state):
+        state['rulesets'] = [rule if isinstance(rule, type) else rule[0](*rule[1]) for rule in state['rulesets']]
+        self.__dict__.update(state)
+
+    def addobserver(self, observer):
+        """ Registers a callback which receives (event, data) for each change to the gamestate (see Map.notify) """
+        self.map.observers.append(observer)
+
+    def removeobserver(self, observer):
+        self.map.observers.remove(observer)
+
+    def snapshot(self):
+        """ Returns a lightweight snapshot of the current gamestate which can be passed to restore.
+
+            Unlike copy, no new GameplaySequence is created: this is intended for repeatedly rolling back a single GameplaySequence.
+        """
+        last = self.actions[-1] if self.actions else None
+        return self.map.snapshot(), self.character.coord, self.character.haskey, len(self.actions), last
+
+    def restore(self, snapshot: tuple):
+        """ Restores the gamestate from a snapshot taken from this GameplaySequence (actions taken since the snapshot are removed) """
+        grid, coord, haskey, length, last = snapshot
+        self.map.restore(grid)
+        self.character.coord = coord
+        self.character.haskey = haskey
+        del self.actions[length:]
+        ## The last action may have been capitalized since the snapshot
+        if length: self.actions[-1] = last
+
     def action_length(self):
         """ Helper function to account for spike damage """
         return len(self.actions) + len([action for action in self.actions if action.upper() == action])
@@ -421,13 +817,15 @@ class GameplaySequence():
         return self.character.willpower - self.action_length()
 
     def premove_checks(self):
-        for rule in self.rulesets:
-            for condition in rule.PREMOVE:
-                condition(self)
+        self.runchecks("PREMOVE")
 
     def postmove_checks(self):
+        self.runchecks("POSTMOVE")
+
+    def runchecks(self, phase: str):
+        """ Runs the callbacks of the phase ("PREMOVE" or "POSTMOVE") of each GameplayRule """
         for rule in self.rulesets:
-            for condition in rule.POSTMOVE:
+            for condition in getattr(rule, phase):
                 condition(self)
 
     def unwinnable(self):
@@ -448,25 +846,72 @@ class GameplaySequence():
             self.actions[-1] = self.actions[-1].upper()
                 
     def gameplay_loop(func):
+        """ Wraps an action function (which returns the action taken, or None if no action was taken) in the gameplay loop.
+
+            The wrapped function returns a Status rather than raising Victory/GameOver.
+        """
         sig = signature(func)
         @wraps(func)
         def inner(*args, **kw):
             bargs = sig.bind_partial(*args, **kw)
             bargs.apply_defaults()
             self = bargs.arguments['self']
+            if self.map.observers: return self.observedloop(func, bargs)
+            return self.runloop(func, bargs)
+        return inner
+
+    def runloop(self, func, bargs):
+        try:
             self.premove_checks()
+            coord = self.character.coord
             result = func(**bargs.arguments)
             if result:
                 self.actions.append(result)
                 self.updatemap()
             self.postmove_checks()
-            return result
-        return inner
+        except (GameplaySequence.Victory, GameplaySequence.GameOver) as e:
+            ## The Exception is kept as it was raised so that move can raise it again
+            self.outcome = Outcome(e.status, type(e), e)
+            return e.status
+        if not result: return Status.NOOP
+        return Status.MOVED if self.character.coord != coord else Status.KICKED
+
+    def observedloop(self, func, bargs):
+        """ The gameplay_loop when the Map has observers: also notifies them of the outcome and of the cells which changed.
+
+            The "diff" event's data is the action recorded (None if no action was taken) and a list of
+                (column, row, entities) tuples for each cell which changed.
+        """
+        self.map.touched.clear()
+        length = len(self.actions)
+        status = self.runloop(func, bargs)
+        self.notifydiff(length)
+        if status.terminal:
+            self.map.notify("gameover" if status.gameover else "victory", message = str(self.outcome.exception))
+        return status
+
+    def notifydiff(self, length: int):
+        """ Sends the "diff" event for the cells which the Map recorded as touched (in row order) """
+        _map = self.map
+        action = self.actions[-1] if len(self.actions) > length else None
+        cells = [(c, r, entities) for (c, r), previous in sorted(_map.touched.items(), key = lambda item: (item[0][1], item[0][0]))
+                 if (entities := _map.getentities((c, r))) != previous]
+        _map.touched.clear()
+        _map.notify("diff", action = action, cells = cells)
 
     @gameplay_loop
+    def step(self, direction):
+        """ Attempts to move the character in the given direction, returning a Status """
+        if self.character.move(direction): return direction
+
     def move(self, direction):
-        """ Attempts to the character in the given direction """
-        if (result := self.character.move(direction)): return direction
+        """ Attempts to move the character in the given direction, returning the direction if an action was taken.
+
+            Raises the Victory or GameOver Exception raised by the GameplayRules if the step's Status is terminal.
+        """
+        status = self.step(direction)
+        if status.terminal: raise self.outcome.exception
+        if status: return direction
 
     def up(self):
         return self.move("up")
@@ -482,7 +927,12 @@ class GameplayRule():
             and take actions as appropriate (at the moment just Victory/Gameover actions)
 
         In subclasses, PREMOVE and POSTMOVE should be lists of callback functions which
-            accept the GameplaySequence as their only argument.
+            accept the GameplaySequence as their only argument. Callbacks end the game by raising
+            Victory or GameOver; the status keyword of the Exception is the Status which
+            GameplaySequence.step reports (default: VICTORY/GAMEOVER).
+
+        REBUILD is an optional (function, arguments) tuple which recreates the GameplayRule, for rules which are
+            created at runtime and therefore cannot be pickled by reference (see patterns.PatternDatabases.rule).
 
         unwinnable is a Solver Optimization and should be a function which determines if it's
             possible to still solve the puzzle. For example, TargetSquareRules.unwinnable is a
@@ -491,6 +941,8 @@ class GameplayRule():
             
             Unwinnable does not need to be customized and returns False by default.
     """
+    REBUILD = None
+
     def unwinnable(gameplay: GameplaySequence):
         return False
     
@@ -507,14 +959,13 @@ class StandardRules(GameplayRule):
     def gameover_noactions(gameplay: GameplaySequence):
         """ The Character has run out of willpower"""
         if gameplay.remaining_actions() <= 0:
-            raise GameplaySequence.GameOver("No moves remaining!")
+            raise GameplaySequence.GameOver("No moves remaining!", status = Status.GAMEOVER_WILLPOWER)
     def gameover_lasered(gameplay: GameplaySequence):
         """ The Character has been killed by lasers """
-        for lasertype in LASERTRANS:
-            for laserentity in gameplay.map.findall(lasertype):
-                for laserpathcoord in gameplay.map.generatelaser(laserentity):
-                    if gameplay.map.coordcontains(laserpathcoord, "C"):
-                        raise GameplaySequence.GameOver("Lasered!")
+        coord = gameplay.character.coord
+        if (laser := gameplay.map.islasered(coord)) is not None:
+            if gameplay.map.observers: gameplay.map.notify("lasered", laser = laser, coord = coord)
+            raise GameplaySequence.GameOver("Lasered!", status = Status.GAMEOVER_LASER)
 
     PREMOVE = [gameover_noactions]
     POSTMOVE = [gameover_lasered]
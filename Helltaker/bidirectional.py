@@ -0,0 +1,146 @@
+""" Helltaker.bidirectional
+
+    Bidirectional search for levels using TargetSquareRules.
+
+    The backward half is a relaxation computed once from the Target cells: a Dijkstra over
+    (cell, spike parity) pairs which ignores every entity except Walls and laser generators (and allows
+    waiting in place, which a Character can do by kicking). Its distances are a lower bound on the
+    Willpower needed to reach a Target and are used both to order and to prune the forward search.
+
+    The forward half is a best-first search from the starting gamestate. Every expanded state tries to
+    meet the backward half by walking to a Target through cells which are free in that state; a
+    successful walk ends the search. All returned actions are verified by replaying them through a
+    copy of the original GameplaySequence.
+"""
+## Builtin
+import heapq
+import itertools
+## This Module
+from Helltaker import BLOCKINGENTITIES, DIRECTIONTRANS, LASERTRANS, GameplaySequence, Map, TargetSquareRules
+from Helltaker.solver import SearchResult, layoutkey, successors
+
+## Entities which never move or disappear and therefore block the relaxed Character
+STATICENTITIES = ("W", "0", "1", "2", "3")
+
+def spikes(_map: Map):
+    """ Returns a dict of spike cells ((column, row) tuples) and whether they are currently active """
+    return {(c, r): "P" in cell for r, row in enumerate(_map.grid) for c, cell in enumerate(row) if "P" in cell or "p" in cell}
+
+def isdamaging(spikecells: dict, cell: tuple, parity: int):
+    """ Returns whether the spike at cell is active after an odd (parity=1) or even number of actions """
+    return cell in spikecells and spikecells[cell] != bool(parity)
+
+def relaxeddistances(_map: Map):
+    """ Computes the relaxed Willpower required to reach a Target from each (cell, parity) pair.
+
+        parity is the number of actions taken (mod 2) relative to _map.
+        Pairs which cannot reach a Target are not included.
+    """
+    static = {(c, r) for r, row in enumerate(_map.grid) for c, cell in enumerate(row) if any(entity in cell for entity in STATICENTITIES)}
+    targets = [(c, r) for r, row in enumerate(_map.grid) for c, cell in enumerate(row) if "T" in cell]
+    spikecells = spikes(_map)
+    distances = {}
+    queue = [(0, target, parity) for target in targets for parity in (0, 1)]
+    heapq.heapify(queue)
+    while queue:
+        distance, cell, parity = heapq.heappop(queue)
+        if (cell, parity) in distances: continue
+        distances[(cell, parity)] = distance
+        ## Arriving at a Target ends the game, so spike damage there does not matter
+        cost = 1 if cell in targets else 1 + isdamaging(spikecells, cell, parity)
+        column, row = cell
+        for deltax, deltay in list(DIRECTIONTRANS.values()) + [(0, 0)]:
+            previous = (column - deltax, row - deltay)
+            if previous in static or _map.capcoord(previous) is None: continue
+            if (previous, 1 - parity) not in distances:
+                heapq.heappush(queue, (distance + cost, previous, 1 - parity))
+    return distances
+
+def lasered(_map: Map):
+    """ Returns the set of cells currently covered by lasers """
+    return {tuple(coord) for laser in LASERTRANS for generator in _map.findall(laser) for coord in _map.generatelaser(generator)}
+
+def walk(gameplay: GameplaySequence, parity: int, spikecells: dict):
+    """ Finds the cheapest walk from the Character to a Target through cells which are free in the current gamestate.
+
+        Returns a (willpower, directions) tuple, or None if no Target can be reached by walking.
+    """
+    _map = gameplay.map
+    beams = lasered(_map)
+    start = tuple(gameplay.character.coord)
+    queue, counter, seen = [(0, 0, start, parity, [])], itertools.count(1), set()
+    while queue:
+        cost, _, cell, parity, directions = heapq.heappop(queue)
+        if _map.coordcontains(cell, "T") and directions:
+            return cost, directions
+        if (cell, parity) in seen: continue
+        seen.add((cell, parity))
+        for direction, (deltax, deltay) in DIRECTIONTRANS.items():
+            nextcell = (cell[0] + deltax, cell[1] + deltay)
+            if _map.capcoord(nextcell) is None or nextcell in beams: continue
+            if nextcell != start and any(entity in _map.getentities(nextcell) for entity in BLOCKINGENTITIES): continue
+            ## The final action only requires 1 Willpower regardless of damage
+            damage = 0 if _map.coordcontains(nextcell, "T") else isdamaging(spikecells, nextcell, 1 - parity)
+            heapq.heappush(queue, (cost + 1 + damage, next(counter), nextcell, 1 - parity, directions + [direction]))
+    return None
+
+def replay(gameplay: GameplaySequence, actions: list):
+    """ Plays the actions on a copy of the gameplay, returning the recorded actions if they result in Victory (otherwise None) """
+    offset, gameplay = len(gameplay.actions), gameplay.copy()
+    try:
+        for action in actions:
+            gameplay.move(action.lower())
+    except GameplaySequence.Victory:
+        return gameplay.actions[offset:]
+    except GameplaySequence.GameOver:
+        return None
+    return None
+
+def solve(gameplay: GameplaySequence):
+    """ Bidirectional search for a sequence of actions which results in Victory.
+
+        Raises a ValueError if the gameplay does not use TargetSquareRules.
+        Returns a SearchResult whose actions are the actions taken after the given gameplay's current actions
+            (None if no solution was found). Results are not guaranteed to be the cheapest solution.
+    """
+    if TargetSquareRules not in gameplay.rulesets: raise ValueError("Bidirectional search requires TargetSquareRules")
+    offset = len(gameplay.actions)
+    spikecells = spikes(gameplay.map)
+    distances = relaxeddistances(gameplay.map)
+    stats = dict(expanded = 0, generated = 0, duplicates = 0, pruned = 0, meets = 0, relaxed = len(distances))
+
+    def heuristic(state):
+        return distances.get((tuple(state.character.coord), (len(state.actions) - offset) % 2))
+
+    def finish(actions):
+        if (actions := replay(gameplay, actions)) is not None:
+            return SearchResult(actions, stats)
+
+    if (h := heuristic(gameplay)) is None or h > gameplay.remaining_actions():
+        return SearchResult(None, stats)
+    counter = itertools.count()
+    queue = [(h, next(counter), gameplay)]
+    best = {(layoutkey(gameplay), gameplay.character.haskey): gameplay.action_length()}
+    while queue:
+        _, _, current = heapq.heappop(queue)
+        stats['expanded'] += 1
+        parity = (len(current.actions) - offset) % 2
+        ## Meet the backward relaxation by walking to a Target
+        if (completion := walk(current, parity, spikecells)) and completion[0] <= current.remaining_actions():
+            stats['meets'] += 1
+            if (result := finish(current.actions[offset:] + completion[1])): return result
+        for direction, child, outcome in successors(current):
+            stats['generated'] += 1
+            if isinstance(outcome, GameplaySequence.Victory):
+                if (result := finish(child.actions[offset:])): return result
+            if outcome is not None: continue
+            key, cost = (layoutkey(child), child.character.haskey), child.action_length()
+            if best.get(key, cost + 1) <= cost:
+                stats['duplicates'] += 1
+                continue
+            best[key] = cost
+            if (h := heuristic(child)) is None or h > child.remaining_actions():
+                stats['pruned'] += 1
+                continue
+            heapq.heappush(queue, (cost + h, next(counter), child))
+    return SearchResult(None, stats)
@@ -0,0 +1,165 @@
+""" Helltaker.cache
+
+    Persistent cache of solver results keyed by a canonical fingerprint of the level.
+
+    The fingerprint is computed from FINGERPRINTVERSION, the Map.cleangrid-normalized grid, the remaining
+    Willpower, whether the Character has the key and the names of the GameplayRules (see
+    GameplaySequence.rulenames).
+    Results are stored as json in a local SQLite database; once the total size of the stored results
+    exceeds the size limit, the least recently used results are evicted.
+
+    A symmetric cache stores results under the fingerprint of the level's canonical form (see
+    Helltaker.symmetry), so mirrored and rotated copies of a level share their results.
+"""
+## Builtin
+import hashlib
+import json
+import os
+import sqlite3
+import time
+## This Module
+from Helltaker import Map, GameplaySequence
+from Helltaker import solver, symmetry
+
+## Part of every fingerprint: incrementing it invalidates every cached result (e.g. when the mechanics or the
+## results of the solvers change)
+FINGERPRINTVERSION = 1
+
+def fingerprint(gameplay: GameplaySequence):
+    """ Returns a hex digest identifying the gamestate of the gameplay.
+
+        Two GameplaySequences with the same fingerprint have the same solutions.
+        Raises a ValueError if a GameplayRule is not registered in AVAILABLERULES.
+    """
+    level = dict(
+        version = FINGERPRINTVERSION,
+        grid = Map.cleangrid(gameplay.map.grid),
+        willpower = gameplay.remaining_actions(),
+        haskey = gameplay.character.haskey,
+        rules = gameplay.rulenames()
+    )
+    return hashlib.sha256(json.dumps(level, separators = (",",":")).encode()).hexdigest()
+
+class LevelCache():
+    """ A SQLite-backed cache of solver results.
+
+        path is the location of the database file (it is created if it does not exist).
+        maxsize is the maximum total size (in bytes) of the stored results.
+        symmetric is whether searches are cached by the canonical form of the level: they are run on the canonical
+            level and their actions are mapped back onto the given level.
+
+        Results are stored under a fingerprint and a kind (the name of the function which produced them).
+        solve, explore and uniformcost accept either a GameplaySequence or the path to a json file accepted by
+            GameplaySequence.loadfromjson and return the same results as the solver functions.
+        minimum_willpower accepts the same arguments as solver.minimum_willpower.
+    """
+    def __init__(self, path: str, maxsize: int = 64 * 2**20, symmetric: bool = False):
+        self.path = path
+        self.maxsize = maxsize
+        self.symmetric = symmetric
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    fingerprint TEXT,
+                    kind TEXT,
+                    value TEXT,
+                    size INTEGER,
+                    accessed INTEGER,
+                    PRIMARY KEY (fingerprint, kind)
+                )""")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)")
+
+    def get(self, fingerprint: str, kind: str):
+        """ Returns the stored result (or None if there is no result) and marks it as recently used """
+        row = self.connection.execute("SELECT value FROM results WHERE fingerprint = ? AND kind = ?", (fingerprint, kind)).fetchone()
+        if row is None: return None
+        with self.connection:
+            self.connection.execute("UPDATE results SET accessed = ? WHERE fingerprint = ? AND kind = ?", (time.time_ns(), fingerprint, kind))
+        return json.loads(row[0])
+
+    def put(self, fingerprint: str, kind: str, value):
+        """ Stores a json-serializable result, evicting the least recently used results if the cache is too large """
+        value = json.dumps(value, separators = (",",":"))
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)", (fingerprint, kind, value, len(value), time.time_ns()))
+        self.evict()
+
+    def size(self):
+        """ Returns the total size of the stored results """
+        return self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def evict(self):
+        """ Removes the least recently used results until the cache is within its maxsize """
+        size = self.size()
+        if size <= self.maxsize: return
+        rows = self.connection.execute("SELECT fingerprint, kind, size FROM results ORDER BY accessed").fetchall()
+        with self.connection:
+            for fp, kind, rowsize in rows:
+                if size <= self.maxsize: break
+                self.connection.execute("DELETE FROM results WHERE fingerprint = ? AND kind = ?", (fp, kind))
+                size -= rowsize
+
+    def clear(self):
+        with self.connection:
+            self.connection.execute("DELETE FROM results")
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc):
+        self.close()
+
+    def cached(self, gameplay, kind: str, func):
+        """ Returns the result of func(gameplay), using the stored result if available.
+
+            gameplay can be a GameplaySequence or the path to a level json file.
+            func should return a json-serializable value.
+        """
+        if isinstance(gameplay, (str, os.PathLike)):
+            gameplay = GameplaySequence.loadfromjson(gameplay)
+        fp = fingerprint(gameplay)
+        if (result := self.get(fp, kind)) is None:
+            result = func(gameplay)
+            self.put(fp, kind, result)
+        return result
+
+    def cachedsearch(self, gameplay, kind: str, func):
+        """ Returns the SearchResult of func(gameplay) using cached (see symmetric) """
+        if isinstance(gameplay, (str, os.PathLike)):
+            gameplay = GameplaySequence.loadfromjson(gameplay)
+        if not self.symmetric: return solver.SearchResult(*self.cached(gameplay, kind, func))
+        canonical, transform = symmetry.canonicalgameplay(gameplay)
+        actions, stats = self.cached(canonical, kind, func)
+        if actions is not None: actions = symmetry.restoreactions(actions, transform)
+        return solver.SearchResult(actions, stats)
+
+    def solve(self, gameplay):
+        """ Cached version of solver.solve """
+        return self.cachedsearch(gameplay, "solve", solver.solve)
+
+    def explore(self, gameplay):
+        """ Cached version of solver.explore """
+        return self.cachedsearch(gameplay, "explore", solver.explore)
+
+    def uniformcost(self, gameplay):
+        """ Cached version of solver.uniformcost """
+        return self.cachedsearch(gameplay, "uniformcost", solver.uniformcost)
+
+    def minimum_willpower(self, mapgrid: list, rulesets: list = True, limit: int = None):
+        """ Cached version of solver.minimum_willpower.
+
+            The level is fingerprinted with solver.UNLIMITED Willpower; results computed with a limit are stored
+                separately for each limit.
+        """
+        gameplay, transform = GameplaySequence(mapgrid, solver.UNLIMITED, rulesets = rulesets), None
+        if self.symmetric: gameplay, transform = symmetry.canonicalgameplay(gameplay)
+        kind = "minimum_willpower" if limit is None else f"minimum_willpower:{limit}"
+        willpower, actions = self.cached(gameplay, kind, lambda gameplay: solver.minimum_willpower(gameplay.map, gameplay.rulesets, limit))
+        if actions is not None and transform is not None: actions = symmetry.restoreactions(actions, transform)
+        return willpower, actions
@@ -0,0 +1,157 @@
+""" Helltaker.compiled
+
+    Precompiled transition tables for a level.
+
+    Walls, laser generators and spikes never move, so everything the engine derives from them can be
+    computed once per level. compilelevel builds a CompiledLevel containing, for every cell:
+        neighbours: the Coordinate reached in each direction (None at the edge of the Map or if the cell
+            contains a Wall or laser generator, which can never be moved into)
+        beams: the lasers whose beam can reach the cell if no Block or Gate is in the way, and how far
+            along the beam it is
+    along with the spike cells and a table of interned Coordinates.
+
+    CompiledMap is a Map which uses those tables: Character.move looks up its target with Map.neighbour,
+    spikes are cycled without scanning the grid and lasers are checked by only inspecting the dynamic
+    entities (Blocks and Gates) between the Character and the lasers whose beams contain it. Compiled
+    levels are cached by their static entities, so every CompiledMap (and every GameplaySequence using
+    one) of the same level shares a single CompiledLevel; only the CACHESIZE most recently used levels
+    are kept.
+"""
+## Builtin
+from collections import namedtuple
+from functools import lru_cache
+## This Module
+from Helltaker import DIRECTIONTRANS, LASERTRANS, SPIKETRANS, Coordinate, Map
+
+## Entities which never move and can never be moved into
+STATICENTITIES = ("W",) + tuple(LASERTRANS)
+## Solid entities which can move or be removed (lasers can only be blocked by these or by STATICENTITIES)
+DYNAMICSOLIDS = ("B", "G")
+
+CompiledLevel = namedtuple("compiledlevel", ["width", "height", "coords", "neighbours", "spikes", "lasers", "beams"])
+""" coords: a dict of the interned Coordinate of each cell ((column, row) tuples)
+    neighbours: a dict of {cell: {direction: Coordinate or None}}
+    spikes: the Coordinates of the cells with spikes
+    lasers: a tuple of (laser Coordinate, beam) tuples where beam is the tuple of Coordinates the laser reaches
+        when nothing dynamic blocks it
+    beams: a dict of {cell: ((laser index, position in the beam), ...)} in the order StandardRules checks lasers
+"""
+
+## The number of CompiledLevels kept by build
+CACHESIZE = 256
+
+def staticlayout(_map: Map):
+    """ Returns a hashable representation of the static entities (Walls, laser generators and spikes) of the map """
+    cells = []
+    for r, row in enumerate(_map.grid):
+        for c, entities in enumerate(row):
+            static = "".join(entity for entity in entities if entity in STATICENTITIES)
+            if "P" in entities or "p" in entities: static += "P"
+            if static: cells.append((c, r, static))
+    return _map.width, _map.height, tuple(cells)
+
+def compilelevel(_map: Map):
+    """ Returns the CompiledLevel for the map's static entities (compiling it if it is not cached) """
+    return build(*staticlayout(_map))
+
+@lru_cache(maxsize = CACHESIZE)
+def build(width: int, height: int, static: tuple):
+    """ Builds a CompiledLevel from a staticlayout (the most recently used CACHESIZE levels are cached) """
+    blocked = {(c, r) for c, r, entities in static if any(entity in entities for entity in STATICENTITIES)}
+    ## Walls are the only static solid entities
+    walls = {(c, r) for c, r, entities in static if "W" in entities}
+    coords = {(c, r): Coordinate(c, r) for r in range(height) for c in range(width)}
+    neighbours = {}
+    for cell, coord in coords.items():
+        neighbours[cell] = adjacent = {}
+        for direction, (deltax, deltay) in DIRECTIONTRANS.items():
+            target = (coord.column + deltax, coord.row + deltay)
+            adjacent[direction] = coords[target] if target in coords and target not in blocked else None
+    spikes = tuple(coords[(c, r)] for c, r, entities in static if "P" in entities)
+
+    lasers, beams = [], {}
+    ## StandardRules checks lasers by type, then in the order Map.findall returns them
+    for lasertype, direction in LASERTRANS.items():
+        deltax, deltay = DIRECTIONTRANS[direction]
+        for c, r, entities in sorted(static, key = lambda cell: (cell[1], cell[0])):
+            if lasertype not in entities: continue
+            beam = []
+            target = (c + deltax, r + deltay)
+            while target in coords and target not in walls:
+                beam.append(coords[target])
+                target = (target[0] + deltax, target[1] + deltay)
+            for position, coord in enumerate(beam):
+                beams.setdefault(coord, []).append((len(lasers), position))
+            lasers.append((coords[(c, r)], tuple(beam)))
+    beams = {coord: tuple(entries) for coord, entries in beams.items()}
+    return CompiledLevel(width, height, coords, neighbours, spikes, tuple(lasers), beams)
+
+class CompiledMap(Map):
+    """ A Map which uses the precompiled tables of its level (see the module documentation).
+
+        level is an optional CompiledLevel to use (it must have been compiled for the same static entities);
+            by default it is looked up with compilelevel.
+        Walls, laser generators and spikes must not be created or removed after compiling; createentity
+            recompiles the level if they are.
+    """
+    def __init__(self, grid, level: CompiledLevel = None):
+        super().__init__(grid)
+        self.level = compilelevel(self) if level is None else level
+
+    def copy(self):
+        _map = CompiledMap.__new__(type(self))
+        _map.grid = [list(row) for row in self.grid]
+        _map.observers = []
+        _map.touched = {}
+        _map.level = self.level
+        return _map
+
+    def __getstate__(self):
+        ## The CompiledLevel is recompiled (or found in build's cache) when unpickling
+        state = dict(self.__dict__)
+        del state['level']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.level = compilelevel(self)
+
+    def capcoord(self, coordinate: Coordinate):
+        return self.level.coords.get(tuple(coordinate))
+
+    def neighbour(self, coord: Coordinate, direction: str):
+        adjacent = self.level.neighbours[coord]
+        try:
+            return adjacent[direction]
+        except KeyError:
+            ## Normalized like Map.direction_to_coord (e.g. the capitalized actions of spike damage)
+            if (direction := direction.strip().lower()) not in DIRECTIONTRANS:
+                raise ValueError("Invalid Direction")
+            return adjacent[direction]
+
+    def cyclespikes(self):
+        grid = self.grid
+        if self.observers:
+            for coord in self.level.spikes: self.touch(coord)
+        for c, r in self.level.spikes:
+            grid[r][c] = grid[r][c].translate(SPIKETRANS)
+        if self.observers: self.notify("spikestoggled")
+
+    def spikeskeletons(self):
+        grid = self.grid
+        for coord in self.level.spikes:
+            entities = grid[coord.row][coord.column]
+            if "S" in entities and "P" in entities:
+                self.removeentity("S", coord)
+                if self.observers: self.notify("destroyed", entity = "S", coord = coord, cause = "spikes")
+
+    def islasered(self, coord: Coordinate):
+        grid, lasers = self.grid, self.level.lasers
+        for laser, position in self.level.beams.get(coord, ()):
+            origin, beam = lasers[laser]
+            if not any(solid in grid[r][c] for c, r in beam[:position + 1] for solid in DYNAMICSOLIDS): return origin
+        return None
+
+    def createentity(self, entity: str, coord: Coordinate):
+        super().createentity(entity, coord)
+        if entity in STATICENTITIES or entity in ("P", "p"): self.level = compilelevel(self)
@@ -0,0 +1,91 @@
+""" Helltaker.environment
+
+    A gym-style environment for training agents on a level.
+
+    The level is parsed once: reset restores a snapshot of the starting gamestate (GameplaySequence.snapshot/
+    restore) instead of creating a new GameplaySequence. Observations are written into a single preallocated
+    buffer with one channel per entity (see CHANNELS); after each step only the cells which can have changed
+    (the Character's cell, the two cells in front of it and the spike cells) are rewritten. Victory and
+    GameOver are reported as rewards and terminal flags rather than raised.
+"""
+## This Module
+from Helltaker import DIRECTIONTRANS, GameplaySequence
+
+## Entities with an observation channel, in channel order
+CHANNELS = ("C", "B", "S", "P", "p", "K", "G", "T", "W", "E", "e", "0", "1", "2", "3")
+## Directions in action index order
+ACTIONS = tuple(DIRECTIONTRANS)
+
+class Environment():
+    """ A gym-style environment for a level.
+
+        rewards is a dict of the rewards for "victory", "gameover" and each "action" (defaults: 1, -1 and 0).
+        maxsteps is the optional number of steps after which episodes are truncated.
+
+        observation is a (channels, height, width) memoryview of unsigned bytes which is 1 where the cell contains
+            the channel's entity; it is updated in place by reset and step (copy it to keep an observation).
+    """
+    def __init__(self, mapgrid: list, willpower: int, rulesets: list = True, rewards: dict = None, maxsteps: int = None):
+        self.gameplay = GameplaySequence(mapgrid, willpower, rulesets = rulesets)
+        self.rewards = dict(victory = 1.0, gameover = -1.0, action = 0.0)
+        if rewards: self.rewards.update(rewards)
+        self.maxsteps = maxsteps
+        self.width, self.height = self.gameplay.map.width, self.gameplay.map.height
+        self.shape = (len(CHANNELS), self.height, self.width)
+        self.buffer = bytearray(len(CHANNELS) * self.height * self.width)
+        self.observation = memoryview(self.buffer).cast("B", self.shape)
+        ## Spikes never move, so their cells are the only ones which change without the Character acting on them
+        self.spikecells = [coord for coord in self.gameplay.map if self.gameplay.map.coordcontains(coord, "P") or self.gameplay.map.coordcontains(coord, "p")]
+        self.start = self.gameplay.snapshot()
+        for coord in self.gameplay.map: self.writecell(coord.column, coord.row)
+        self.initial = bytes(self.buffer)
+        self.steps = 0
+        self.done = False
+
+    def writecell(self, column: int, row: int):
+        """ Writes the channels of a single cell into the observation buffer """
+        cell = self.gameplay.map.getentities((column, row))
+        offset, plane = row * self.width + column, self.height * self.width
+        buffer = self.buffer
+        for channel, entity in enumerate(CHANNELS):
+            buffer[channel * plane + offset] = entity in cell
+
+    def reset(self):
+        """ Restores the starting gamestate. Returns (observation, info). """
+        self.gameplay.restore(self.start)
+        self.buffer[:] = self.initial
+        self.steps = 0
+        self.done = False
+        return self.observation, self.info()
+
+    def info(self, acted: bool = False, outcome: str = None):
+        return dict(acted = acted, outcome = outcome, remaining = self.gameplay.remaining_actions(), haskey = self.gameplay.character.haskey)
+
+    def step(self, action: int):
+        """ Takes the action (an index into ACTIONS). Returns (observation, reward, terminated, truncated, info).
+
+            info["acted"] is False if the action was not an action (e.g. moving into a Wall).
+            info["outcome"] is "victory", "gameover" or None.
+            Raises a RuntimeError if the episode has ended (reset must be called).
+        """
+        if self.done: raise RuntimeError("Episode has ended: call reset")
+        gameplay = self.gameplay
+        column, row = gameplay.character.coord
+        deltax, deltay = DIRECTIONTRANS[ACTIONS[action]]
+        length = len(gameplay.actions)
+        status = gameplay.step(ACTIONS[action])
+        outcome = ("gameover" if status.gameover else "victory") if status.terminal else None
+        acted = len(gameplay.actions) > length
+        ## Only the Character's cell, the kicked/entered cell, the cell beyond it and the spikes can change
+        if acted:
+            for distance in range(3):
+                c, r = column + deltax * distance, row + deltay * distance
+                if 0 <= c < self.width and 0 <= r < self.height: self.writecell(c, r)
+            for coord in self.spikecells: self.writecell(coord.column, coord.row)
+
+        self.steps += 1
+        reward = self.rewards[outcome] if outcome else self.rewards['action'] if acted else 0.0
+        terminated = outcome is not None
+        truncated = not terminated and self.maxsteps is not None and self.steps >= self.maxsteps
+        self.done = terminated or truncated
+        return self.observation, reward, terminated, truncated, self.info(acted, outcome)
@@ -0,0 +1,217 @@
+""" Helltaker.external
+
+    Memory-bounded breadth-first search which keeps its frontier and visited set on disk.
+
+    The search proceeds one layer (number of actions) at a time. Children of the current layer are
+    buffered in memory until the buffer exceeds the memory budget, at which point they are sorted and
+    spilled to a run file. Once the layer is expanded the runs are merged with each other and with the
+    sorted visited file, dropping duplicates (delayed duplicate detection), to produce the next layer.
+
+    After each layer a manifest is written to the working directory so the search can be resumed
+    after a crash using resume.
+"""
+## Builtin
+import heapq
+import json
+import os
+## This Module
+from Helltaker import AVAILABLERULES, GameplaySequence
+from Helltaker import instrumentation
+from Helltaker.solver import SearchResult, layoutkey, successors
+
+MANIFEST = "manifest.json"
+
+ACTIONCODES = {"up":"u", "right":"r", "down":"d", "left":"l"}
+CODEACTIONS = {v:k for k,v in ACTIONCODES.items()}
+
+def encodeactions(actions: list):
+    """ Encodes a list of actions as a string with one character per action (preserving spike damage) """
+    return "".join(ACTIONCODES[action.lower()].upper() if action.isupper() else ACTIONCODES[action] for action in actions)
+
+def decodeactions(code: str):
+    return [CODEACTIONS[c.lower()].upper() if c.isupper() else CODEACTIONS[c] for c in code]
+
+def recordkey(record: str):
+    """ Returns the state portion of a record (everything but the actions) """
+    return record.rsplit("\t", 1)[0]
+
+class ExternalSearch():
+    """ A breadth-first search whose frontier and visited set are stored in sorted files in directory.
+
+        memory is the maximum size (in bytes) of encoded states buffered in memory before they are spilled to disk.
+
+        Records are lines of tab-separated fields: the comma-separated layout of the map, whether the Character
+            has the key, the remaining actions and the encoded actions taken since the start of the search.
+            The first three fields are the record's key: records with the same key are duplicates.
+    """
+    def __init__(self, directory: str, memory: int = 64 * 2**20):
+        self.directory = directory
+        self.memory = memory
+        self.level = None
+        self.layer = 0
+        self.stats = dict(expanded = 0, generated = 0, duplicates = 0, spills = 0, layers = 0, maxfrontier = 1)
+
+    def path(self, name: str):
+        return os.path.join(self.directory, name)
+
+    def start(self, gameplay: GameplaySequence):
+        """ Initializes the search directory with the given gameplay as the first layer """
+        rules = gameplay.rulenames()
+        os.makedirs(self.directory, exist_ok = True)
+        self.level = dict(
+            grid = [list(row) for row in gameplay.map.grid],
+            willpower = gameplay.character.willpower,
+            haskey = gameplay.character.haskey,
+            actions = list(gameplay.actions),
+            rules = rules
+        )
+        self.layer = 0
+        record = self.encode(gameplay, [])
+        self.writelines("layer-0", [record])
+        self.writelines("visited-0", [recordkey(record)])
+        self.checkpoint()
+
+    def resume(self):
+        """ Loads the last completed layer from the manifest in directory """
+        with open(self.path(MANIFEST), 'r') as f:
+            manifest = json.load(f)
+        self.level, self.layer, self.stats = manifest['level'], manifest['layer'], manifest['stats']
+        ## Remove runs left over from an incomplete layer
+        for name in os.listdir(self.directory):
+            if name.startswith("run-"): os.remove(self.path(name))
+
+    def checkpoint(self):
+        """ Atomically records the current layer in the manifest and removes files from previous layers """
+        temp = self.path(MANIFEST + ".tmp")
+        with open(temp, 'w') as f:
+            json.dump(dict(level = self.level, layer = self.layer, stats = self.stats), f)
+        os.replace(temp, self.path(MANIFEST))
+        for name in os.listdir(self.directory):
+            prefix, _, layer = name.partition("-")
+            if prefix in ("layer", "visited") and layer.isdigit() and int(layer) < self.layer:
+                os.remove(self.path(name))
+
+    def encode(self, gameplay: GameplaySequence, actions: list):
+        return "\t".join([",".join(layoutkey(gameplay)), str(int(gameplay.character.haskey)),
+                          str(gameplay.remaining_actions()), encodeactions(actions)])
+
+    def decode(self, record: str):
+        """ Returns a (GameplaySequence, actions) tuple for the record """
+        layout, haskey, _, actions = record.split("\t")
+        cells, width = layout.split(","), len(self.level['grid'][0])
+        grid = [cells[i:i+width] for i in range(0, len(cells), width)]
+        gameplay = GameplaySequence(grid, self.level['willpower'], [AVAILABLERULES[rule] for rule in self.level['rules']])
+        actions = decodeactions(actions)
+        gameplay.actions = self.level['actions'] + actions
+        gameplay.character.haskey = bool(int(haskey))
+        return gameplay, actions
+
+    def writelines(self, name: str, lines):
+        with open(self.path(name), 'w') as f:
+            for line in lines:
+                f.write(line + "\n")
+
+    def readlines(self, name: str):
+        with open(self.path(name), 'r') as f:
+            for line in f:
+                yield line.rstrip("\n")
+
+    def spill(self, buffer: list, runs: list):
+        """ Sorts and deduplicates the buffer and writes it to a new run file """
+        buffer.sort(key = recordkey)
+        name = f"run-{self.layer+1}-{len(runs)}"
+        self.writelines(name, self.unique(buffer))
+        runs.append(name)
+        self.stats['spills'] += 1
+        buffer.clear()
+
+    def unique(self, records):
+        """ Yields the first record of each key from the sorted records """
+        last = None
+        for record in records:
+            if (key := recordkey(record)) == last:
+                self.stats['duplicates'] += 1
+                continue
+            last = key
+            yield record
+
+    def merge(self, runs: list):
+        """ Merges the runs with the visited file, writing the next layer and visited files. Returns the size of the next layer. """
+        records = self.unique(heapq.merge(*(self.readlines(run) for run in runs), key = recordkey))
+        visited = self.readlines(f"visited-{self.layer}")
+        count = 0
+        with open(self.path(f"layer-{self.layer+1}"), 'w') as layer, open(self.path(f"visited-{self.layer+1}"), 'w') as newvisited:
+            seen = next(visited, None)
+            for record in records:
+                key = recordkey(record)
+                while seen is not None and seen < key:
+                    newvisited.write(seen + "\n")
+                    seen = next(visited, None)
+                if seen == key:
+                    self.stats['duplicates'] += 1
+                    continue
+                newvisited.write(key + "\n")
+                layer.write(record + "\n")
+                count += 1
+            while seen is not None:
+                newvisited.write(seen + "\n")
+                seen = next(visited, None)
+        for run in runs: os.remove(self.path(run))
+        return count
+
+    def run(self, layers: int = None):
+        """ Runs the search until a solution is found, the state space is exhausted or the given number of layers have been completed.
+
+            Returns a SearchResult with the actions taken since the start of the search (None if no solution was found).
+            stats['complete'] is False if the search stopped because of the layers argument.
+        """
+        completed = 0
+        instrument = instrumentation.ACTIVE
+        while layers is None or completed < layers:
+            buffer, runs, size = [], [], 0
+            for record in self.readlines(f"layer-{self.layer}"):
+                current, actions = self.decode(record)
+                self.stats['expanded'] += 1
+                if instrument: instrument.expanded(0, 0, len(buffer))
+                for direction, child, outcome in successors(current):
+                    self.stats['generated'] += 1
+                    if instrument: instrument.count("generated")
+                    if isinstance(outcome, GameplaySequence.Victory):
+                        self.stats['complete'] = True
+                        return SearchResult(actions + child.actions[-1:], self.stats)
+                    if outcome is not None or child.unwinnable(): continue
+                    child = self.encode(child, actions + child.actions[-1:])
+                    buffer.append(child)
+                    size += len(child)
+                    if size > self.memory:
+                        self.spill(buffer, runs)
+                        size = 0
+            if buffer: self.spill(buffer, runs)
+            duplicates = self.stats['duplicates']
+            count = self.merge(runs)
+            if instrument:
+                ## Duplicates are only detected when runs are spilled and merged
+                instrument.count("duplicates", self.stats['duplicates'] - duplicates)
+                instrument.gauge("frontier", count)
+            self.layer += 1
+            self.stats['layers'] = self.layer
+            self.stats['maxfrontier'] = max(self.stats['maxfrontier'], count)
+            self.checkpoint()
+            completed += 1
+            if count == 0:
+                self.stats['complete'] = True
+                return SearchResult(None, self.stats)
+        self.stats['complete'] = False
+        return SearchResult(None, self.stats)
+
+def solve(gameplay: GameplaySequence, directory: str, memory: int = 64 * 2**20):
+    """ Memory-bounded version of solver.solve using directory as working space """
+    search = ExternalSearch(directory, memory)
+    search.start(gameplay)
+    return search.run()
+
+def resume(directory: str, memory: int = 64 * 2**20):
+    """ Resumes a search from the last layer recorded in directory """
+    search = ExternalSearch(directory, memory)
+    search.resume()
+    return search.run()
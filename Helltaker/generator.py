@@ -0,0 +1,152 @@
+""" Helltaker.generator
+
+    Procedural level generation.
+
+    LevelGenerator produces random grids from a configurable mix of entities, rejects invalid grids
+    cheaply (Map.validategrid plus a relaxed reachability check) and verifies the remaining grids with
+    the solver, accepting only levels whose minimum Willpower falls within the target difficulty.
+    Attempts are independent, so LevelGenerator.generate distributes them across a process pool.
+"""
+## Builtin
+from concurrent.futures import ProcessPoolExecutor
+import os
+import random
+import time
+## This Module
+from Helltaker import AVAILABLERULES, Map
+from Helltaker import bidirectional, solver
+
+## Default probability of each entity being placed in a cell (cells are otherwise Empty)
+DEFAULTMIX = {
+    "W": 0.12,
+    "B": 0.12,
+    "S": 0.05,
+    "P": 0.04,
+    "p": 0.04,
+    "0": 0.005,
+    "1": 0.005,
+    "2": 0.005,
+    "3": 0.005,
+}
+
+class LevelGenerator():
+    """ Generates random levels within a target difficulty.
+
+        width/height: size of the generated grids
+        mix: a dict of entity symbols and the probability of placing them in each cell (see DEFAULTMIX)
+        keys: whether to place a Key and a Gate
+        targets/terminals: the number of Targets and Active Terminals to place
+        rules: names of the GameplayRules (from AVAILABLERULES) used by the levels
+        difficulty: the (minimum, maximum) of the minimum Willpower required to win an accepted level
+
+        Generated levels are dicts in the format accepted by GameplaySequence.loadfromjson, with the
+            minimum Willpower as the willpower and an additional "solution" key.
+    """
+    def __init__(self, width: int, height: int, mix: dict = None, keys: bool = False, targets: int = 1, terminals: int = 0,
+                 rules: list = ("StandardRules", "TargetSquareRules"), difficulty: tuple = (1, 20)):
+        if width * height < 2 + targets + terminals + 2*keys: raise ValueError("Grid is too small for the required entities")
+        for rule in rules:
+            if rule not in AVAILABLERULES: raise ValueError(f"Unknown GameplayRule: {rule}")
+        self.width, self.height = width, height
+        self.mix = dict(DEFAULTMIX if mix is None else mix)
+        self.keys = keys
+        self.targets = targets
+        self.terminals = terminals
+        self.rules = list(rules)
+        self.difficulty = tuple(difficulty)
+        self.stats = dict(attempts = 0, invalid = 0, unsolvable = 0, offtarget = 0, accepted = 0, elapsed = 0.0, processes = 1)
+
+    def grid(self, rng: random.Random):
+        """ Returns a random grid """
+        cells = [(c, r) for r in range(self.height) for c in range(self.width)]
+        rng.shuffle(cells)
+        grid = [["" for c in range(self.width)] for r in range(self.height)]
+        ## Required entities are placed in distinct cells
+        required = ["C"] + ["T"]*self.targets + ["E"]*self.terminals + (["K", "G"] if self.keys else [])
+        for entity, (c, r) in zip(required, cells):
+            grid[r][c] = entity
+        entities, weights = list(self.mix), list(self.mix.values())
+        empty = max(0.0, 1 - sum(weights))
+        for c, r in cells[len(required):]:
+            grid[r][c] = rng.choices(entities + [""], weights + [empty])[0]
+        return grid
+
+    def validate(self, grid: list):
+        """ Cheaply determines whether a grid could be a valid level """
+        try:
+            Map.validategrid(grid)
+        except (AttributeError, ValueError):
+            return False
+        _map = Map(grid)
+        start = tuple(_map.findcharacter())
+        ## The Character cannot start in a laser
+        if start in bidirectional.lasered(_map): return False
+        if "TargetSquareRules" in self.rules:
+            ## Targets must be reachable when only static entities are considered
+            distances = bidirectional.relaxeddistances(_map)
+            if (start, 0) not in distances or distances[(start, 0)] > self.difficulty[1]: return False
+        return True
+
+    def attempt(self, seed: int):
+        """ Generates and verifies a single level.
+
+            Returns a (result, level) tuple where result is one of "invalid", "unsolvable", "offtarget" or "accepted"
+                and level is the level dict (None unless the level was accepted).
+        """
+        rng = random.Random(seed)
+        grid = self.grid(rng)
+        if not self.validate(grid): return "invalid", None
+        low, high = self.difficulty
+        rulesets = [AVAILABLERULES[rule] for rule in self.rules]
+        willpower, actions = solver.minimum_willpower(grid, rulesets = rulesets, limit = high)
+        if willpower is None: return "unsolvable", None
+        if willpower < low: return "offtarget", None
+        level = dict(
+            name = f"Generated {self.width}x{self.height} #{seed}",
+            willpower = willpower,
+            grid = Map.cleangrid(grid),
+            rules = self.rules,
+            solution = actions,
+        )
+        return "accepted", level
+
+    def generate(self, count: int, processes: int = None, seed: int = 0, batch: int = None):
+        """ Yields count accepted levels, verifying attempts across a pool of processes.
+
+            seed is the seed of the first attempt; each attempt uses the next seed so results are reproducible.
+            batch is the number of attempts submitted to the pool at a time (default 4 per process).
+            processes=1 runs attempts in the current process.
+            stats is updated as attempts complete (see LevelGenerator.throughput).
+        """
+        processes = processes or os.cpu_count() or 1
+        batch = batch or 4 * processes
+        self.stats['processes'] = processes
+        start, accepted = time.perf_counter(), 0
+        pool = ProcessPoolExecutor(processes) if processes > 1 else None
+        futures = []
+        try:
+            while accepted < count:
+                seeds = range(seed, seed + batch)
+                seed += batch
+                if pool:
+                    futures = [pool.submit(self.attempt, attemptseed) for attemptseed in seeds]
+                    results = (future.result() for future in futures)
+                else:
+                    results = map(self.attempt, seeds)
+                for result, level in results:
+                    self.stats['attempts'] += 1
+                    self.stats[result] += 1
+                    self.stats['elapsed'] = time.perf_counter() - start
+                    if level is not None and accepted < count:
+                        accepted += 1
+                        yield level
+        finally:
+            if pool:
+                ## The attempts which have not started are cancelled (shutdown's cancel_futures requires Python 3.9)
+                for future in futures: future.cancel()
+                pool.shutdown()
+
+    def throughput(self):
+        """ Returns the number of accepted levels per minute per process """
+        if not self.stats['elapsed']: return 0.0
+        return self.stats['accepted'] / (self.stats['elapsed'] / 60) / self.stats['processes']
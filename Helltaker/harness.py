@@ -0,0 +1,177 @@
+""" Helltaker.harness
+
+    Random-walk throughput measurement and differential testing of Map backends.
+
+    Walks are seeded sequences of random directions played until Victory, GameOver or a step limit. The
+    same walks are played on a GameplaySequence using each backend (a Map class, see BACKENDS): throughput
+    measures moves, kicks and memory allocated per move, while differential compares the gamestate of every
+    backend against the first (the reference) after every step. A walk which diverges is minimized to a
+    short reproducer by repeatedly removing directions while the walk still diverges.
+"""
+## Builtin
+import random
+import time
+import tracemalloc
+## This Module
+from Helltaker import DIRECTIONTRANS, AVAILABLERULES, GameplaySequence, Map, SparseMap
+from Helltaker.compiled import CompiledMap
+from Helltaker.generator import LevelGenerator
+
+## Map classes which can be compared; "dense" is the reference engine
+BACKENDS = {"dense": Map, "sparse": SparseMap, "compiled": CompiledMap}
+DIRECTIONS = tuple(DIRECTIONTRANS)
+
+def generatedlevels(count: int, width: int = 8, height: int = 8, seed: int = 0, willpower: int = None):
+    """ Returns count random (unverified) levels from LevelGenerator as (grid, willpower, rulesets) tuples.
+
+        Levels only need to be valid grids (they are not solved), so they are cheap to generate.
+        willpower defaults to the number of cells in the grid.
+    """
+    generator = LevelGenerator(width, height, keys = True)
+    rng = random.Random(seed)
+    levels = []
+    while len(levels) < count:
+        grid = generator.grid(rng)
+        if generator.validate(grid):
+            levels.append((grid, willpower or width * height, [AVAILABLERULES[rule] for rule in generator.rules]))
+    return levels
+
+def walkdirections(seed: str, steps: int):
+    """ Returns the directions of a seeded random walk (walks are seeded with "<seed>:<level index>:<walk>" strings) """
+    rng = random.Random(seed)
+    return [rng.choice(DIRECTIONS) for step in range(steps)]
+
+def step(gameplay: GameplaySequence, direction: str):
+    """ Moves the gameplay, returning "victory", "gameover" or None """
+    try:
+        gameplay.move(direction)
+    except GameplaySequence.Victory:
+        return "victory"
+    except GameplaySequence.GameOver:
+        return "gameover"
+    return None
+
+def state(gameplay: GameplaySequence, outcome: str):
+    """ Returns the gamestate compared between backends (only the occupied cells, so SparseMaps do not build their grid) """
+    return outcome, list(gameplay.map.occupied()), gameplay.character.coord, gameplay.character.haskey, list(gameplay.actions)
+
+def throughput(levels: list, backend: str = "dense", walks: int = 1000, steps: int = 100, seed: int = 0, allocations: int = 1000):
+    """ Plays walks random walks of at most steps directions on each level, returning a dict of stats.
+
+        moves_per_second and kicks_per_second are measured without tracing. A kick is an action which leaves the
+            Character in place.
+        allocated_per_move is the average memory (in bytes) allocated while making a move, measured with tracemalloc
+            over the first allocations moves.
+    """
+    mapclass = BACKENDS[backend]
+    stats = dict(backend = backend, walks = 0, moves = 0, actions = 0, kicks = 0, victories = 0, gameovers = 0, elapsed = 0.0)
+    for index, (grid, willpower, rulesets) in enumerate(levels):
+        initial = GameplaySequence(grid, willpower, rulesets = rulesets, mapclass = mapclass)
+        start = initial.snapshot()
+        for walk in range(walks):
+            directions = walkdirections(f"{seed}:{index}:{walk}", steps)
+            initial.restore(start)
+            moves = actions = kicks = 0
+            outcome = None
+            began = time.perf_counter()
+            for direction in directions:
+                coord, length = initial.character.coord, len(initial.actions)
+                outcome = step(initial, direction)
+                moves += 1
+                if len(initial.actions) > length:
+                    actions += 1
+                    if initial.character.coord == coord and outcome is None: kicks += 1
+                if outcome is not None: break
+            stats['elapsed'] += time.perf_counter() - began
+            stats['walks'] += 1
+            stats['moves'] += moves
+            stats['actions'] += actions
+            stats['kicks'] += kicks
+            if outcome == "victory": stats['victories'] += 1
+            elif outcome == "gameover": stats['gameovers'] += 1
+    elapsed = stats['elapsed']
+    stats['moves_per_second'] = stats['moves'] / elapsed if elapsed else 0.0
+    stats['kicks_per_second'] = stats['kicks'] / elapsed if elapsed else 0.0
+    stats['allocated_per_move'] = allocatedpermove(levels, mapclass, allocations, steps, seed) if allocations else None
+    return stats
+
+def allocatedpermove(levels: list, mapclass: type, moves: int, steps: int, seed: int):
+    """ Returns the average peak memory allocated by a move while replaying walks (see throughput).
+
+        Tracing is restarted before each move to reset its peak (tracemalloc.reset_peak requires Python 3.9), so the
+            traces of a caller which was already tracing are discarded (tracing itself is left enabled).
+    """
+    total = count = 0
+    tracing = tracemalloc.is_tracing()
+    frames = tracemalloc.get_traceback_limit() if tracing else 1
+    try:
+        walk = 0
+        while count < moves:
+            grid, willpower, rulesets = levels[walk % len(levels)]
+            gameplay = GameplaySequence(grid, willpower, rulesets = rulesets, mapclass = mapclass)
+            for direction in walkdirections(f"{seed}:allocations:{walk}", steps):
+                tracemalloc.stop()
+                tracemalloc.start(frames)
+                outcome = step(gameplay, direction)
+                total += tracemalloc.get_traced_memory()[1]
+                count += 1
+                if outcome is not None or count >= moves: break
+            walk += 1
+    finally:
+        if not tracing: tracemalloc.stop()
+        elif not tracemalloc.is_tracing(): tracemalloc.start(frames)
+    return total / count
+
+def diverges(level: tuple, directions: list, backends: tuple):
+    """ Plays the directions on the level with each backend. Returns the index of the first step at which a backend's
+        gamestate differs from the first backend's (None if they never differ).
+    """
+    grid, willpower, rulesets = level
+    gameplays = [GameplaySequence(grid, willpower, rulesets = rulesets, mapclass = BACKENDS[backend]) for backend in backends]
+    for index, direction in enumerate(directions):
+        states = []
+        for gameplay in gameplays:
+            try:
+                states.append(state(gameplay, step(gameplay, direction)))
+            except Exception as e:
+                ## Errors raised by a backend (rather than by the game) are also divergences
+                states.append(("error", type(e).__name__))
+        if any(other != states[0] for other in states[1:]): return index
+        if states[0][0] is not None: return None
+    return None
+
+def minimize(level: tuple, directions: list, backends: tuple):
+    """ Returns a shorter list of directions which still diverges (directions must diverge).
+
+        The walk is truncated after the first divergence and then chunks of directions are removed (halving the chunk
+            size down to single directions) as long as the remaining walk still diverges.
+    """
+    directions = list(directions[:diverges(level, directions, backends) + 1])
+    chunk = max(1, len(directions) // 2)
+    while True:
+        index, removed = 0, False
+        while index < len(directions):
+            candidate = directions[:index] + directions[index + chunk:]
+            if candidate and (divergence := diverges(level, candidate, backends)) is not None:
+                directions, removed = candidate[:divergence + 1], True
+            else:
+                index += chunk
+        if chunk == 1 and not removed: return directions
+        chunk = max(1, chunk // 2)
+
+def differential(levels: list, backends: tuple = ("dense", "sparse", "compiled"), walks: int = 1000, steps: int = 100, seed: int = 0):
+    """ Compares the backends on walks random walks of at most steps directions on each level.
+
+        Returns a dict of stats whose divergences are dicts of the level index, the walk seed, the step which first
+            diverged and a minimized reproducer (a list of directions).
+    """
+    stats = dict(backends = tuple(backends), walks = 0, divergences = [])
+    for index, level in enumerate(levels):
+        for walk in range(walks):
+            walkseed = f"{seed}:{index}:{walk}"
+            directions = walkdirections(walkseed, steps)
+            stats['walks'] += 1
+            if (divergence := diverges(level, directions, backends)) is None: continue
+            stats['divergences'].append(dict(level = index, seed = walkseed, step = divergence,
+                                             reproducer = minimize(level, directions, backends)))
+    return stats
@@ -0,0 +1,136 @@
+""" Helltaker.hints
+
+    Anytime hints for an in-progress GameplaySequence.
+
+    HintService keeps a graph of the states it has expanded (keyed by the layout of the map and whether the
+    Character has the key) between calls. Each call runs an A* search from the live gamestate over that graph,
+    only paying for states which have not been expanded before, and stops when it proves the cheapest
+    solution or runs out of its time budget. When the player moves, the next call re-roots at the new
+    gamestate, which is usually already in the graph.
+
+    States are expanded with unlimited Willpower, so the graph does not depend on the Willpower remaining;
+    the live Willpower is applied when searching the graph.
+"""
+## Builtin
+from collections import namedtuple
+import heapq
+import itertools
+import sys
+import time
+## This Module
+from Helltaker import GameplaySequence, TargetSquareRules
+from Helltaker.bidirectional import relaxeddistances
+from Helltaker.solver import layoutkey, successors
+
+Hint = namedtuple("hint", ["direction", "proven", "willpower"])
+
+## Sentinel for actions which result in Victory
+VICTORY = "victory"
+
+class Node():
+    """ A state in the HintService's graph. children is None until the Node is expanded. """
+    __slots__ = ("gameplay", "children")
+    def __init__(self, gameplay: GameplaySequence):
+        self.gameplay = gameplay
+        self.children = None
+
+    def expand(self):
+        """ Sets children to a list of (direction, key or VICTORY, cost) tuples and returns the new Nodes by key """
+        self.children, nodes = [], {}
+        length = self.gameplay.action_length()
+        for direction, child, outcome in successors(self.gameplay):
+            if isinstance(outcome, GameplaySequence.Victory):
+                self.children.append((direction, VICTORY, 1))
+            elif outcome is None:
+                key = (layoutkey(child), child.character.haskey)
+                self.children.append((direction, key, child.action_length() - length))
+                nodes[key] = Node(child)
+        return nodes
+
+class HintService():
+    """ Provides the best next direction for an in-progress GameplaySequence within a time budget.
+
+        maxnodes is the maximum number of Nodes in the graph: a search stops expanding (returning its best unproven
+            Hint) when the graph reaches it, and the next call starts with an empty graph.
+    """
+    def __init__(self, maxnodes: int = 200000):
+        self.maxnodes = maxnodes
+        self.nodes = {}
+        self.level = None
+        self.stats = dict(searches = 0, expanded = 0, reused = 0, truncated = 0)
+
+    def reset(self):
+        self.nodes.clear()
+        self.level = None
+
+    def root(self, gameplay: GameplaySequence):
+        """ Returns the key for the gameplay, adding it to the graph (and clearing the graph if the level has changed) """
+        level = (gameplay.map.width, gameplay.map.height, tuple(gameplay.rulesets))
+        if level != self.level or len(self.nodes) >= self.maxnodes:
+            self.reset()
+            self.level = level
+        key = (layoutkey(gameplay), gameplay.character.haskey)
+        if key not in self.nodes:
+            root = gameplay.copy()
+            root.character.willpower = sys.maxsize
+            self.nodes[key] = Node(root)
+        return key
+
+    def hint(self, gameplay: GameplaySequence, budget: float = 0.05):
+        """ Returns a Hint for the gameplay, searching for at most budget seconds.
+
+            If proven is True, direction is the first action of the cheapest solution and willpower is the Willpower
+                it requires (direction is None if the level cannot be won from the current gamestate).
+            Otherwise, direction leads towards the most promising state found (according to an admissible
+                estimate of the Willpower still required) and willpower is that estimate.
+        """
+        deadline = time.perf_counter() + budget
+        self.stats['searches'] += 1
+        rootkey = self.root(gameplay)
+        root = self.nodes[rootkey]
+        remaining = gameplay.remaining_actions()
+
+        if TargetSquareRules in gameplay.rulesets:
+            distances = relaxeddistances(gameplay.map)
+            def heuristic(node):
+                parity = (len(node.gameplay.actions) - len(root.gameplay.actions)) % 2
+                return distances.get((tuple(node.gameplay.character.coord), parity))
+        else:
+            def heuristic(node): return 0
+
+        counter = itertools.count()
+        h = heuristic(root)
+        if h is None: return Hint(None, True, None)
+        ## Entries are (estimate, tiebreak, counter, cost, key, first direction): Victory is preferred on ties
+        queue = [(h, 1, next(counter), 0, rootkey, None)]
+        best = {rootkey: 0}
+        while queue:
+            f, _, _, g, key, first = queue[0]
+            if key is VICTORY: return Hint(first, True, f)
+            ## Stale entries, and states where the Character has no Willpower remaining to act, are not expanded
+            if best.get(key, g) < g or g >= remaining:
+                heapq.heappop(queue)
+                continue
+            node = self.nodes[key]
+            if node.children is None:
+                ## The root is always expanded so that there is a direction to return
+                if first is not None and time.perf_counter() > deadline: return Hint(first, False, f)
+                if first is not None and len(self.nodes) >= self.maxnodes:
+                    self.stats['truncated'] += 1
+                    return Hint(first, False, f)
+                for childkey, child in node.expand().items():
+                    self.nodes.setdefault(childkey, child)
+                self.stats['expanded'] += 1
+            else:
+                self.stats['reused'] += 1
+            heapq.heappop(queue)
+            for direction, childkey, cost in node.children:
+                step = first or direction
+                if childkey is VICTORY:
+                    heapq.heappush(queue, (g + 1, 0, next(counter), g + 1, VICTORY, step))
+                    continue
+                if best.get(childkey, g + cost + 1) <= g + cost: continue
+                best[childkey] = g + cost
+                if (h := heuristic(self.nodes[childkey])) is None: continue
+                heapq.heappush(queue, (g + cost + h, 1, next(counter), g + cost, childkey, step))
+        return Hint(None, True, None)
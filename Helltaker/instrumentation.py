@@ -0,0 +1,233 @@
+""" Helltaker.instrumentation
+
+    Opt-in counters for GameplaySequence and the search modules.
+
+    While an Instrumentation is enabled, the GameplaySequence, Map and Character methods it counts are
+    replaced with counting wrappers; they are restored when it is disabled, so there is no cost when
+    instrumentation is not in use. Search code checks the module-level ACTIVE Instrumentation once per
+    search and reports expanded nodes, frontier size and duplicate hits through it.
+
+    Counters can be exported as a dict, appended as json lines snapshots at an interval or written
+    in the Prometheus text format.
+"""
+## Builtin
+from collections import defaultdict
+from functools import wraps
+import json
+import os
+import time
+## This Module
+from Helltaker import Map, GameplaySequence
+
+## The currently enabled Instrumentation (None when disabled)
+ACTIVE = None
+## Marks attributes which did not exist on a class before they were instrumented (they are deleted when disabled)
+MISSING = object()
+
+def subclasses(cls: type):
+    """ Returns the class and all of its (direct and indirect) subclasses """
+    classes = [cls]
+    for subclass in cls.__subclasses__():
+        classes.extend(subclass for subclass in subclasses(subclass) if subclass not in classes)
+    return classes
+
+class Instrumentation():
+    """ Collects counters while enabled (using Instrumentation.enable or as a context manager).
+
+        Engine counters:
+            moves/steps: calls to GameplaySequence.move and GameplaySequence.step (which move calls)
+            actions: moves which resulted in an action
+            kicks/destroys: kicks, and kicks which destroyed the kicked entity
+            gate_unlocks/keys: Gates unlocked and Keys picked up
+            premove_checks/postmove_checks: calls to GameplaySequence.runchecks for each phase (which premove_checks/postmove_checks call)
+        Search counters:
+            expanded/generated/duplicates: nodes expanded, children generated and children dropped as duplicates
+            frontier (gauge): the size of the search frontier after the last expansion
+        Rule timings record the calls and total time of each GameplayRule callback (the PREMOVE/POSTMOVE lists of
+            each GameplayRule are replaced with timing wrappers when it is first checked and restored when disabled).
+
+        jsonl is an optional path which snapshots are appended to (at most once every interval seconds) when tick is called.
+    """
+    def __init__(self, jsonl: str = None, interval: float = 1.0):
+        self.jsonl = jsonl
+        self.interval = interval
+        self.counters = defaultdict(int)
+        self.gauges = {}
+        ## (rule name, callback name) -> [calls, seconds]
+        self.rules = defaultdict(lambda: [0, 0.0])
+        self.started = time.perf_counter()
+        self.lastsnapshot = self.started
+        self._originals = {}
+
+    def count(self, name: str, value: int = 1):
+        self.counters[name] += value
+
+    def gauge(self, name: str, value):
+        self.gauges[name] = value
+
+    def expanded(self, generated: int, duplicates: int, frontier: int):
+        """ Reports a single node expansion from a search """
+        counters = self.counters
+        counters['expanded'] += 1
+        counters['generated'] += generated
+        counters['duplicates'] += duplicates
+        self.gauges['frontier'] = frontier
+        self.tick()
+
+    def tick(self):
+        """ Appends a snapshot to the jsonl file if the interval has elapsed since the last snapshot """
+        if self.jsonl is None: return
+        if (now := time.perf_counter()) - self.lastsnapshot >= self.interval:
+            self.lastsnapshot = now
+            self.snapshot()
+
+    def snapshot(self):
+        """ Appends the current counters to the jsonl file """
+        with open(self.jsonl, 'a') as f:
+            f.write(json.dumps(dict(timestamp = time.time(), **self.asdict()), separators = (",",":")) + "\n")
+
+    def asdict(self):
+        elapsed = time.perf_counter() - self.started
+        counters = dict(self.counters)
+        generated = counters.get('generated', 0)
+        return dict(
+            elapsed = elapsed,
+            counters = counters,
+            gauges = dict(self.gauges),
+            rules = {f"{rule}.{callback}": dict(calls = calls, seconds = seconds) for (rule, callback), (calls, seconds) in self.rules.items()},
+            rates = dict(
+                nodes_per_second = counters.get('expanded', 0) / elapsed if elapsed else 0.0,
+                moves_per_second = counters.get('moves', 0) / elapsed if elapsed else 0.0,
+                dedup_hit_rate = counters.get('duplicates', 0) / generated if generated else 0.0,
+            )
+        )
+
+    def prometheus(self):
+        """ Returns the counters in the Prometheus text format """
+        lines = []
+        for name, value in sorted(self.counters.items()):
+            lines += [f"# TYPE helltaker_{name}_total counter", f"helltaker_{name}_total {value}"]
+        for name, value in sorted(self.gauges.items()):
+            lines += [f"# TYPE helltaker_{name} gauge", f"helltaker_{name} {value}"]
+        if self.rules:
+            lines.append("# TYPE helltaker_rule_calls_total counter")
+            lines += [f'helltaker_rule_calls_total{{rule="{rule}",callback="{callback}"}} {calls}' for (rule, callback), (calls, _) in sorted(self.rules.items())]
+            lines.append("# TYPE helltaker_rule_seconds_total counter")
+            lines += [f'helltaker_rule_seconds_total{{rule="{rule}",callback="{callback}"}} {seconds}' for (rule, callback), (_, seconds) in sorted(self.rules.items())]
+        return "\n".join(lines) + "\n"
+
+    def writeprometheus(self, path: str):
+        """ Atomically writes the Prometheus text format to path (for use with a textfile collector) """
+        temp = path + ".tmp"
+        with open(temp, 'w') as f:
+            f.write(self.prometheus())
+        os.replace(temp, path)
+
+    def _wrappers(self):
+        """ Returns (class, attribute, wrapper factory) tuples for the methods which are instrumented (on the class and every subclass which overrides them) """
+        counters, rules = self.counters, self.rules
+
+        def move(func):
+            @wraps(func)
+            def inner(gameplay, *args, **kw):
+                counters['moves'] += 1
+                return func(gameplay, *args, **kw)
+            return inner
+
+        def step(func):
+            @wraps(func)
+            def inner(gameplay, *args, **kw):
+                counters['steps'] += 1
+                return func(gameplay, *args, **kw)
+            return inner
+
+        def updatemap(func):
+            @wraps(func)
+            def inner(gameplay):
+                counters['actions'] += 1
+                return func(gameplay)
+            return inner
+
+        def kick(func):
+            @wraps(func)
+            def inner(_map, entity, start, target):
+                counters['kicks'] += 1
+                result = func(_map, entity, start, target)
+                if result is None: counters['destroys'] += 1
+                return result
+            return inner
+
+        def removeentity(func):
+            @wraps(func)
+            def inner(_map, entity, coord):
+                if entity == "G": counters['gate_unlocks'] += 1
+                elif entity == "K": counters['keys'] += 1
+                return func(_map, entity, coord)
+            return inner
+
+        def runchecks(func):
+            @wraps(func)
+            def inner(gameplay, phase):
+                counters[f"{phase.lower()}_checks"] += 1
+                ## GameplayRules are timed when they are first checked (they can be created after enabling)
+                for rule in gameplay.rulesets:
+                    if (rule, phase) not in self._originals: self._timerule(rule, phase)
+                return func(gameplay, phase)
+            return inner
+
+        return [
+            (GameplaySequence, "move", move),
+            (GameplaySequence, "step", step),
+            (GameplaySequence, "updatemap", updatemap),
+            (GameplaySequence, "runchecks", runchecks),
+            (Map, "kick", kick),
+            (Map, "removeentity", removeentity),
+        ]
+
+    def _timerule(self, rule: type, phase: str):
+        """ Replaces the rule's callbacks for the phase with wrappers which record their calls and time """
+        rules = self.rules
+        def timed(condition):
+            @wraps(condition)
+            def inner(gameplay):
+                start = time.perf_counter()
+                try:
+                    return condition(gameplay)
+                finally:
+                    timing = rules[(rule.__name__, condition.__name__)]
+                    timing[0] += 1
+                    timing[1] += time.perf_counter() - start
+            ## Subclasses which inherit the callbacks wrap the original callback instead
+            inner.untimed = condition
+            return inner
+        self._originals[(rule, phase)] = rule.__dict__.get(phase, MISSING)
+        setattr(rule, phase, [timed(getattr(condition, "untimed", condition)) for condition in getattr(rule, phase)])
+
+    def enable(self):
+        """ Installs the counting wrappers and makes this the ACTIVE Instrumentation """
+        global ACTIVE
+        if ACTIVE is not None: raise RuntimeError("Another Instrumentation is already enabled")
+        for base, name, factory in self._wrappers():
+            ## Subclasses which override the method (e.g. SparseMap.removeentity) are wrapped as well
+            for cls in subclasses(base):
+                if name not in cls.__dict__: continue
+                original = cls.__dict__[name]
+                self._originals[(cls, name)] = original
+                setattr(cls, name, factory(original))
+        ACTIVE = self
+        return self
+
+    def disable(self):
+        """ Restores the original methods """
+        global ACTIVE
+        if ACTIVE is not self: return
+        for (cls, name), original in self._originals.items():
+            if original is MISSING: delattr(cls, name)
+            else: setattr(cls, name, original)
+        self._originals.clear()
+        ACTIVE = None
+
+    def __enter__(self):
+        return self.enable()
+    def __exit__(self, *exc):
+        self.disable()
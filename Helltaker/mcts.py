@@ -0,0 +1,166 @@
+""" Helltaker.mcts
+
+    Monte-Carlo tree search for levels which are too large for exhaustive search.
+
+    Simulations select a path through the tree using UCT, expand one new action and then play a cheap
+    rollout (random, or greedy towards the nearest Target) until the game ends or a GameplayRule reports
+    that it is unwinnable. All simulations are played on a single GameplaySequence which is rolled back
+    with GameplaySequence.snapshot/restore rather than copied.
+"""
+## Builtin
+import math
+import random
+import time
+## This Module
+from Helltaker import DIRECTIONTRANS, GameplaySequence, Status, TargetSquareRules
+from Helltaker.bidirectional import relaxeddistances
+
+VICTORY, GAMEOVER, UNWINNABLE = "victory", "gameover", "unwinnable"
+
+def play(gameplay: GameplaySequence, direction: str):
+    """ Moves the gameplay in the given direction.
+
+        Returns an (acted, outcome) tuple: acted is whether the move was an action and outcome is VICTORY,
+            GAMEOVER, UNWINNABLE or None (if the game continues).
+    """
+    status = gameplay.step(direction)
+    if status == Status.VICTORY: return True, VICTORY
+    if status.gameover: return True, GAMEOVER
+    if status == Status.NOOP: return False, None
+    if gameplay.unwinnable(): return True, UNWINNABLE
+    return True, None
+
+class TreeNode():
+    __slots__ = ("parent", "direction", "children", "untried", "visits", "value", "outcome")
+    def __init__(self, parent, direction: str, outcome: str = None):
+        self.parent = parent
+        self.direction = direction
+        self.children = []
+        self.untried = list(DIRECTIONTRANS)
+        self.visits = 0
+        self.value = 0.0
+        self.outcome = outcome
+
+    def uct(self, exploration: float):
+        return self.value / self.visits + exploration * math.sqrt(math.log(self.parent.visits) / self.visits)
+
+class MonteCarloTreeSearch():
+    """ UCT search from the given gameplay.
+
+        exploration is the UCT exploration constant.
+        policy is the rollout policy: "random", or "greedy" which (for TargetSquareRules levels) prefers moving towards
+            the nearest Target according to bidirectional.relaxeddistances, choosing randomly with probability epsilon.
+        Rollouts which result in Victory are rewarded 1, all other rollouts 0; the root's average reward therefore
+            estimates the difficulty of the level (the chance of winning by playing semi-randomly).
+    """
+    def __init__(self, gameplay: GameplaySequence, exploration: float = math.sqrt(2), policy: str = "random",
+                 epsilon: float = 0.25, seed: int = None):
+        if policy not in ("random", "greedy"): raise ValueError(f"Unknown policy: {policy}")
+        self.gameplay = gameplay.copy()
+        self.offset, self.spent = len(gameplay.actions), gameplay.action_length()
+        self.rootsnapshot = self.gameplay.snapshot()
+        self.root = TreeNode(None, None)
+        self.exploration = exploration
+        self.policy = policy
+        self.epsilon = epsilon
+        self.random = random.Random(seed)
+        self.distances = relaxeddistances(gameplay.map) if policy == "greedy" and TargetSquareRules in gameplay.rulesets else None
+        ## The cheapest winning actions found by any simulation and the Willpower they require
+        self.solution = self.willpower = None
+        self.stats = dict(simulations = 0, victories = 0, nodes = 1, elapsed = 0.0)
+
+    def rolloutdirections(self):
+        """ Returns the directions to try (in order) for the next rollout action """
+        directions = list(DIRECTIONTRANS)
+        self.random.shuffle(directions)
+        if self.distances is None or self.random.random() < self.epsilon: return directions
+        column, row = self.gameplay.character.coord
+        parity = (len(self.gameplay.actions) - self.offset + 1) % 2
+        def estimate(direction):
+            deltax, deltay = DIRECTIONTRANS[direction]
+            return self.distances.get(((column + deltax, row + deltay), parity), math.inf)
+        return sorted(directions, key = estimate)
+
+    def rollout(self):
+        """ Plays rollout actions on the gameplay until the game ends. Returns the outcome. """
+        while True:
+            for direction in self.rolloutdirections():
+                acted, outcome = play(self.gameplay, direction)
+                if acted: break
+            else:
+                ## The Character is surrounded by walls
+                return UNWINNABLE
+            if outcome is not None: return outcome
+
+    def simulate(self):
+        """ Runs a single simulation """
+        gameplay = self.gameplay
+        gameplay.restore(self.rootsnapshot)
+        node = self.root
+        ## Selection
+        while node.outcome is None and not node.untried and node.children:
+            node = max(node.children, key = lambda child: child.uct(self.exploration))
+            play(gameplay, node.direction)
+        ## Expansion
+        while node.outcome is None and node.untried:
+            direction = node.untried.pop(self.random.randrange(len(node.untried)))
+            acted, outcome = play(gameplay, direction)
+            if not acted: continue
+            child = TreeNode(node, direction, outcome)
+            node.children.append(child)
+            self.stats['nodes'] += 1
+            node = child
+            break
+        ## Rollout
+        outcome = node.outcome
+        if outcome is None:
+            outcome = self.rollout() if node.children or node.untried else UNWINNABLE
+        if outcome == VICTORY:
+            self.stats['victories'] += 1
+            actions = gameplay.actions[self.offset:]
+            ## Spike damage taken on the winning action does not matter: the action only requires 1 Willpower
+            cost = gameplay.action_length() - self.spent - actions[-1].isupper()
+            if self.willpower is None or cost < self.willpower: self.solution, self.willpower = actions, cost
+        ## Backpropagation
+        reward = 1.0 if outcome == VICTORY else 0.0
+        while node is not None:
+            node.visits += 1
+            node.value += reward
+            node = node.parent
+        self.stats['simulations'] += 1
+
+    def run(self, simulations: int = None, budget: float = None):
+        """ Runs simulations until the given number of simulations have been run or budget seconds have elapsed.
+
+            At least one of simulations or budget must be provided.
+            Returns the stats dict.
+        """
+        if simulations is None and budget is None: raise ValueError("Either simulations or budget is required")
+        start = time.perf_counter()
+        deadline = None if budget is None else start + budget
+        count = 0
+        while (simulations is None or count < simulations) and (deadline is None or time.perf_counter() < deadline):
+            self.simulate()
+            count += 1
+        self.stats['elapsed'] += time.perf_counter() - start
+        return self.stats
+
+    def rollouts_per_second(self):
+        return self.stats['simulations'] / self.stats['elapsed'] if self.stats['elapsed'] else 0.0
+
+    def winrate(self):
+        """ The average reward of the root: an estimate of how likely the level is to be won by semi-random play """
+        return self.root.value / self.root.visits if self.root.visits else 0.0
+
+    def bestdirection(self):
+        """ Returns the most visited direction from the root (None if no simulations have been run) """
+        if not self.root.children: return None
+        return max(self.root.children, key = lambda child: child.visits).direction
+
+    def principalvariation(self):
+        """ Returns the directions obtained by following the most visited child from the root """
+        directions, node = [], self.root
+        while node.children:
+            node = max(node.children, key = lambda child: child.visits)
+            directions.append(node.direction)
+        return directions
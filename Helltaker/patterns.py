@@ -0,0 +1,237 @@
+""" Helltaker.patterns
+
+    Pattern-database heuristics for levels using TargetSquareRules.
+
+    A pattern database of a given size solves a relaxed version of the level exactly: only the Walls, laser
+    generators, Targets, the Character and size Blocks exist, and every action costs 1 Willpower. Every
+    state of the relaxed level (Character cell and Block cells) is solved at once by a breadth-first search
+    backwards from the Targets, and the number of actions required is stored in a bytearray indexed by the
+    rank of the state.
+
+    Every real action is also possible in the relaxed level (or leaves the relaxed state unchanged), so the
+    relaxed cost of any size Blocks of a state is a lower bound on the Willpower required to win: the
+    heuristic is the maximum over the databases and every subset of the state's Blocks. Skeletons are not
+    part of the patterns because they can be destroyed by spikes or by being kicked into other entities,
+    which the relaxed level cannot represent without losing admissibility.
+
+    The databases only depend on the static entities, so they are cached on disk by a fingerprint of those
+    entities. They can be built in parallel: the search is run a layer (every state with the same cost) at a
+    time, and large layers are split into chunks which a pool of processes expands into a table in shared memory.
+"""
+## Builtin
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import itertools
+import json
+import math
+from multiprocessing import shared_memory
+import os
+## This Module
+from Helltaker import DIRECTIONTRANS, GameplayRule, GameplaySequence, Map, TargetSquareRules
+
+## Entities which are walls in the relaxed level
+STATICENTITIES = ("W", "0", "1", "2", "3")
+## Stored for states from which the Targets cannot be reached
+UNREACHABLE = 255
+OPPOSITE = {"up": "down", "right": "left", "down": "up", "left": "right"}
+## Layers with fewer states than this are expanded by the building process instead of the pool
+CHUNKSIZE = 2048
+## The shared table and relaxed level of a pool process (see initworker)
+WORKER = {}
+
+def level(_map: Map):
+    """ Returns the (width, height, static cells, target cells) of the relaxed level, with cells as indices (row * width + column) """
+    width = _map.width
+    static = tuple(r * width + c for r, row in enumerate(_map.grid) for c, cell in enumerate(row) if any(entity in cell for entity in STATICENTITIES))
+    targets = tuple(r * width + c for r, row in enumerate(_map.grid) for c, cell in enumerate(row) if "T" in cell)
+    return width, _map.height, static, targets
+
+def fingerprint(width: int, height: int, static: tuple, targets: tuple, size: int):
+    """ Returns a hex digest identifying a pattern database """
+    return hashlib.sha256(json.dumps([width, height, static, targets, size]).encode()).hexdigest()
+
+def rank(cells: tuple):
+    """ Returns the rank of a sorted tuple of distinct cells in the combinatorial number system """
+    return sum(math.comb(cell, i + 1) for i, cell in enumerate(cells))
+
+def neighbourtable(width: int, height: int, static: tuple):
+    """ Returns a list of {direction: adjacent cell} dicts for each cell of the relaxed level (None for Walls and the edge of the Map) """
+    static = set(static)
+    neighbours = []
+    for cell in range(width * height):
+        column, row = cell % width, cell // width
+        adjacent = {}
+        for direction, (deltax, deltay) in DIRECTIONTRANS.items():
+            c, r = column + deltax, row + deltay
+            adjacent[direction] = r * width + c if 0 <= c < width and 0 <= r < height and r * width + c not in static else None
+        neighbours.append(adjacent)
+    return neighbours
+
+def predecessors(neighbours: list, character: int, blocks: tuple):
+    """ Yields the (character, blocks) states of the relaxed level from which a single action reaches the given state """
+    occupied = set(blocks)
+    for direction, adjacent in neighbours[character].items():
+        ## Predecessor: the Character walked here from the opposite cell
+        previous = neighbours[character][OPPOSITE[direction]]
+        if previous is not None and previous not in occupied: yield previous, blocks
+        ## Predecessor: the Character kicked a Block from the adjacent cell to the cell beyond it
+        if adjacent is None or adjacent in occupied: continue
+        beyond = neighbours[adjacent][direction]
+        if beyond is None or beyond not in occupied: continue
+        yield character, tuple(sorted(occupied - {beyond} | {adjacent}))
+
+def expand(table, combinations: int, neighbours: list, layer: list, cost: int):
+    """ Stores cost for the predecessors of the layer's states which have no cost yet, returning them (the next layer) """
+    following = []
+    for character, blocks in layer:
+        for previous, previousblocks in predecessors(neighbours, character, blocks):
+            index = previous * combinations + rank(previousblocks)
+            if table[index] == UNREACHABLE:
+                table[index] = cost
+                following.append((previous, previousblocks))
+    return following
+
+def initworker(name: str, combinations: int, neighbours: list):
+    """ Attaches a pool process to the shared table of a parallel build """
+    memory = shared_memory.SharedMemory(name = name)
+    WORKER.update(memory = memory, table = memory.buf, combinations = combinations, neighbours = neighbours)
+
+def expandchunk(layer: list, cost: int):
+    """ expand for a chunk of a layer in a pool process """
+    return expand(WORKER['table'], WORKER['combinations'], WORKER['neighbours'], layer, cost)
+
+def build(width: int, height: int, static: tuple, targets: tuple, size: int, processes: int = 1):
+    """ Solves every state of the relaxed level with size Blocks, returning the number of actions each requires as a bytearray.
+
+        The index of a state is character * comb(cells, size) + rank(blocks).
+        Costs of UNREACHABLE (or more) are stored as UNREACHABLE.
+        With more than one process, each layer of at least CHUNKSIZE states is split into chunks expanded by a pool of
+            processes. Processes which find the same state in the same layer store the same cost, so the table is
+            shared without locking (the duplicates are removed from the next layer).
+    """
+    cells = width * height
+    combinations = math.comb(cells, size)
+    neighbours = neighbourtable(width, height, static)
+    static = set(static)
+    free = [cell for cell in range(cells) if cell not in static]
+    layer = [(target, blocks) for target in targets for blocks in itertools.combinations([cell for cell in free if cell != target], size)]
+    if processes <= 1:
+        table = bytearray([UNREACHABLE]) * (cells * combinations)
+        return searchlayers(table, combinations, neighbours, layer)
+    memory = shared_memory.SharedMemory(create = True, size = cells * combinations)
+    try:
+        table = memory.buf
+        table[:] = bytes([UNREACHABLE]) * (cells * combinations)
+        with ProcessPoolExecutor(processes, initializer = initworker, initargs = (memory.name, combinations, neighbours)) as pool:
+            searchlayers(table, combinations, neighbours, layer, pool, processes)
+        result = bytearray(table)
+        del table
+        return result
+    finally:
+        memory.close()
+        memory.unlink()
+
+def searchlayers(table, combinations: int, neighbours: list, layer: list, pool: ProcessPoolExecutor = None, processes: int = 1):
+    """ Runs the breadth-first search backwards from the layer of goal states, returning the table """
+    for character, blocks in layer:
+        table[character * combinations + rank(blocks)] = 0
+    cost = 1
+    while layer and cost < UNREACHABLE:
+        if pool is None or len(layer) < CHUNKSIZE:
+            layer = expand(table, combinations, neighbours, layer, cost)
+        else:
+            ## Several chunks per process so that uneven chunks are balanced
+            step = -(-len(layer) // (4 * processes))
+            chunks = [layer[start: start + step] for start in range(0, len(layer), step)]
+            layer = list(dict.fromkeys(itertools.chain.from_iterable(pool.map(expandchunk, chunks, itertools.repeat(cost)))))
+        cost += 1
+    return table
+
+class PatternDatabase():
+    """ The solved relaxed level with size Blocks (see build) """
+    def __init__(self, width: int, height: int, static: tuple, targets: tuple, size: int, table: bytearray = None):
+        self.width, self.height, self.static, self.targets, self.size = width, height, tuple(static), tuple(targets), size
+        self.combinations = math.comb(width * height, size)
+        self.table = build(width, height, static, targets, size) if table is None else table
+
+    @property
+    def fingerprint(self):
+        return fingerprint(self.width, self.height, self.static, self.targets, self.size)
+
+    def lookup(self, character: int, blocks: tuple):
+        """ Returns the relaxed cost for the Character and the sorted Block cells (math.inf if the Targets cannot be reached) """
+        cost = self.table[character * self.combinations + rank(blocks)]
+        return math.inf if cost == UNREACHABLE else cost
+
+    def save(self, path: str):
+        """ Writes the table to path (atomically) """
+        temp = path + ".tmp"
+        with open(temp, "wb") as f:
+            f.write(self.table)
+        os.replace(temp, path)
+
+class PatternDatabases():
+    """ A set of pattern databases for a level and the admissible heuristic they provide.
+
+        sizes are the numbers of Blocks in each pattern database.
+        directory is an optional cache directory: databases are loaded from (and saved to) files named by their fingerprint.
+        processes is the number of processes used to build each database which is not cached (default 1; None uses
+            every CPU; see build).
+        Raises a ValueError if the gameplay does not use TargetSquareRules.
+    """
+    def __init__(self, gameplay: GameplaySequence, sizes: tuple = (0, 1, 2), directory: str = None, processes: int = 1):
+        if TargetSquareRules not in gameplay.rulesets: raise ValueError("Pattern databases require TargetSquareRules")
+        self.width, self.height, self.static, self.targets = level(gameplay.map)
+        self.stats = dict(built = 0, loaded = 0)
+        self.databases = {}
+        missing = []
+        for size in sizes:
+            path = self.path(directory, size)
+            if path and os.path.exists(path):
+                with open(path, "rb") as f:
+                    self.databases[size] = PatternDatabase(self.width, self.height, self.static, self.targets, size, bytearray(f.read()))
+                self.stats['loaded'] += 1
+            else:
+                missing.append(size)
+        processes = processes or os.cpu_count() or 1
+        for size in missing:
+            table = build(self.width, self.height, self.static, self.targets, size, processes)
+            self.databases[size] = database = PatternDatabase(self.width, self.height, self.static, self.targets, size, table)
+            self.stats['built'] += 1
+            if (path := self.path(directory, size)): database.save(path)
+
+    def path(self, directory: str, size: int):
+        if directory is None: return None
+        return os.path.join(directory, fingerprint(self.width, self.height, self.static, self.targets, size) + ".pdb")
+
+    def heuristic(self, gameplay: GameplaySequence):
+        """ Returns a lower bound on the Willpower required to win from the gameplay (math.inf if it cannot be won) """
+        grid, width = gameplay.map.grid, self.width
+        character = gameplay.character.coord.row * width + gameplay.character.coord.column
+        blocks = [r * width + c for r, row in enumerate(grid) for c, cell in enumerate(row) if "B" in cell]
+        best = 0
+        for size, database in self.databases.items():
+            if size > len(blocks): continue
+            for pattern in itertools.combinations(blocks, size):
+                if (cost := database.lookup(character, pattern)) > best:
+                    best = cost
+                    if best == math.inf: return best
+        return best
+
+    __call__ = heuristic
+
+    def unwinnable(self, gameplay: GameplaySequence):
+        """ Returns whether the heuristic shows the gameplay cannot be won with its remaining Willpower """
+        return self.heuristic(gameplay) > gameplay.remaining_actions()
+
+    def rule(self):
+        """ Returns a GameplayRule whose unwinnable uses these databases (to be added to a GameplaySequence's rulesets) """
+        databases = self
+        class PatternDatabaseRules(GameplayRule):
+            """ Prunes gamestates which the pattern databases show cannot be won """
+            def unwinnable(gameplay: GameplaySequence):
+                return databases.unwinnable(gameplay)
+            PREMOVE = []
+            POSTMOVE = []
+            REBUILD = (databases.rule, ())
+        return PatternDatabaseRules
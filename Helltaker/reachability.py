@@ -0,0 +1,157 @@
+""" Helltaker.reachability
+
+    Character-reachability normalization and push macro-moves.
+
+    Walking through free cells only changes where the Character stands (and the phase of the spikes), so
+    the states of a search which differ only by the Character's position inside the region it can walk
+    around in are equivalent up to the Willpower spent walking. A state is normalized to its Region: the
+    free cells the Character can walk to without kicking anything, with the Willpower required to reach
+    each cell (including spike damage). States are then identified by (layout without the Character,
+    whether the Character has the key, spike phase, region), and searches only expand "push" macro-moves:
+    a walk through the region followed by an action which changes the layout (a kick, picking up the Key,
+    opening a Gate or reaching a Target).
+
+    Cells are only free if they contain no Blocking entities, Keys, Targets or lasers. The grid is
+    bipartite, so the number of steps taken to reach a cell (and therefore the spike phase there) only
+    depends on the cell. While a Skeleton stands on spikes the layout changes as the spikes cycle, so
+    such states are not normalized and every action is treated as a macro-move.
+"""
+## Builtin
+from collections import namedtuple
+import heapq
+import itertools
+import math
+## This Module
+from Helltaker import BLOCKINGENTITIES, DIRECTIONTRANS, GameplaySequence, Map
+from Helltaker.bidirectional import isdamaging, lasered, spikes
+from Helltaker.solver import SearchResult
+
+Region = namedtuple("region", ["costs", "paths", "stable"])
+""" costs: a dict of the Willpower required to walk to each cell ((column, row) tuples) in the region
+    paths: a dict of the actions recorded walking to each cell (capitalized where spikes cause damage)
+    stable: whether the layout stays the same while walking (False if a Skeleton stands on spikes)
+"""
+
+def isfree(_map: Map, cell: tuple, beams: set):
+    """ Returns whether walking into the cell only moves the Character """
+    entities = _map.getentities(cell)
+    return cell not in beams and "K" not in entities and "T" not in entities and not any(entity in entities for entity in BLOCKINGENTITIES)
+
+def region(gameplay: GameplaySequence):
+    """ Computes the Region the Character can walk around in with its remaining Willpower """
+    _map = gameplay.map
+    start = tuple(gameplay.character.coord)
+    remaining = gameplay.remaining_actions()
+    spikecells = spikes(_map)
+    stable = not any("S" in _map.getentities(cell) for cell in spikecells)
+    costs, paths = {start: 0}, {start: []}
+    if not stable: return Region(costs, paths, stable)
+    beams = lasered(_map)
+    counter = itertools.count()
+    queue = [(0, next(counter), start, 0)]
+    while queue:
+        cost, _, cell, steps = heapq.heappop(queue)
+        if costs[cell] < cost: continue
+        ## The Character cannot act without Willpower remaining
+        if cost >= remaining: continue
+        column, row = cell
+        for direction, (deltax, deltay) in DIRECTIONTRANS.items():
+            nextcell = (column + deltax, row + deltay)
+            if _map.capcoord(nextcell) is None or not isfree(_map, nextcell, beams): continue
+            damage = isdamaging(spikecells, nextcell, (steps + 1) % 2)
+            nextcost = cost + 1 + damage
+            if nextcost < costs.get(nextcell, math.inf):
+                costs[nextcell], paths[nextcell] = nextcost, paths[cell] + [direction.upper() if damage else direction]
+                heapq.heappush(queue, (nextcost, next(counter), nextcell, steps + 1))
+    return Region(costs, paths, stable)
+
+def normalize(gameplay: GameplaySequence):
+    """ Returns a (key, Region) tuple for the gameplay.
+
+        Gameplays with the same key differ only by where the Character stands in its Region, so one
+            gameplay's future is at least as cheap as another's if its Region's costs are no higher.
+    """
+    _map = gameplay.map
+    walk = region(gameplay)
+    layout = tuple("".join(sorted(cell.replace("C", ""))) for row in _map.grid for cell in row)
+    ## The phase of the spikes at each cell of the region depends on the color of the cell the Character entered at
+    column, row = gameplay.character.coord
+    phase = (column + row) % 2 if any("P" in cell or "p" in cell for cell in layout) else 0
+    return (layout, gameplay.character.haskey, phase, min(walk.costs)), walk
+
+def pushes(gameplay: GameplaySequence, walk: Region, cells: list = None):
+    """ Yields a (cell, directions, child, outcome) tuple for each push macro-move.
+
+        cells are the cells of the Region to push from (default: all of them).
+        directions are the walk through the Region followed by the push, child is a copy of gameplay after
+            the macro-move and outcome is the Victory or GameOver Exception that was raised (otherwise None).
+        The walk is not replayed action by action: the Character is placed at the end of the walk and the spikes
+            are cycled, which is equivalent because walking only moves the Character.
+    """
+    _map = gameplay.map
+    beams = lasered(_map)
+    remaining = gameplay.remaining_actions()
+    for cell in (walk.costs if cells is None else cells):
+        if walk.costs[cell] >= remaining: continue
+        column, row = cell
+        for direction, (deltax, deltay) in DIRECTIONTRANS.items():
+            target = (column + deltax, row + deltay)
+            if _map.capcoord(target) is None or target in beams: continue
+            entities = _map.getentities(target)
+            if walk.stable and isfree(_map, target, beams): continue
+            ## Walls and laser generators cannot be moved into and locked Gates cannot be opened
+            if not (walk.stable is False or _map.iskickable(target) or "K" in entities or "T" in entities
+                    or ("G" in entities and gameplay.character.haskey)):
+                continue
+            path = walk.paths[cell]
+            child = gameplay.copy()
+            if path:
+                child.map.moveentity("C", child.character.coord, cell)
+                child.character.coord = cell
+                if len(path) % 2: child.map.cyclespikes()
+                child.actions.extend(path)
+            try:
+                if child.move(direction) is None: continue
+            except (GameplaySequence.Victory, GameplaySequence.GameOver) as e:
+                yield cell, path + [direction], child, e
+            else:
+                yield cell, path + [direction], child, None
+
+def solve(gameplay: GameplaySequence):
+    """ Uniform-cost search (over Willpower) over push macro-moves.
+
+        A normalized state is only expanded again if the Character can now reach some cell of its Region more
+            cheaply, and only the macro-moves from those cells are generated, so the result is the cheapest solution.
+        Returns a SearchResult whose actions are the concrete actions taken after the given gameplay's current
+            actions (None if the level cannot be won) and whose stats include the Willpower they require and the
+            number of states collapsed by normalization.
+    """
+    offset, spent = len(gameplay.actions), gameplay.action_length()
+    stats = dict(expanded = 0, generated = 0, collapsed = 0, regions = 0, willpower = None)
+    counter = itertools.count()
+    frontier = [(spent, next(counter), gameplay)]
+    best, solution = {}, None
+    while frontier:
+        cost, _, current = heapq.heappop(frontier)
+        ## Every macro-move costs at least 1 Willpower
+        if solution is not None and cost + 1 >= stats['willpower'] + spent: break
+        key, walk = normalize(current)
+        known = best.setdefault(key, {})
+        improved = [cell for cell, walked in walk.costs.items() if cost + walked < known.get(cell, math.inf)]
+        if not improved:
+            stats['collapsed'] += 1
+            continue
+        if not known: stats['regions'] += 1
+        for cell in improved: known[cell] = cost + walk.costs[cell]
+        stats['expanded'] += 1
+        for cell, directions, child, outcome in pushes(current, walk, improved):
+            stats['generated'] += 1
+            if isinstance(outcome, GameplaySequence.Victory):
+                ## The winning action only requires 1 Willpower
+                willpower = cost + walk.costs[cell] + 1 - spent
+                if solution is None or willpower < stats['willpower']:
+                    stats['willpower'], solution = willpower, child.actions[offset:]
+                continue
+            if outcome is not None or child.unwinnable(): continue
+            heapq.heappush(frontier, (child.action_length(), next(counter), child))
+    return SearchResult(solution, stats)
@@ -0,0 +1,236 @@
+""" Helltaker.scheduler
+
+    Cost estimation and scheduling for solving large batches of levels.
+
+    estimate predicts how expensive a level is to solve without solving it. It samples random probes of the
+    level's state tree (Knuth's estimator: each probe walks from the root choosing a random action at every
+    state, and the product of the branching factors along the walk is an unbiased estimate of the number of
+    states at each depth) and caps the result with a bound on the number of distinct states derived from the
+    level's features (its open cells, kickable entities and whether it has a Key), since the solvers never
+    expand the same state twice.
+
+    Scheduler runs a batch of levels in worker processes, cheapest first, so a few very expensive levels
+    cannot hold up the rest of the batch. Each attempt runs with a time limit and (where the resource module
+    is available) a memory limit: attempts which exceed them are killed and requeued behind every level which
+    has not been attempted yet, with their budgets multiplied by backoff.
+"""
+## Builtin
+from collections import namedtuple
+import heapq
+import math
+import multiprocessing
+from multiprocessing.connection import wait
+import os
+import random
+import time
+## This Module
+from Helltaker import DIRECTIONTRANS, KICKABLEENTITIES, LASERTRANS, GameplaySequence
+from Helltaker import solver
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+## Possible results of an attempt
+RESULTS = ("solved", "unsolvable", "timeout", "memory", "error")
+
+Job = namedtuple("job", ["name", "gameplay", "estimate"])
+
+def features(gameplay: GameplaySequence):
+    """ Returns a dict of the features of the gameplay's level used by estimate:
+            willpower (remaining), area, open (cells which are not Walls or laser generators), kickables,
+            targets, spikes, lasers and key (whether a Key remains to be picked up or the Character has it)
+    """
+    counts = dict(willpower = gameplay.remaining_actions(), area = gameplay.map.width * gameplay.map.height,
+                  open = 0, kickables = 0, targets = 0, spikes = 0, lasers = 0, key = gameplay.character.haskey)
+    for row in gameplay.map.grid:
+        for entities in row:
+            if "W" in entities or any(laser in entities for laser in LASERTRANS):
+                counts['lasers'] += sum(laser in entities for laser in LASERTRANS)
+                continue
+            counts['open'] += 1
+            counts['kickables'] += sum(entity in entities for entity in KICKABLEENTITIES)
+            counts['targets'] += "T" in entities
+            counts['spikes'] += "P" in entities or "p" in entities
+            if "K" in entities: counts['key'] = True
+    return counts
+
+def statebound(counts: dict):
+    """ Returns an upper bound on the number of distinct states from a features dict: every placement of the
+        Character and the kickable entities on the open cells, with and without the Key
+    """
+    cells = max(counts['open'], 1)
+    return cells * math.comb(cells, min(counts['kickables'], cells)) * (2 if counts['key'] else 1)
+
+def probe(gameplay: GameplaySequence, rng: random.Random):
+    """ Walks randomly from the gameplay's state until a terminal (or unwinnable) state is chosen.
+
+        Returns Knuth's estimate of the size of the state tree: 1 + b1 + b1*b2 + ... where bi is the number
+            of actions available at the ith state of the walk.
+    """
+    gameplay = gameplay.copy()
+    total = weight = 1
+    while True:
+        root, children = gameplay.snapshot(), []
+        for direction in DIRECTIONTRANS:
+            status = gameplay.step(direction)
+            if status: children.append((direction, status.terminal or gameplay.unwinnable()))
+            gameplay.restore(root)
+        if not children: return total
+        weight *= len(children)
+        total += weight
+        direction, leaf = rng.choice(children)
+        if leaf: return total
+        gameplay.step(direction)
+
+def estimate(gameplay: GameplaySequence, probes: int = 32, seed: int = 0):
+    """ Estimates the cost of solving the gameplay (see the module documentation).
+
+        Returns the features dict updated with:
+            treesize: the mean of the probes' estimates of the size of the state tree
+            statebound: the bound on the number of distinct states (see statebound)
+            cost: the estimated number of states a solver expands (the smaller of treesize and statebound)
+            elapsed: the time taken by the estimate
+    """
+    start = time.perf_counter()
+    rng = random.Random(seed)
+    counts = features(gameplay)
+    treesize = sum(probe(gameplay, rng) for i in range(probes)) / probes if probes else math.inf
+    counts.update(treesize = treesize, statebound = statebound(counts))
+    counts['cost'] = min(treesize, counts['statebound'])
+    counts['elapsed'] = time.perf_counter() - start
+    return counts
+
+def shard(jobs: list, count: int):
+    """ Splits the jobs into count lists with roughly equal total estimated cost (the most expensive job is always
+        assigned to the list with the least cost so far)
+    """
+    shards = [[] for i in range(count)]
+    loads = [(0, index) for index in range(count)]
+    for job in sorted(jobs, key = lambda job: job.estimate['cost'], reverse = True):
+        load, index = heapq.heappop(loads)
+        shards[index].append(job)
+        heapq.heappush(loads, (load + job.estimate['cost'], index))
+    return shards
+
+def attempt(connection, gameplay: GameplaySequence, solve, memory: int):
+    """ Solves the gameplay in a worker process, sending a (result, actions, stats) tuple through the connection """
+    try:
+        if memory and resource:
+            soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+            resource.setrlimit(resource.RLIMIT_AS, (memory if hard == resource.RLIM_INFINITY else min(memory, hard), hard))
+        actions, stats = solve(gameplay)
+        if resource: stats['maxrss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        connection.send(("solved" if actions is not None else "unsolvable", actions, stats))
+    except MemoryError:
+        connection.send(("memory", None, None))
+    except Exception as e:
+        connection.send(("error", None, dict(error = repr(e))))
+    finally:
+        connection.close()
+
+class Scheduler():
+    """ Solves a batch of levels in worker processes, cheapest first (see the module documentation).
+
+        solve is a picklable function which takes a GameplaySequence and returns a SearchResult (default: solver.uniformcost).
+        workers is the number of worker processes (default: every CPU).
+        timeout/memory are the time (in seconds) and memory (in bytes) limits of a level's first attempt (memory=None
+            does not limit memory). Each retry multiplies them by backoff; a level is attempted at most retries + 1 times.
+        probes/seed are passed to estimate.
+
+        stats:
+            levels/attempts: levels added and attempts started
+            solved/unsolvable/timeout/memory/error: the results of the attempts
+            requeued: attempts which were retried with a larger budget
+            estimating/elapsed: the time spent estimating levels and running the batch
+    """
+    def __init__(self, solve = solver.uniformcost, workers: int = None, timeout: float = 60.0, memory: int = None,
+                 backoff: float = 2.0, retries: int = 2, probes: int = 32, seed: int = 0):
+        self.solve = solve
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.memory = memory
+        self.backoff = backoff
+        self.retries = retries
+        self.probes = probes
+        self.seed = seed
+        self.jobs = []
+        self.stats = dict(levels = 0, attempts = 0, requeued = 0, estimating = 0.0, elapsed = 0.0, **{result: 0 for result in RESULTS})
+
+    def add(self, gameplay: GameplaySequence, name: str = None):
+        """ Estimates the gameplay's cost and adds it to the batch, returning its Job """
+        job = Job(name if name is not None else f"#{len(self.jobs)}", gameplay, estimate(gameplay, self.probes, self.seed))
+        self.jobs.append(job)
+        self.stats['levels'] += 1
+        self.stats['estimating'] += job.estimate['elapsed']
+        return job
+
+    def order(self):
+        """ Returns the jobs in the order they are first attempted (by ascending estimated cost) """
+        return sorted(self.jobs, key = lambda job: job.estimate['cost'])
+
+    def shards(self, count: int = None):
+        """ Splits the jobs into count (default: workers) lists of roughly equal total cost, e.g. for separate machines """
+        return shard(self.jobs, count or self.workers)
+
+    def budget(self, attempts: int):
+        """ Returns the (timeout, memory) of a level's attempt after the given number of failed attempts """
+        scale = self.backoff ** attempts
+        return self.timeout * scale, int(self.memory * scale) if self.memory else None
+
+    def run(self):
+        """ Yields a dict for each level as it finishes: name, result (one of RESULTS; the result of the last attempt),
+            actions (None unless the level was solved), stats (the solver's stats, or the error), attempts,
+            timeout/memory (the budget of the last attempt), elapsed (of the last attempt) and estimate.
+        """
+        context = multiprocessing.get_context()
+        ## (attempts, cost, index): levels are retried only after every level which has been attempted fewer times
+        queue = [(0, job.estimate['cost'], index) for index, job in enumerate(self.jobs)]
+        heapq.heapify(queue)
+        running, start = {}, time.perf_counter()
+        try:
+            while queue or running:
+                while queue and len(running) < self.workers:
+                    attempts, cost, index = heapq.heappop(queue)
+                    timeout, memory = self.budget(attempts)
+                    receiver, sender = context.Pipe(duplex = False)
+                    process = context.Process(target = attempt, args = (sender, self.jobs[index].gameplay, self.solve, memory), daemon = True)
+                    process.start()
+                    sender.close()
+                    running[receiver] = (process, index, attempts, timeout, memory, time.perf_counter())
+                    self.stats['attempts'] += 1
+                now = time.perf_counter()
+                deadline = min(started + timeout for process, index, attempts, timeout, memory, started in running.values())
+                ready = wait(list(running), timeout = max(deadline - now, 0))
+                now = time.perf_counter()
+                for receiver in list(running):
+                    process, index, attempts, timeout, memory, started = running[receiver]
+                    if receiver in ready:
+                        try:
+                            result, actions, stats = receiver.recv()
+                        except EOFError:
+                            ## The process died without reporting (e.g. it was killed for exceeding its memory)
+                            result, actions, stats = ("memory" if memory else "error"), None, None
+                    elif now - started >= timeout:
+                        process.kill()
+                        result, actions, stats = "timeout", None, None
+                    else:
+                        continue
+                    del running[receiver]
+                    receiver.close()
+                    process.join()
+                    self.stats[result] += 1
+                    self.stats['elapsed'] = now - start
+                    if result in ("timeout", "memory") and attempts < self.retries:
+                        self.stats['requeued'] += 1
+                        heapq.heappush(queue, (attempts + 1, self.jobs[index].estimate['cost'], index))
+                        continue
+                    job = self.jobs[index]
+                    yield dict(name = job.name, result = result, actions = actions, stats = stats, attempts = attempts + 1,
+                               timeout = timeout, memory = memory, elapsed = now - started, estimate = job.estimate)
+        finally:
+            for receiver, (process, *info) in running.items():
+                process.kill()
+                process.join()
+                receiver.close()
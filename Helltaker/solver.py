@@ -0,0 +1,337 @@
+""" Helltaker.solver
+
+    Search over GameplaySequence states.
+
+    States are GameplaySequences: each action is tried on a copy of the current GameplaySequence and
+    the resulting Victory/GameOver Exceptions determine whether the new state is a solution or a dead end.
+    Branches are pruned using GameplaySequence.unwinnable, and states which are dominated by a visited state
+    (the same layout reached with at least as much remaining Willpower and the key if the state has it) are discarded.
+"""
+## Builtin
+from collections import deque, namedtuple
+import heapq
+import itertools
+import sys
+## This Module
+from Helltaker import DIRECTIONTRANS, GameplaySequence
+from Helltaker import instrumentation
+from Helltaker.symmetry import canonicalgameplay, canonicalkey
+from Helltaker.transposition import statehash
+
+SearchResult = namedtuple("searchresult", ["actions", "stats"])
+## Willpower used by minimum_willpower so that only other rules end the game
+UNLIMITED = sys.maxsize
+
+def layoutkey(gameplay: GameplaySequence):
+    """ Returns a hashable representation of the map with the entities in each cell sorted
+        (the same cell can otherwise be represented by different strings depending on the order entities entered it)
+    """
+    return tuple("".join(sorted(cell)) if len(cell) > 1 else cell for row in gameplay.map.grid for cell in row)
+
+def statekey(gameplay: GameplaySequence):
+    """ Returns a hashable representation of the gamestate: the map, whether the Character has the key and the remaining actions """
+    return layoutkey(gameplay), gameplay.character.haskey, gameplay.remaining_actions()
+
+class DominanceTable():
+    """ The visited states of a search, keyed by layout (see layoutkey).
+
+        A state dominates another state with the same layout if it has at least as much remaining Willpower and has
+            the key whenever the other state has it: every sequence of actions available to the other state is also
+            available to it. Only the states of each layout which are not dominated (at most one with and one without
+            the key) are kept.
+
+        stats:
+            inserted: states which were not dominated
+            dominated: states which were rejected because a visited state dominates them
+            discarded: visited states which were removed because an inserted state dominates them (searches
+                skip these states when they leave the frontier, see kept)
+    """
+    def __init__(self):
+        self.frontiers = {}
+        self.stats = dict(inserted = 0, dominated = 0, discarded = 0)
+
+    def dominated(self, layout: tuple, willpower: int, haskey: bool):
+        """ Returns whether a visited state with the layout dominates the given remaining Willpower and haskey """
+        return any(best >= willpower and key >= haskey for best, key in self.frontiers.get(layout, ()))
+
+    def add(self, layout: tuple, willpower: int, haskey: bool):
+        """ Inserts the state (removing the visited states it dominates) unless it is dominated. Returns whether it was inserted """
+        frontier = self.frontiers.get(layout, ())
+        if any(best >= willpower and key >= haskey for best, key in frontier):
+            self.stats['dominated'] += 1
+            return False
+        kept = tuple((best, key) for best, key in frontier if best > willpower or key > haskey)
+        self.stats['discarded'] += len(frontier) - len(kept)
+        self.frontiers[layout] = kept + ((willpower, haskey),)
+        self.stats['inserted'] += 1
+        return True
+
+    def kept(self, gameplay: GameplaySequence):
+        """ Returns whether the gameplay's state is still kept (it has not been discarded for a state which dominates it) """
+        return (gameplay.remaining_actions(), gameplay.character.haskey) in self.frontiers.get(layoutkey(gameplay), ())
+
+    def addstate(self, gameplay: GameplaySequence):
+        """ Inserts the gameplay's state (see add) """
+        return self.add(layoutkey(gameplay), gameplay.remaining_actions(), gameplay.character.haskey)
+
+    def __contains__(self, gameplay: GameplaySequence):
+        return self.dominated(layoutkey(gameplay), gameplay.remaining_actions(), gameplay.character.haskey)
+
+    def __len__(self):
+        return sum(len(frontier) for frontier in self.frontiers.values())
+
+def successors(gameplay: GameplaySequence):
+    """ Yields a (direction, child, outcome) tuple for each direction which results in an action.
+
+        child is a copy of gameplay after the action was taken.
+        outcome is None if the game continues, otherwise it is the Victory or GameOver Exception that was raised.
+    """
+    for direction in DIRECTIONTRANS:
+        child = gameplay.copy()
+        try:
+            if child.move(direction) is None: continue
+        except (GameplaySequence.Victory, GameplaySequence.GameOver) as e:
+            yield direction, child, e
+        else:
+            yield direction, child, None
+
+def solve(gameplay: GameplaySequence):
+    """ Breadth-first search for a sequence of actions which results in Victory.
+
+        States which are dominated by a visited state are not expanded (see DominanceTable): stats['discarded'] counts
+            the states which were only dominated by a state found after them.
+        Returns a SearchResult whose actions are the actions taken after the given gameplay's current
+            actions (None if the level cannot be won) and whose stats is a dict of search statistics.
+    """
+    offset = len(gameplay.actions)
+    stats = dict(expanded = 0, generated = 0, duplicates = 0, discarded = 0, maxfrontier = 1)
+    frontier = deque([gameplay])
+    visited = DominanceTable()
+    visited.addstate(gameplay)
+    instrument = instrumentation.ACTIVE
+    while frontier:
+        current = frontier.popleft()
+        if not visited.kept(current):
+            stats['discarded'] += 1
+            continue
+        stats['expanded'] += 1
+        generated, duplicates = stats['generated'], stats['duplicates']
+        for direction, child, outcome in successors(current):
+            stats['generated'] += 1
+            if isinstance(outcome, GameplaySequence.Victory):
+                return SearchResult(child.actions[offset:], stats)
+            if outcome is not None: continue
+            if not visited.addstate(child):
+                stats['duplicates'] += 1
+                continue
+            if child.unwinnable(): continue
+            frontier.append(child)
+        stats['maxfrontier'] = max(stats['maxfrontier'], len(frontier))
+        if instrument: instrument.expanded(stats['generated'] - generated, stats['duplicates'] - duplicates, len(frontier))
+    return SearchResult(None, stats)
+
+def explore(gameplay: GameplaySequence):
+    """ Exhaustively explores the states reachable from the given gameplay.
+
+        Returns a SearchResult whose actions are the cheapest actions (in Willpower) which result in
+            Victory and whose stats is a dict of state-space statistics:
+                states: number of states which were never dominated by another visited state (see DominanceTable)
+                expanded/generated/duplicates: search counters
+                discarded: states which were dominated by a state found after them, and so were not expanded
+                depth: the largest number of actions taken in any state
+                victories/gameovers: number of actions which resulted in Victory/GameOver
+                willpower: the minimum Willpower required to win from the given gameplay (None if unwinnable)
+    """
+    offset, spent = len(gameplay.actions), gameplay.action_length()
+    stats = dict(states = 1, expanded = 0, generated = 0, duplicates = 0, discarded = 0, depth = 0,
+                 victories = 0, gameovers = 0, willpower = None)
+    best = None
+    frontier = deque([gameplay])
+    visited = DominanceTable()
+    visited.addstate(gameplay)
+    instrument = instrumentation.ACTIVE
+    while frontier:
+        current = frontier.popleft()
+        if not visited.kept(current):
+            ## A state which dominates it was found after it was added
+            stats['states'] -= 1
+            stats['discarded'] += 1
+            continue
+        stats['expanded'] += 1
+        stats['depth'] = max(stats['depth'], len(current.actions) - offset)
+        generated, duplicates = stats['generated'], stats['duplicates']
+        for direction, child, outcome in successors(current):
+            stats['generated'] += 1
+            if isinstance(outcome, GameplaySequence.Victory):
+                stats['victories'] += 1
+                ## Spike damage taken on the winning action does not matter: the action only requires 1 Willpower
+                willpower = current.action_length() - spent + 1
+                if stats['willpower'] is None or willpower < stats['willpower']:
+                    stats['willpower'], best = willpower, child.actions[offset:]
+                continue
+            if outcome is not None:
+                stats['gameovers'] += 1
+                continue
+            if not visited.addstate(child):
+                stats['duplicates'] += 1
+                continue
+            stats['states'] += 1
+            frontier.append(child)
+        if instrument: instrument.expanded(stats['generated'] - generated, stats['duplicates'] - duplicates, len(frontier))
+    return SearchResult(best, stats)
+
+def uniformcost(gameplay: GameplaySequence, limit: int = None, table = None, symmetric: bool = False):
+    """ Uniform-cost search (over Willpower) for the cheapest sequence of actions which results in Victory.
+
+        Each action costs 1 Willpower, or 2 when it ends on Active Spikes (as counted by GameplaySequence.action_length).
+            The winning action only requires 1 Willpower, regardless of damage.
+        limit is the optional maximum Willpower to search up to.
+        table is an optional transposition.TranspositionTable used instead of an unbounded set of expanded states:
+            states evicted from it may be expanded again, which costs time but does not change the result. Only the
+            Willpower bounds how often that happens, so a ValueError is raised if a table is given without a limit
+            when the Willpower is UNLIMITED.
+        If symmetric is True, states which are mirrored or rotated copies of an expanded state (see symmetry.canonicalkey)
+            are treated as duplicates: this only helps levels which are themselves symmetric. With a table, the
+            canonical variant of each state is hashed.
+
+        Returns a SearchResult whose actions are the cheapest actions taken after the given gameplay's current
+            actions (None if the level cannot be won) and whose stats['willpower'] is the Willpower they require.
+    """
+    if table is not None and limit is None and gameplay.character.willpower >= UNLIMITED:
+        raise ValueError("A limit is required to search unlimited Willpower with a TranspositionTable")
+    offset, spent = len(gameplay.actions), gameplay.action_length()
+    stats = dict(expanded = 0, generated = 0, duplicates = 0, maxfrontier = 1, willpower = None)
+    counter = itertools.count()
+    frontier = [(spent, next(counter), gameplay)]
+    ## States are expanded in order of cost, so the first expansion of a layout is the cheapest
+    expanded = set()
+    instrument, duplicates = instrumentation.ACTIVE, 0
+    while frontier:
+        cost, _, current = heapq.heappop(frontier)
+        if limit is not None and cost - spent + 1 > limit: break
+        if table is not None:
+            if table.lookup(key := statehash(canonicalgameplay(current)[0] if symmetric else current)) is not None:
+                stats['duplicates'] += 1
+                continue
+            table.store(key, cost - spent, current.remaining_actions())
+        elif (key := canonicalkey(current) if symmetric else (layoutkey(current), current.character.haskey)) in expanded:
+            stats['duplicates'] += 1
+            continue
+        else: expanded.add(key)
+        stats['expanded'] += 1
+        generated = stats['generated']
+        for direction, child, outcome in successors(current):
+            stats['generated'] += 1
+            if isinstance(outcome, GameplaySequence.Victory):
+                stats['willpower'] = cost - spent + 1
+                return SearchResult(child.actions[offset:], stats)
+            if outcome is not None or child.unwinnable(): continue
+            heapq.heappush(frontier, (child.action_length(), next(counter), child))
+        stats['maxfrontier'] = max(stats['maxfrontier'], len(frontier))
+        if instrument:
+            instrument.expanded(stats['generated'] - generated, stats['duplicates'] - duplicates, len(frontier))
+            duplicates = stats['duplicates']
+    return SearchResult(None, stats)
+
+def minimum_willpower(mapgrid: list, rulesets: list = True, limit: int = None):
+    """ Computes the exact minimum Willpower required to win the level.
+
+        Returns a (willpower, actions) tuple where actions is a witness sequence of actions
+            requiring that Willpower, or (None, None) if the level cannot be won (within limit).
+    """
+    ## Willpower is effectively unlimited so that GameOver is only caused by other rules (and unwinnable never prunes)
+    result = uniformcost(GameplaySequence(mapgrid, UNLIMITED, rulesets = rulesets), limit = limit)
+    return result.stats['willpower'], result.actions
+
+class OptimalSolutions():
+    """ The layered graph of every cheapest (in Willpower) solution, as returned by optimalsolutions.
+
+        willpower is the Willpower the cheapest solutions require (None if the level cannot be won).
+        count is the number of distinct cheapest solutions (computed without enumerating them).
+        Iterating yields each solution's actions lazily; solutions are not stored, so the same object
+            can be iterated any number of times.
+    """
+    def __init__(self, root, predecessors: dict, goals: list, willpower: int, counts: dict, stats: dict):
+        self.root = root
+        self.predecessors = predecessors
+        self.goals = goals
+        self.willpower = willpower
+        self.counts = counts
+        self.stats = stats
+        self.count = sum(counts[key] for key, action in goals)
+
+    def paths(self, key):
+        """ Yields the actions of every cheapest path from the root to the state with the given key """
+        if key == self.root:
+            yield []
+            return
+        for parent, action in self.predecessors[key]:
+            for actions in self.paths(parent):
+                actions.append(action)
+                yield actions
+
+    def __iter__(self):
+        for key, action in self.goals:
+            for actions in self.paths(key):
+                yield actions + [action]
+
+def optimalsolutions(gameplay: GameplaySequence, limit: int = None):
+    """ Finds every cheapest (in Willpower) sequence of actions which results in Victory.
+
+        States (deduplicated by layout and key) are expanded in order of cost up to the optimal cost, recording
+            every action which reaches a state at its cheapest cost. The resulting graph is acyclic (every action
+            costs at least 1 Willpower), so the number of cheapest paths to each state is counted in the order
+            the states were expanded.
+        limit is the optional maximum Willpower to search up to.
+
+        Returns an OptimalSolutions object whose solutions are the actions taken after the given gameplay's
+            current actions.
+    """
+    offset, spent = len(gameplay.actions), gameplay.action_length()
+    stats = dict(expanded = 0, generated = 0, duplicates = 0, maxfrontier = 1, edges = 0)
+    counter = itertools.count()
+    root = (layoutkey(gameplay), gameplay.character.haskey)
+    frontier = [(0, next(counter), root, gameplay)]
+    ## The cheapest known cost of each state and the (parent, action) pairs which reach it at that cost
+    costs, predecessors = {root: 0}, {root: []}
+    order, goals, willpower = [], [], None
+    instrument, duplicates = instrumentation.ACTIVE, 0
+    while frontier:
+        cost, _, key, current = heapq.heappop(frontier)
+        ## The winning action costs 1 Willpower, so states at the optimal cost cannot be part of a cheapest solution
+        if willpower is not None and cost + 1 > willpower: break
+        if limit is not None and cost + 1 > limit: break
+        ## Stale entry for a state which was later reached more cheaply
+        if costs[key] < cost: continue
+        order.append(key)
+        stats['expanded'] += 1
+        generated, length = stats['generated'], current.action_length()
+        for direction, child, outcome in successors(current):
+            stats['generated'] += 1
+            action = child.actions[-1]
+            if isinstance(outcome, GameplaySequence.Victory):
+                willpower = cost + 1
+                goals.append((key, action))
+                continue
+            if outcome is not None or child.unwinnable(): continue
+            childkey, childcost = (layoutkey(child), child.character.haskey), cost + child.action_length() - length
+            best = costs.get(childkey)
+            if best is not None and best < childcost:
+                stats['duplicates'] += 1
+                continue
+            stats['edges'] += 1
+            if best == childcost:
+                predecessors[childkey].append((key, action))
+                continue
+            costs[childkey], predecessors[childkey] = childcost, [(key, action)]
+            heapq.heappush(frontier, (childcost, next(counter), childkey, child))
+        stats['maxfrontier'] = max(stats['maxfrontier'], len(frontier))
+        if instrument:
+            instrument.expanded(stats['generated'] - generated, stats['duplicates'] - duplicates, len(frontier))
+            duplicates = stats['duplicates']
+
+    ## States were expanded in order of cost, which is a topological order of the graph
+    counts = {root: 1}
+    for key in order[1:]:
+        counts[key] = sum(counts[parent] for parent, action in predecessors[key])
+    return OptimalSolutions(root, predecessors, goals, willpower, counts, stats)
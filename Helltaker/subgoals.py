@@ -0,0 +1,198 @@
+""" Helltaker.subgoals
+
+    Hierarchical search for levels with a Key and Gate.
+
+    The level is split into subgoals identified from the map: pick up the Key, open a Gate and finally
+    win (reach a Target or destroy the Terminals, depending on the GameplayRules). The Key and Gate are
+    only subgoals when no goal can be reached without opening a Gate. Each segment is a
+    uniform-cost search from the intermediate states kept by the previous segment which stops at the
+    cheapest states satisfying its subgoal; only those states are kept for the next segment, so the states
+    before and after the Key pickup are never searched together. Kept states are cached by the states they
+    start from (layout, key, remaining Willpower and GameplayRules) and the subgoal, so repeated searches of
+    the same level reuse them.
+
+    Keeping only the cheapest intermediate states can miss the cheapest solution (a more expensive Key
+    pickup may leave the Blocks in a better position), so results are only reported as proven optimal
+    when they match a lower bound. When the segments interact so that no kept state can finish the level,
+    the full solver.uniformcost search is used instead.
+"""
+## Builtin
+from collections import deque
+import heapq
+import itertools
+import time
+## This Module
+from Helltaker import DIRECTIONTRANS, DestroyTerminalsRules, GameplaySequence, Map, TargetSquareRules
+from Helltaker import solver
+from Helltaker.bidirectional import STATICENTITIES
+from Helltaker.solver import SearchResult, layoutkey, successors
+
+def goalcells(gameplay: GameplaySequence):
+    """ Returns the cells the Character must reach (Targets) or kick (Terminals) to win, according to the GameplayRules """
+    cells = []
+    if TargetSquareRules in gameplay.rulesets: cells.extend(gameplay.map.findall("T"))
+    if DestroyTerminalsRules in gameplay.rulesets: cells.extend(gameplay.map.findall("E"))
+    return [tuple(cell) for cell in cells]
+
+def subgoals(gameplay: GameplaySequence):
+    """ Returns the names of the intermediate subgoals of the level in the order they must be reached ("key" and "gate").
+
+        Gates are only subgoals if they must be opened: no goal cell can be reached without passing through a Gate.
+    """
+    _map = gameplay.map
+    if not _map.findall("G"): return []
+    distances = walkingdistances(_map, [_map.findcharacter()])
+    if any(cell in distances for cell in goalcells(gameplay)): return []
+    if gameplay.character.haskey: return ["gate"]
+    if not _map.findall("K"): return []
+    return ["key", "gate"]
+
+def reached(subgoal: str, start: GameplaySequence, gameplay: GameplaySequence):
+    """ Returns whether the gameplay has reached the subgoal since the start state """
+    if subgoal == "key": return gameplay.character.haskey
+    return len(gameplay.map.findall("G")) < len(start.map.findall("G"))
+
+def walkingdistances(_map: Map, sources: list, passable: tuple = ()):
+    """ Returns the number of steps from the nearest source to each cell, ignoring every entity except static ones.
+
+        Entities in passable are not treated as static (STATICENTITIES are always static, Gates are static unless passable).
+    """
+    static = tuple(entity for entity in STATICENTITIES + ("G",) if entity not in passable)
+    distances = {tuple(source): 0 for source in sources}
+    queue = deque(distances)
+    while queue:
+        column, row = cell = queue.popleft()
+        for deltax, deltay in DIRECTIONTRANS.values():
+            nextcell = (column + deltax, row + deltay)
+            if nextcell in distances or _map.capcoord(nextcell) is None: continue
+            if any(entity in _map.getentities(nextcell) for entity in static): continue
+            distances[nextcell] = distances[cell] + 1
+            queue.append(nextcell)
+    return distances
+
+def lowerbound(gameplay: GameplaySequence, keycost: int = None):
+    """ Returns a lower bound on the Willpower required to win the level (None if no bound can be determined).
+
+        keycost is the exact minimum Willpower required to pick up the Key (from the first segment), which
+            bounds the solutions which open a Gate.
+    """
+    _map = gameplay.map
+    if not (goals := goalcells(gameplay)): return None
+    def nearest(distances):
+        return min((distances[goal] for goal in goals if goal in distances), default = None)
+    start = [_map.findcharacter()]
+    ## Solutions which never pass through a Gate
+    bounds = [nearest(walkingdistances(_map, start))]
+    gates = _map.findall("G")
+    if gates and (keycost is not None or gameplay.character.haskey):
+        keys = [_map.findcharacter()] if gameplay.character.haskey else _map.findall("K")
+        tokey = 0 if gameplay.character.haskey else keycost
+        togate = walkingdistances(_map, keys, passable = ("G",))
+        ## Opening the Gate moves the Character into it
+        fromgate = nearest(walkingdistances(_map, gates, passable = ("G",)))
+        if (gatecost := min((togate[tuple(gate)] for gate in gates if tuple(gate) in togate), default = None)) is not None and fromgate is not None:
+            bounds.append(tokey + gatecost + fromgate)
+    bounds = [bound for bound in bounds if bound is not None]
+    return min(bounds) if bounds else None
+
+class SubgoalSolver():
+    """ Solves levels by searching between subgoals (see the module documentation).
+
+        Kept intermediate states are cached between calls to solve.
+    """
+    def __init__(self):
+        self.cache = {}
+
+    def segment(self, sources: list, subgoal: str, stats: dict, victory: int = None):
+        """ Uniform-cost search from the sources to the cheapest states which reach the subgoal.
+
+            subgoal None only searches for Victory.
+            victory is the Willpower of the cheapest known solution: states which cannot be cheaper are not expanded.
+            Costs are GameplaySequence.action_length values.
+            Returns a (states, solution) tuple where states are the cheapest states which reach the subgoal
+                and solution is a (GameplaySequence, cost) tuple for the cheapest Victory found (or None).
+        """
+        ## Kept states depend on the Willpower remaining (unwinnable pruning) and on the GameplayRules
+        cachekey = (tuple(sorted((layoutkey(source), source.character.haskey, source.action_length(), source.remaining_actions())
+                                 for source in sources)), tuple(sources[0].rulesets), subgoal, victory)
+        if cachekey in self.cache:
+            stats['cached'] += 1
+            return self.cache[cachekey]
+        counter = itertools.count()
+        frontier = [(source.action_length(), next(counter), source, source) for source in sources]
+        heapq.heapify(frontier)
+        expanded, states, best, solution = set(), [], None, None
+        while frontier:
+            cost, _, current, start = heapq.heappop(frontier)
+            if best is not None and cost > best: break
+            if victory is not None and cost + 1 >= victory: break
+            if (key := (layoutkey(current), current.character.haskey)) in expanded:
+                stats['duplicates'] += 1
+                continue
+            expanded.add(key)
+            if subgoal is not None and reached(subgoal, start, current):
+                best = cost
+                states.append(current)
+                continue
+            stats['expanded'] += 1
+            for direction, child, outcome in successors(current):
+                stats['generated'] += 1
+                if isinstance(outcome, GameplaySequence.Victory):
+                    ## The winning action only requires 1 Willpower
+                    if victory is None or cost + 1 < victory:
+                        victory, solution = cost + 1, (child, cost + 1)
+                    continue
+                if outcome is not None or child.unwinnable(): continue
+                heapq.heappush(frontier, (child.action_length(), next(counter), child, start))
+        self.cache[cachekey] = states, solution
+        return states, solution
+
+    def solve(self, gameplay: GameplaySequence, compare: bool = False):
+        """ Searches for the cheapest sequence of actions which results in Victory, one subgoal at a time.
+
+            Returns a SearchResult whose stats include:
+                willpower: the Willpower the actions require (None if no solution was found)
+                proven: whether the actions are proven to be the cheapest solution
+                fallback: whether the full search was used because the segments interacted
+                segments: the number of intermediate states kept after each subgoal
+            If compare is True, solver.uniformcost is also run and stats includes its time, states expanded and
+                the speedup (its time divided by the time of this search).
+        """
+        offset, spent = len(gameplay.actions), gameplay.action_length()
+        stats = dict(expanded = 0, generated = 0, duplicates = 0, cached = 0, segments = [], fallback = False,
+                     proven = False, willpower = None, elapsed = 0.0)
+        start = time.perf_counter()
+        sources, solution, victory, keycost = [gameplay], None, None, None
+        for subgoal in subgoals(gameplay) + [None]:
+            states, found = self.segment(sources, subgoal, stats, victory)
+            if found is not None: solution, victory = found
+            if subgoal is None: break
+            if not states: break
+            if subgoal == "key": keycost = states[0].action_length() - spent
+            stats['segments'].append(len(states))
+            sources = states
+
+        if solution is None:
+            ## The segments interacted: no kept state could finish the level
+            stats['fallback'] = True
+            result = solver.uniformcost(gameplay)
+            stats['expanded'] += result.stats['expanded']
+            stats['generated'] += result.stats['generated']
+            stats['willpower'], stats['proven'] = result.stats['willpower'], True
+            actions = result.actions
+        else:
+            stats['willpower'] = victory - spent
+            stats['proven'] = not subgoals(gameplay) or stats['willpower'] == lowerbound(gameplay, keycost)
+            actions = solution.actions[offset:]
+        stats['elapsed'] = time.perf_counter() - start
+
+        if compare:
+            start = time.perf_counter()
+            flat = solver.uniformcost(gameplay)
+            stats['flat'] = dict(elapsed = time.perf_counter() - start, expanded = flat.stats['expanded'], willpower = flat.stats['willpower'])
+            stats['speedup'] = stats['flat']['elapsed'] / stats['elapsed'] if stats['elapsed'] else None
+        return SearchResult(actions, stats)
+
+def solve(gameplay: GameplaySequence, compare: bool = False):
+    """ Solves the gameplay with a new SubgoalSolver (see SubgoalSolver.solve) """
+    return SubgoalSolver().solve(gameplay, compare = compare)
@@ -0,0 +1,115 @@
+""" Helltaker.symmetry
+
+    Canonicalization of levels and states under the symmetries of the grid.
+
+    The mechanics do not depend on the orientation of the level: mirroring or rotating a grid (and turning the
+    laser generators with it) gives a level whose solutions are the original solutions with their directions
+    transformed the same way. The eight symmetries of a rectangle's grid (TRANSFORMS) are described by the
+    matrix they apply to direction vectors. The canonical form of a grid is the lexicographically smallest of
+    its eight variants (comparing height, width and then the cells row by row), so every mirrored or rotated
+    copy of a level has the same canonical form.
+"""
+## This Module
+from Helltaker import DIRECTIONTRANS, LASERTRANS, GameplaySequence, Map
+
+## (a, b, c, d): a direction (dx, dy) becomes (a*dx + b*dy, c*dx + d*dy)
+TRANSFORMS = {
+    "identity": (1, 0, 0, 1),
+    "rotate90": (0, -1, 1, 0),
+    "rotate180": (-1, 0, 0, -1),
+    "rotate270": (0, 1, -1, 0),
+    "mirrorhorizontal": (-1, 0, 0, 1),
+    "mirrorvertical": (1, 0, 0, -1),
+    "transpose": (0, 1, 1, 0),
+    "antitranspose": (0, -1, -1, 0),
+}
+VECTORDIRECTIONS = {vector: direction for direction, vector in DIRECTIONTRANS.items()}
+DIRECTIONLASERS = {direction: laser for laser, direction in LASERTRANS.items()}
+
+def transformvector(transform: str, vector: tuple):
+    a, b, c, d = TRANSFORMS[transform]
+    dx, dy = vector
+    return a*dx + b*dy, c*dx + d*dy
+
+## The direction each direction becomes under each transform
+DIRECTIONMAPS = {transform: {direction: VECTORDIRECTIONS[transformvector(transform, vector)] for direction, vector in DIRECTIONTRANS.items()}
+                 for transform in TRANSFORMS}
+## The transform which undoes each transform
+INVERSES = {transform: next(inverse for inverse in TRANSFORMS
+                            if all(DIRECTIONMAPS[inverse][DIRECTIONMAPS[transform][direction]] == direction for direction in DIRECTIONTRANS))
+            for transform in TRANSFORMS}
+## The laser generator each laser generator becomes under each transform
+LASERMAPS = {transform: {laser: DIRECTIONLASERS[DIRECTIONMAPS[transform][direction]] for laser, direction in LASERTRANS.items()}
+             for transform in TRANSFORMS}
+
+def transformcoord(transform: str, coord: tuple, width: int, height: int):
+    """ Returns the (column, row) the cell at coord moves to when a width x height grid is transformed """
+    a, b, c, d = TRANSFORMS[transform]
+    column, row = coord
+    ## Negative coefficients reverse an axis, so the grid is shifted back to start at 0
+    x = a*column + b*row + (width - 1 if a < 0 else 0) + (height - 1 if b < 0 else 0)
+    y = c*column + d*row + (width - 1 if c < 0 else 0) + (height - 1 if d < 0 else 0)
+    return x, y
+
+def transformcell(transform: str, cell: str):
+    """ Returns the entities of a cell after the transform (laser generators are turned), sorted """
+    lasers = LASERMAPS[transform]
+    return "".join(sorted(lasers.get(entity, entity) for entity in cell.replace(" ", "")))
+
+def transformgrid(grid: list, transform: str):
+    """ Returns the transformed copy of a grid (a list of rows or a grid string) """
+    if isinstance(grid, str): grid = Map.parsegridstring(grid)
+    height, width = len(grid), len(grid[0])
+    newwidth, newheight = (width, height) if TRANSFORMS[transform][0] else (height, width)
+    output = [["" for c in range(newwidth)] for r in range(newheight)]
+    for r, row in enumerate(grid):
+        for c, cell in enumerate(row):
+            x, y = transformcoord(transform, (c, r), width, height)
+            output[y][x] = transformcell(transform, cell)
+    return output
+
+def transformactions(actions: list, transform: str):
+    """ Returns the actions with their directions transformed (capitalization, i.e. spike damage, is preserved) """
+    directions = DIRECTIONMAPS[transform]
+    return [directions[action.lower()].upper() if action.isupper() else directions[action] for action in actions]
+
+def restoreactions(actions: list, transform: str):
+    """ Maps actions taken on a transformed level back onto the original level """
+    return transformactions(actions, INVERSES[transform])
+
+def gridkey(grid: list):
+    return len(grid), len(grid[0]), tuple(tuple(row) for row in grid)
+
+def canonicalize(grid: list):
+    """ Returns a (canonical grid, transform) tuple: the smallest variant of the grid and the transform which produces it """
+    if isinstance(grid, str): grid = Map.parsegridstring(grid)
+    variants = ((transformgrid(grid, transform), transform) for transform in TRANSFORMS)
+    return min(variants, key = lambda variant: gridkey(variant[0]))
+
+def transformgameplay(gameplay: GameplaySequence, transform: str):
+    """ Returns a copy of the gameplay with its Map (and actions) transformed """
+    gp = GameplaySequence(type(gameplay.map)(transformgrid(gameplay.map.grid, transform)), gameplay.character.willpower, gameplay.rulesets)
+    gp.actions = transformactions(gameplay.actions, transform)
+    gp.character.haskey = gameplay.character.haskey
+    return gp
+
+def canonicalgameplay(gameplay: GameplaySequence):
+    """ Returns a (GameplaySequence, transform) tuple: a copy of the gameplay with its canonical Map and the transform used """
+    grid, transform = canonicalize(gameplay.map.grid)
+    return transformgameplay(gameplay, transform), transform
+
+def canonicalkey(gameplay: GameplaySequence):
+    """ Returns a hashable key of the gamestate which is the same for every symmetric variant of it (see solver.uniformcost) """
+    return gridkey(canonicalize(gameplay.map.grid)[0]), gameplay.character.haskey
+
+def unique(levels: list):
+    """ Returns the levels (dicts in the format read by GameplaySequence.loadfromjson) which are not a symmetric variant
+        of an earlier level with the same Willpower, rules and haskey
+    """
+    seen, output = set(), []
+    for level in levels:
+        key = gridkey(canonicalize(level['grid'])[0]), level['willpower'], tuple(level.get('rules') or ()), level.get('haskey', False)
+        if key in seen: continue
+        seen.add(key)
+        output.append(level)
+    return output
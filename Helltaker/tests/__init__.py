@@ -1,15 +1,35 @@
 ## Test Utility
 import unittest
 ## Test Target
-from Helltaker import Coordinate, Map, Character, GameplaySequence, StandardRules, DestroyTerminalsRules
+from Helltaker import Coordinate, Map, SparseMap, Character, GameplaySequence, GameplayRule, Status, StandardRules, TargetSquareRules, DestroyTerminalsRules
 ## Additional Tests
 ## It would be more appropriate to use a TestRunner, but
 ## the size of this module makes that seem like overkill
 from Helltaker.tests.test_run import TestRun
 from Helltaker.tests.test_gameplay import TestGameplay
+from Helltaker.tests.test_timeline import TimelineTestCase
+from Helltaker.tests.test_solver import SolverTestCase
+from Helltaker.tests.test_cache import FingerprintTestCase, LevelCacheTestCase
+from Helltaker.tests.test_external import ExternalSearchTestCase
+from Helltaker.tests.test_instrumentation import InstrumentationTestCase
+from Helltaker.tests.test_bidirectional import BidirectionalTestCase
+from Helltaker.tests.test_generator import LevelGeneratorTestCase
+from Helltaker.tests.test_hints import HintServiceTestCase
+from Helltaker.tests.test_mcts import MonteCarloTreeSearchTestCase
+from Helltaker.tests.test_subgoals import SubgoalSolverTestCase
+from Helltaker.tests.test_reachability import ReachabilityTestCase
+from Helltaker.tests.test_patterns import PatternDatabaseTestCase
+from Helltaker.tests.test_environment import EnvironmentTestCase
+from Helltaker.tests.test_harness import HarnessTestCase
+from Helltaker.tests.test_transposition import TranspositionTableTestCase
+from Helltaker.tests.test_compiled import CompiledMapTestCase
+from Helltaker.tests.test_threaded import ThreadedSearchTestCase
+from Helltaker.tests.test_symmetry import SymmetryTestCase
+from Helltaker.tests.test_scheduler import SchedulerTestCase
 
 ## Builtin
 from copy import deepcopy
+import random
 
 TESTGRID = [
 [" ", "T", "K"],
@@ -506,6 +526,15 @@ class CharacterTestCase(unittest.TestCase):
         self.assertEqual(character.coord, (0,1))
         self.assertTrue(_map.coordcontains((0,0), "G"))
 
+    def test_haskey_edge(self):
+        """ Tests that a character with the key can attempt to move off the map """
+        _map = Map("C,K")
+        character = Character((0,0), 3, _map = _map)
+        character.move("right")
+        self.assertTrue(character.haskey)
+        self.assertIsNone(character.move("up"))
+        self.assertEqual(character.coord, (1,0))
+
     def test_destroyedstate_replacement(self):
         """ In EX Mode (Exam Mode) Terminals can be destroyed; instead of being removed from the map, they are replaced with a "Broken Terminal" entity """
         MAP = "E,C"
@@ -540,6 +569,110 @@ class GameplaySequenceTestCase(unittest.TestCase):
         ## gameplay raises RuntimeError on next action as expected
         self.assertRaises(RuntimeError, gameplay.down)
 
+    def test_snapshot(self):
+        """ Tests that restore returns the GameplaySequence to the snapshotted gamestate """
+        MAP = [
+            ["C", "B", "p"],
+            ["K", " ", "G"],
+        ]
+        gameplay = GameplaySequence(MAP, willpower = 10)
+        gameplay.right()
+        snapshot = gameplay.snapshot()
+        expected = gameplay.map.copy()
+        actions = list(gameplay.actions)
+        gameplay.down()
+        gameplay.left()
+        gameplay.right()
+        gameplay.right()
+        self.assertTrue(gameplay.character.haskey)
+        gameplay.restore(snapshot)
+        self.assertEqual(gameplay.map, expected)
+        self.assertEqual(gameplay.actions, actions)
+        self.assertEqual(gameplay.character.coord, (0,0))
+        self.assertFalse(gameplay.character.haskey)
+        ## The Character still references the restored map
+        gameplay.down()
+        self.assertTrue(gameplay.character.haskey)
+        self.assertFalse(gameplay.map.coordcontains((0,1), "K"))
+
+    def test_observers(self):
+        """ Tests the events and cell diffs sent to observers """
+        MAP = [
+            ["C", "S", "p"],
+            ["K", "", "G"],
+            ["T", "W", ""],
+        ]
+        gameplay = GameplaySequence(MAP, willpower = 10)
+        events = []
+        gameplay.addobserver(lambda event, data: events.append((event, data)))
+        ## Skeleton is kicked onto the spikes, which become active and destroy it
+        gameplay.right()
+        self.assertEqual([event for event, data in events], ["kicked", "spikestoggled", "destroyed", "diff"])
+        self.assertEqual(events[0][1], dict(entity = "S", start = (1,0), target = (2,0)))
+        self.assertEqual(events[2][1], dict(entity = "S", coord = (2,0), cause = "spikes"))
+        self.assertEqual(events[-1][1], dict(action = "right", cells = [(1,0,""), (2,0,"P")]))
+        events.clear()
+        gameplay.down()
+        self.assertEqual([event for event, data in events], ["moved", "keytaken", "spikestoggled", "diff"])
+        self.assertEqual(events[-1][1], dict(action = "down", cells = [(0,0,""), (2,0,"p"), (0,1,"C")]))
+        events.clear()
+        ## Moving off the Map is not an action
+        gameplay.left()
+        self.assertEqual(events, [("diff", dict(action = None, cells = []))])
+        events.clear()
+        self.assertRaises(GameplaySequence.Victory, gameplay.down)
+        self.assertEqual([event for event, data in events], ["moved", "spikestoggled", "diff", "victory"])
+        self.assertEqual(events[-2][1]['cells'], [(2,0,"P"), (0,1,""), (0,2,"TC")])
+
+    def test_observers_gate(self):
+        gameplay = GameplaySequence([["C", "K", "G", ""]], willpower = 10)
+        gameplay.right()
+        events = []
+        gameplay.addobserver(lambda event, data: events.append((event, data)))
+        gameplay.right()
+        self.assertEqual(events[0], ("gateopened", dict(coord = (2,0))))
+        self.assertEqual(events[-1], ("diff", dict(action = "right", cells = [(1,0,""), (2,0,"C")])))
+        ## Copies are not observed
+        self.assertEqual(len(events), 4)
+        gameplay.copy().right()
+        self.assertEqual(len(events), 4)
+        gameplay.removeobserver(gameplay.map.observers[0])
+        gameplay.right()
+        self.assertEqual(len(events), 4)
+
+    def test_observers_lasered(self):
+        gameplay = GameplaySequence([["", "C", ""], ["", "", "0"]], willpower = 10)
+        events = []
+        gameplay.addobserver(lambda event, data: events.append((event, data)))
+        self.assertRaises(GameplaySequence.GameOver, gameplay.right)
+        self.assertEqual([event for event, data in events], ["moved", "spikestoggled", "lasered", "diff", "gameover"])
+        self.assertEqual(events[2][1], dict(laser = (2,1), coord = (2,0)))
+
+    def test_observers_touched(self):
+        """ Tests that the diff only compares the cells which changed, without building the grid """
+        from Helltaker.compiled import CompiledMap
+        class GridlessMap(SparseMap):
+            @property
+            def grid(self):
+                raise AssertionError("The diff should not build the grid")
+        MAP = [
+            ["C", "S", "p"],
+            ["K", "", "G"],
+            ["T", "W", ""],
+        ]
+        expected = None
+        for mapclass in (Map, SparseMap, CompiledMap, GridlessMap):
+            with self.subTest(mapclass = mapclass):
+                gameplay = GameplaySequence(MAP, willpower = 10, mapclass = mapclass)
+                diffs = []
+                gameplay.addobserver(lambda event, data: diffs.append(data['cells']) if event == "diff" else None)
+                gameplay.right()
+                gameplay.down()
+                self.assertRaises(GameplaySequence.Victory, gameplay.down)
+                if expected is None: expected = diffs
+                self.assertEqual(diffs, expected)
+                self.assertEqual(gameplay.map.touched, {})
+
     def test_unwinnable(self):
         """ Basic tests for GameplaySequence.unwinnable """
         MAP = [
@@ -584,6 +717,89 @@ class GameplaySequenceTestCase(unittest.TestCase):
         except GameplaySequence.GameOver:
             self.fail(f"Got Lasered while trying to solve puzzle\n{gameplay.map}")
 
+class StepTestCase(unittest.TestCase):
+    """ Tests the non-raising GameplaySequence.step """
+    def test_statuses(self):
+        gameplay = GameplaySequence("C,,B,\n,,,W\n,,,T", 3)
+        self.assertEqual(gameplay.step("up"), Status.NOOP)
+        self.assertEqual(gameplay.step("right"), Status.MOVED)
+        self.assertEqual(gameplay.step("right"), Status.KICKED)
+        self.assertEqual(gameplay.actions, ["right", "right"])
+        self.assertEqual(gameplay.step("down"), Status.MOVED)
+        self.assertEqual(gameplay.step("down"), Status.GAMEOVER_WILLPOWER)
+        self.assertEqual(gameplay.outcome.status, Status.GAMEOVER_WILLPOWER)
+        self.assertIs(gameplay.outcome.type, GameplaySequence.GameOver)
+        self.assertEqual(str(gameplay.outcome.exception), "No moves remaining!")
+        self.assertTrue(gameplay.outcome.status.gameover)
+
+        gameplay = GameplaySequence("C,T", 3)
+        self.assertEqual(gameplay.step("right"), Status.VICTORY)
+        self.assertEqual(gameplay.actions, ["right"])
+        self.assertEqual((gameplay.outcome.status, gameplay.outcome.type), (Status.VICTORY, GameplaySequence.Victory))
+        self.assertEqual(str(gameplay.outcome.exception), "Waifu Getto!")
+        self.assertEqual(GameplaySequence("C\n\n0", 100).step("down"), Status.GAMEOVER_LASER)
+
+    def test_raising_rules(self):
+        """ Tests that GameplayRules which raise are reported without raising """
+        class RaisingRules(GameplayRule):
+            def gameover_always(gameplay):
+                raise GameplaySequence.GameOver("Always!")
+            PREMOVE = []
+            POSTMOVE = [gameover_always]
+        gameplay = GameplaySequence("C,", 3, rulesets = [StandardRules, RaisingRules])
+        self.assertEqual(gameplay.step("right"), Status.GAMEOVER)
+        self.assertEqual(str(gameplay.outcome.exception), "Always!")
+        self.assertRaisesRegex(GameplaySequence.GameOver, "Always!", GameplaySequence("C,", 3, rulesets = [RaisingRules]).right)
+
+    def test_custom_exception(self):
+        """ Tests that Exception subclasses raised by GameplayRules are kept by step and raised again by move """
+        class Drowned(GameplaySequence.GameOver): pass
+        class DrowningRules(GameplayRule):
+            def gameover_drowned(gameplay):
+                raise Drowned("Drowned!", gameplay.character.coord)
+            PREMOVE = []
+            POSTMOVE = [gameover_drowned]
+        gameplay = GameplaySequence("C,", 3, rulesets = [StandardRules, DrowningRules])
+        self.assertEqual(gameplay.step("right"), Status.GAMEOVER)
+        self.assertIs(gameplay.outcome.type, Drowned)
+        self.assertEqual(gameplay.outcome.exception.args, ("Drowned!", (1, 0)))
+
+        gameplay = GameplaySequence("C,", 3, rulesets = [StandardRules, DrowningRules])
+        with self.assertRaises(Drowned) as context:
+            gameplay.right()
+        self.assertIs(context.exception, gameplay.outcome.exception)
+
+    def test_move(self):
+        """ Tests that move is equivalent to step """
+        gameplay = GameplaySequence("C,,B,\n,,,W\n,,,T", 3)
+        self.assertIsNone(gameplay.move("up"))
+        self.assertEqual(gameplay.move("right"), "right")
+        self.assertEqual(gameplay.move("right"), "right")
+        self.assertEqual(gameplay.move("down"), "down")
+        self.assertRaisesRegex(GameplaySequence.GameOver, "No moves remaining!", gameplay.down)
+
+    def test_direct_checks(self):
+        """ Tests that the callbacks and premove_checks/postmove_checks raise """
+        gameplay = GameplaySequence("C,T", 0)
+        with self.assertRaisesRegex(GameplaySequence.GameOver, "No moves remaining!") as context:
+            StandardRules.gameover_noactions(gameplay)
+        self.assertEqual(context.exception.status, Status.GAMEOVER_WILLPOWER)
+        self.assertRaisesRegex(GameplaySequence.GameOver, "No moves remaining!", gameplay.premove_checks)
+
+        gameplay = GameplaySequence("C,T", 3)
+        self.assertIsNone(gameplay.premove_checks())
+        self.assertIsNone(gameplay.postmove_checks())
+        gameplay.character.coord = (1, 0)
+        self.assertRaisesRegex(GameplaySequence.Victory, "Waifu Getto!", TargetSquareRules.victory_isattarget, gameplay)
+        self.assertRaisesRegex(GameplaySequence.Victory, "Waifu Getto!", gameplay.postmove_checks)
+
+    def test_init_map(self):
+        """ Tests that a Map passed to GameplaySequence is copied """
+        _map = Map("C,T")
+        gameplay = GameplaySequence(_map, 3)
+        _map.removeentity("T", (1, 0))
+        self.assertEqual(gameplay._init_map.grid, [["C", "T"]])
+
 class EXTestCase(unittest.TestCase):
     def test_victory(self):
         """ Tests that the victory condition triggers """
@@ -620,6 +836,152 @@ class EXTestCase(unittest.TestCase):
         gameplay = GameplaySequence(grid,0, rulesets= [StandardRules, DestroyTerminalsRules])
         self.assertTrue(gameplay.unwinnable())
 
+class PicklableRules(StandardRules):
+    """ A GameplayRule which is not in AVAILABLERULES """
+
+class SerializationTestCase(unittest.TestCase):
+    """ Tests binary snapshots, pickling and writing JSON """
+    def played(self, mapclass = Map):
+        gameplay = GameplaySequence(TESTGRID, 10, mapclass = mapclass)
+        ## Moves through the spikes (taking damage) and picks up the Key
+        for direction in ["right", "up", "up", "up", "up"]: gameplay.move(direction)
+        return gameplay
+
+    def assertSameGameplay(self, first, second):
+        self.assertEqual(first.map.grid, second.map.grid)
+        self.assertEqual(first.actions, second.actions)
+        self.assertEqual(first.character.coord, second.character.coord)
+        self.assertEqual(first.character.haskey, second.character.haskey)
+        self.assertEqual(first.character.willpower, second.character.willpower)
+        self.assertEqual(first.rulesets, second.rulesets)
+        self.assertIs(second.character.map, second.map)
+
+    def test_bytes(self):
+        for mapclass in (Map, SparseMap):
+            gameplay = self.played(mapclass)
+            self.assertTrue(gameplay.character.haskey)
+            self.assertIn("UP", gameplay.actions)
+            restored = GameplaySequence.from_bytes(gameplay.to_bytes())
+            self.assertIsInstance(restored.map, mapclass)
+            self.assertSameGameplay(gameplay, restored)
+            ## The restored gameplay can continue
+            self.assertEqual(restored.remaining_actions(), gameplay.remaining_actions())
+        self.assertRaisesRegex(ValueError, "not a GameplaySequence snapshot", GameplaySequence.from_bytes, b"XXXX" + bytes(16))
+
+    def test_pickle(self):
+        import pickle
+        from Helltaker.compiled import CompiledMap
+        for mapclass in (Map, SparseMap, CompiledMap):
+            with self.subTest(mapclass = mapclass):
+                gameplay = self.played(mapclass)
+                restored = pickle.loads(pickle.dumps(gameplay))
+                self.assertSameGameplay(gameplay, restored)
+                self.assertIs(type(restored.map), mapclass)
+                self.assertIs(type(restored._init_map), mapclass)
+                ## The starting Map is kept
+                self.assertEqual(restored._init_map.grid, gameplay._init_map.grid)
+                self.assertNotEqual(restored._init_map.grid, restored.map.grid)
+        ## CompiledLevels are shared through the cache
+        self.assertIs(restored.map.level, gameplay.map.level)
+
+    def test_pickle_outcome(self):
+        import pickle
+        gameplay = GameplaySequence("C,T", 3, rulesets = [StandardRules, TargetSquareRules, PicklableRules])
+        gameplay.step("right")
+        restored = pickle.loads(pickle.dumps(gameplay))
+        self.assertEqual((restored.outcome.status, restored.outcome.type), (Status.VICTORY, GameplaySequence.Victory))
+        self.assertEqual(str(restored.outcome.exception), "Waifu Getto!")
+        self.assertEqual(restored.rulesets, gameplay.rulesets)
+
+    def test_pickle_rebuild(self):
+        """ Tests that GameplayRules created at runtime are pickled with REBUILD """
+        import pickle
+        from Helltaker.patterns import PatternDatabases
+        databases = PatternDatabases(GameplaySequence([["C", "B", "T"], ["", "", ""]], 10))
+        gameplay = GameplaySequence([["C", "B", "T"], ["", "", ""]], 10, rulesets = [StandardRules, TargetSquareRules, databases.rule()])
+        restored = pickle.loads(pickle.dumps(gameplay))
+        self.assertEqual(restored.rulesets[:2], [StandardRules, TargetSquareRules])
+        self.assertEqual(restored.rulesets[2].__name__, "PatternDatabaseRules")
+        self.assertEqual(restored.unwinnable(), gameplay.unwinnable())
+
+    def test_unregistered_rule(self):
+        class CustomRules(StandardRules): pass
+        gameplay = GameplaySequence(TESTGRID, 10, rulesets = [CustomRules])
+        self.assertRaisesRegex(ValueError, "AVAILABLERULES", gameplay.to_bytes)
+
+    def test_json(self):
+        import os, tempfile
+        gameplay = self.played()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "level.json")
+            gameplay.savetojson(path)
+            self.assertSameGameplay(gameplay, GameplaySequence.loadfromjson(path))
+
+class SparseMapTestCase(unittest.TestCase):
+    """ Tests that SparseMap behaves identically to Map """
+    def test_init(self):
+        """ Tests creating SparseMaps from grids, grid strings and cells """
+        _map = SparseMap(TESTGRID)
+        self.assertEqual((_map.width, _map.height), (3, 3))
+        self.assertEqual(len(_map.cells), 7)
+        self.assertEqual(_map.grid, Map(TESTGRID).grid)
+        self.assertEqual(set(_map.spikes), {(0, 2), (2, 2)})
+        _map = SparseMap(" , C, \n ,B ,T")
+        self.assertEqual(_map.cells, {(1, 0): "C", (1, 1): "B", (2, 1): "T"})
+        self.assertEqual(SparseMap.fromcells(3, 2, {(1, 0): "C", (1, 1): "B", (2, 1): "T"}), _map)
+        self.assertRaisesRegex(ValueError, "Grid must have exactly 1 Character", SparseMap, [["", "B"]])
+        self.assertRaisesRegex(ValueError, "Grid has rows with differing lengths", SparseMap, [[" "],[" ","C"]])
+        self.assertRaisesRegex(ValueError, "Cell is outside the grid", SparseMap.fromcells, 2, 2, {(0, 0): "C", (2, 0): "B"})
+
+    def test_equivalence(self):
+        """ Tests that random play gives the same results on a Map and a SparseMap """
+        from Helltaker.tests.test_run import MAP_IV
+        rng = random.Random(7)
+        for game in range(20):
+            dense = GameplaySequence(MAP_IV, 23)
+            sparse = GameplaySequence(MAP_IV, 23, mapclass = SparseMap)
+            self.assertIsInstance(sparse.copy().map, SparseMap)
+            for step in range(30):
+                direction = rng.choice(["up", "right", "down", "left"])
+                outcomes = []
+                for gameplay in (dense, sparse):
+                    try: outcomes.append(gameplay.move(direction))
+                    except (GameplaySequence.Victory, GameplaySequence.GameOver) as e: outcomes.append(type(e))
+                self.assertEqual(outcomes[0], outcomes[1])
+                self.assertEqual(dense.actions, sparse.actions)
+                self.assertEqual(dense.map.grid, sparse.map.grid)
+                if isinstance(outcomes[0], type): break
+
+    def test_snapshot(self):
+        """ Tests restoring a SparseMap gameplay from a snapshot """
+        gameplay = GameplaySequence(TESTGRID, 10, mapclass = SparseMap)
+        snapshot = gameplay.snapshot()
+        gameplay.move("left")
+        gameplay.move("up")
+        self.assertNotEqual(gameplay.map.grid, Map(TESTGRID).grid)
+        gameplay.restore(snapshot)
+        self.assertEqual(gameplay.map.grid, Map(TESTGRID).grid)
+        self.assertEqual(gameplay.actions, [])
+
+    def test_large(self):
+        """ Tests that a large, mostly empty level only stores its entities """
+        _map = SparseMap.fromcells(1000, 1000, {(0, 0): "C", (2, 0): "B", (999, 999): "T"})
+        gameplay = GameplaySequence(_map, 10)
+        gameplay.move("right")
+        gameplay.move("right")
+        self.assertEqual(gameplay.map.cells, {(1, 0): "C", (3, 0): "B", (999, 999): "T"})
+        self.assertEqual(gameplay.map.findall("B"), [(3, 0)])
+
+    def test_occupied(self):
+        """ Tests that occupied matches Map and only visits the stored cells """
+        gameplay = GameplaySequence(TESTGRID, 10, mapclass = SparseMap)
+        gameplay.move("left")
+        dense = GameplaySequence(TESTGRID, 10)
+        dense.move("left")
+        self.assertEqual(list(gameplay.map.occupied()), list(dense.map.occupied()))
+        self.assertEqual(len(list(gameplay.map.occupied())), len(gameplay.map.cells))
+        _map = SparseMap.fromcells(1000, 1000, {(999, 999): "T", (0, 1): "B", (5, 0): "C"})
+        self.assertEqual(list(_map.occupied()), [((5, 0), "C"), ((0, 1), "B"), ((999, 999), "T")])
         
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
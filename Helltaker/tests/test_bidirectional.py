@@ -0,0 +1,46 @@
+## Test Utility
+import unittest
+## Test Target
+from Helltaker import GameplaySequence, Map, StandardRules, DestroyTerminalsRules
+from Helltaker import bidirectional, solver
+
+from Helltaker.tests.test_gameplay import MAP
+from Helltaker.tests.test_solver import replay
+
+class BidirectionalTestCase(unittest.TestCase):
+    def test_relaxeddistances(self):
+        """ Tests the relaxed distances around walls and spikes """
+        _map = Map("C,W,T\n,P,\n,,")
+        distances = bidirectional.relaxeddistances(_map)
+        ## Walls are static: the Character has to go around, entering the spikes on an even action (when they are active)
+        self.assertEqual(distances[((0,0), 0)], 5)
+        ## Entering the spikes on an odd action (when they are inactive) costs nothing extra
+        self.assertEqual(distances[((1,2), 0)], 3)
+        self.assertEqual(distances[((0,1), 0)], 3)
+        self.assertNotIn(((1,0), 0), distances)
+
+    def test_walk(self):
+        """ Tests that walk avoids blocking entities and lasers """
+        gameplay = GameplaySequence("C,B,T\n,,\n1,,", 10)
+        cost, directions = bidirectional.walk(gameplay, 0, bidirectional.spikes(gameplay.map))
+        self.assertEqual(directions, ["down", "right", "right", "up"])
+        self.assertEqual(cost, 4)
+        self.assertIsNone(bidirectional.walk(GameplaySequence("C,B,T\n2,,\n,W,", 10), 0, {}))
+
+    def test_solve(self):
+        """ Tests that the results are verified solutions """
+        for willpower in [9, 5]:
+            with self.subTest(willpower = willpower):
+                result = bidirectional.solve(GameplaySequence(MAP, willpower))
+                self.assertIsInstance(replay(GameplaySequence(MAP, willpower), result.actions), GameplaySequence.Victory)
+        self.assertIsNone(bidirectional.solve(GameplaySequence(MAP, 4)).actions)
+
+    def test_fewer_states(self):
+        """ Tests that the bidirectional search expands fewer states than breadth-first search """
+        grid = "C,,,,,,\n,B,,B,,,\n,,,,,,T"
+        self.assertLess(bidirectional.solve(GameplaySequence(grid, 20)).stats['expanded'],
+                        solver.solve(GameplaySequence(grid, 20)).stats['expanded'])
+
+    def test_rules(self):
+        """ Tests that bidirectional search requires TargetSquareRules """
+        self.assertRaises(ValueError, bidirectional.solve, GameplaySequence("C,E", 3, rulesets = [StandardRules, DestroyTerminalsRules]))
@@ -0,0 +1,110 @@
+## Test Utility
+import unittest
+## Test Target
+from Helltaker import GameplaySequence, StandardRules, DestroyTerminalsRules, GameplayRule
+from Helltaker import cache
+from Helltaker.cache import LevelCache, fingerprint
+
+from Helltaker.tests.test_gameplay import MAP
+
+## Builtin
+import json
+import os
+import tempfile
+
+class FingerprintTestCase(unittest.TestCase):
+    def test_normalized(self):
+        """ Tests that the fingerprint ignores whitespace and entity order """
+        self.assertEqual(fingerprint(GameplaySequence([["C", "BP"]], 5)), fingerprint(GameplaySequence([["C ", "PB"]], 5)))
+
+    def test_differences(self):
+        """ Tests that the fingerprint changes with the grid, willpower, key and rules """
+        base = fingerprint(GameplaySequence(MAP, 9))
+        self.assertNotEqual(base, fingerprint(GameplaySequence(MAP, 10)))
+        self.assertNotEqual(base, fingerprint(GameplaySequence(MAP, 9, rulesets = [StandardRules, DestroyTerminalsRules])))
+        gameplay = GameplaySequence(MAP, 9)
+        gameplay.character.haskey = True
+        self.assertNotEqual(base, fingerprint(gameplay))
+
+    def test_version(self):
+        """ Tests that changing FINGERPRINTVERSION invalidates the fingerprints """
+        base = fingerprint(GameplaySequence(MAP, 9))
+        version = cache.FINGERPRINTVERSION
+        try:
+            cache.FINGERPRINTVERSION += 1
+            self.assertNotEqual(base, fingerprint(GameplaySequence(MAP, 9)))
+        finally:
+            cache.FINGERPRINTVERSION = version
+
+    def test_unregistered_rule(self):
+        """ Tests that rules which are not in AVAILABLERULES cannot be fingerprinted """
+        class CustomRules(GameplayRule):
+            PREMOVE = []
+            POSTMOVE = []
+        self.assertRaises(ValueError, fingerprint, GameplaySequence(MAP, 9, rulesets = [CustomRules]))
+
+class LevelCacheTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "cache.sqlite3")
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+        return super().tearDown()
+
+    def test_persistence(self):
+        """ Tests that results are available after reopening the cache """
+        with LevelCache(self.path) as cache:
+            cache.put("abc", "solve", {"a": 1})
+        with LevelCache(self.path) as cache:
+            self.assertEqual(cache.get("abc", "solve"), {"a": 1})
+            self.assertIsNone(cache.get("abc", "explore"))
+
+    def test_eviction(self):
+        """ Tests that the least recently used results are evicted """
+        with LevelCache(self.path, maxsize = 30) as cache:
+            cache.put("a", "solve", "x"*10)
+            cache.put("b", "solve", "x"*10)
+            ## Marks a as more recently used than b
+            cache.get("a", "solve")
+            cache.put("c", "solve", "x"*10)
+            self.assertLessEqual(cache.size(), 30)
+            self.assertIsNotNone(cache.get("a", "solve"))
+            self.assertIsNone(cache.get("b", "solve"))
+            self.assertIsNotNone(cache.get("c", "solve"))
+
+    def test_solvefromjson(self):
+        """ Tests that solving a level json uses the cached result """
+        level = os.path.join(self.directory.name, "level.json")
+        with open(level, 'w') as f:
+            json.dump({"grid": MAP, "willpower": 9}, f)
+        with LevelCache(self.path) as cache:
+            result = cache.solve(level)
+            self.assertIsNotNone(result.actions)
+            ## Replacing the stored result shows that the stored result is returned
+            cache.put(fingerprint(GameplaySequence.loadfromjson(level)), "solve", [["up"], {}])
+            self.assertEqual(cache.solve(level).actions, ["up"])
+
+    def test_minimum_willpower(self):
+        """ Tests that minimum_willpower is cached """
+        from Helltaker import solver
+        with LevelCache(self.path) as cache:
+            self.assertEqual(cache.minimum_willpower(MAP), solver.minimum_willpower(MAP))
+            self.assertEqual(len(cache), 1)
+            ## Replacing the stored result shows that the stored result is returned
+            cache.put(fingerprint(GameplaySequence(MAP, solver.UNLIMITED)), "minimum_willpower", [4, ["up"]])
+            self.assertEqual(cache.minimum_willpower(MAP), (4, ["up"]))
+            ## Results within a limit are stored separately
+            self.assertEqual(cache.minimum_willpower(MAP, limit = 4), (None, None))
+            self.assertEqual(len(cache), 2)
+
+    def test_minimum_willpower_symmetric(self):
+        """ Tests that mirrored levels share their cached minimum_willpower """
+        from Helltaker.tests.test_solver import replay
+        mirrored = [list(reversed(row)) for row in MAP]
+        with LevelCache(self.path, symmetric = True) as cache:
+            willpower = cache.minimum_willpower(MAP)[0]
+            mirroredwillpower, actions = cache.minimum_willpower(mirrored)
+            self.assertEqual((mirroredwillpower, len(cache)), (willpower, 1))
+            self.assertIsInstance(replay(GameplaySequence(mirrored, willpower), actions), GameplaySequence.Victory)
@@ -0,0 +1,69 @@
+## Test Utility
+import unittest
+## Test Target
+from Helltaker import GameplaySequence, Map, Status
+from Helltaker import compiled, harness
+from Helltaker.compiled import CompiledMap, compilelevel
+
+from Helltaker.tests.test_run import MAP_IV
+
+## A laser which can be blocked by kicking the Block into its beam
+LASERS = [
+    ["",  "",  "2", "" ],
+    ["",  "B", "",  "W"],
+    ["C", "",  "",  "P"],
+    ["",  "W", "",  "T"],
+]
+
+class CompiledMapTestCase(unittest.TestCase):
+    def test_tables(self):
+        level = compilelevel(CompiledMap(LASERS))
+        ## Edges, Walls and laser generators can never be moved into
+        self.assertIsNone(level.neighbours[(0, 2)]["left"])
+        self.assertIsNone(level.neighbours[(0, 3)]["right"])
+        self.assertIsNone(level.neighbours[(1, 0)]["right"])
+        self.assertEqual(level.neighbours[(0, 2)]["right"], (1, 2))
+        self.assertEqual(level.spikes, ((3, 2),))
+        self.assertEqual(level.lasers, (((2, 0), ((2, 1), (2, 2), (2, 3))),))
+        self.assertEqual(level.beams[(2, 2)], ((0, 1),))
+
+    def test_cache(self):
+        """ Tests that maps of the same level share a CompiledLevel """
+        first = GameplaySequence(MAP_IV, 23, mapclass = CompiledMap)
+        second = GameplaySequence(MAP_IV, 23, mapclass = CompiledMap)
+        self.assertIs(first.map.level, second.map.level)
+        self.assertIs(first.copy().map.level, first.map.level)
+        hits = compiled.build.cache_info().hits
+        self.assertIs(compiled.compilelevel(first.map), first.map.level)
+        self.assertEqual(compiled.build.cache_info().hits, hits + 1)
+        self.assertEqual(compiled.build.cache_info().maxsize, compiled.CACHESIZE)
+        _map = CompiledMap(LASERS)
+        _map.createentity("W", (0, 0))
+        self.assertIsNot(_map.level, CompiledMap(LASERS).level)
+        self.assertIsNone(_map.level.neighbours[(1, 0)]["left"])
+
+    def test_neighbour(self):
+        """ Tests that directions are normalized like Map.neighbour """
+        _map = CompiledMap(MAP_IV)
+        self.assertEqual(_map.neighbour((0, 0), "DOWN"), (0, 1))
+        self.assertEqual(_map.neighbour((0, 0), " down"), Map(MAP_IV).neighbour((0, 0), " down"))
+        self.assertRaisesRegex(ValueError, "Invalid Direction", _map.neighbour, (0, 0), "north")
+        self.assertRaisesRegex(ValueError, "Invalid Direction", Map(MAP_IV).neighbour, (0, 0), "north")
+
+    def test_lasers(self):
+        gameplay = GameplaySequence(LASERS, 10, mapclass = CompiledMap)
+        lasered = gameplay.copy()
+        lasered.right()
+        self.assertEqual(lasered.step("right"), Status.GAMEOVER_LASER)
+        ## Kicking the Block into the beam protects the Character
+        gameplay.up()
+        self.assertEqual(gameplay.step("right"), Status.KICKED)
+        self.assertEqual(gameplay.map.getentities((2, 1)), "B")
+        for direction in ["down", "right", "right"]:
+            self.assertEqual(gameplay.step(direction), Status.MOVED)
+
+    def test_equivalence(self):
+        """ Tests that random walks give the same results as the reference Map """
+        levels = [(LASERS, 10, True), (MAP_IV, 23, True)] + harness.generatedlevels(5, 6, 6, seed = 3, willpower = 20)
+        stats = harness.differential(levels, backends = ("dense", "compiled"), walks = 40, steps = 30)
+        self.assertEqual(stats['divergences'], [])
@@ -0,0 +1,58 @@
+## Test Utility
+import random
+import unittest
+## Test Target
+from Helltaker.environment import ACTIONS, CHANNELS, Environment
+
+from Helltaker.tests.test_gameplay import MAP
+from Helltaker.tests.test_run import MAP_IV
+
+def fullobservation(environment):
+    """ Builds the observation from scratch for comparison with the incrementally updated buffer """
+    return [[[int(entity in cell) for cell in row] for row in environment.gameplay.map.grid] for entity in CHANNELS]
+
+class EnvironmentTestCase(unittest.TestCase):
+    def test_episode(self):
+        """ Tests a winning episode and its rewards """
+        environment = Environment(MAP, 9, rewards = dict(action = -0.1))
+        observation, info = environment.reset()
+        self.assertEqual(observation.shape, (len(CHANNELS), 4, 3))
+        self.assertEqual(observation[CHANNELS.index("C"), 0, 0], 1)
+        ## Moving off the map is not an action
+        observation, reward, terminated, truncated, info = environment.step(ACTIONS.index("up"))
+        self.assertEqual((reward, terminated, info['acted']), (0.0, False, False))
+        for direction in ["right", "right", "down", "left"]:
+            observation, reward, terminated, truncated, info = environment.step(ACTIONS.index(direction))
+            self.assertEqual((reward, terminated, truncated), (-0.1, False, False))
+        observation, reward, terminated, truncated, info = environment.step(ACTIONS.index("down"))
+        self.assertEqual((reward, terminated, info['outcome']), (1.0, True, "victory"))
+        self.assertRaises(RuntimeError, environment.step, 0)
+
+    def test_gameover(self):
+        environment = Environment(MAP, 2)
+        environment.reset()
+        environment.step(ACTIONS.index("right"))
+        environment.step(ACTIONS.index("right"))
+        observation, reward, terminated, truncated, info = environment.step(ACTIONS.index("down"))
+        self.assertEqual((reward, terminated, info['outcome']), (-1.0, True, "gameover"))
+
+    def test_truncated(self):
+        environment = Environment(MAP, 20, maxsteps = 2)
+        environment.reset()
+        self.assertFalse(environment.step(ACTIONS.index("right"))[3])
+        self.assertTrue(environment.step(ACTIONS.index("left"))[3])
+
+    def test_incremental(self):
+        """ Tests that the incrementally updated observation matches the map after random episodes """
+        rng = random.Random(0)
+        for grid in [MAP, MAP_IV]:
+            environment = Environment(grid, 30)
+            observation, info = environment.reset()
+            initial = observation.tolist()
+            for episode in range(20):
+                self.assertEqual(environment.reset()[0].tolist(), initial)
+                terminated = truncated = False
+                while not (terminated or truncated):
+                    observation, reward, terminated, truncated, info = environment.step(rng.randrange(len(ACTIONS)))
+                    with self.subTest(grid = grid, episode = episode):
+                        self.assertEqual(observation.tolist(), fullobservation(environment))
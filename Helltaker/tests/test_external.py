@@ -0,0 +1,53 @@
+## Test Utility
+import unittest
+## Test Target
+from Helltaker import GameplaySequence
+from Helltaker import external, solver
+
+from Helltaker.tests.test_gameplay import MAP
+from Helltaker.tests.test_solver import replay
+
+## Builtin
+import os
+import tempfile
+
+class ExternalSearchTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+        return super().tearDown()
+
+    def test_encodeactions(self):
+        """ Tests that encoded actions preserve spike damage """
+        actions = ["up", "RIGHT", "down", "left"]
+        self.assertEqual(external.encodeactions(actions), "uRdl")
+        self.assertEqual(external.decodeactions("uRdl"), actions)
+
+    def test_solve(self):
+        """ Tests that a search which spills to disk finds a shortest solution """
+        result = external.solve(GameplaySequence(MAP, 9), self.directory.name, memory = 100)
+        self.assertGreater(result.stats['spills'], result.stats['layers'])
+        self.assertEqual(len(result.actions), len(solver.solve(GameplaySequence(MAP, 9)).actions))
+        self.assertIsInstance(replay(GameplaySequence(MAP, 9), result.actions), GameplaySequence.Victory)
+
+    def test_unwinnable(self):
+        """ Tests that the search terminates when the state space is exhausted """
+        result = external.solve(GameplaySequence(MAP, 4), self.directory.name, memory = 100)
+        self.assertIsNone(result.actions)
+        self.assertTrue(result.stats['complete'])
+
+    def test_resume(self):
+        """ Tests that an interrupted search can be resumed from its manifest """
+        search = external.ExternalSearch(self.directory.name, memory = 100)
+        search.start(GameplaySequence(MAP, 9))
+        result = search.run(layers = 2)
+        self.assertFalse(result.stats['complete'])
+        ## Simulate a crash part-way through the next layer
+        open(os.path.join(self.directory.name, "run-3-0"), 'w').close()
+        result = external.resume(self.directory.name)
+        self.assertTrue(result.stats['complete'])
+        self.assertIsInstance(replay(GameplaySequence(MAP, 9), result.actions), GameplaySequence.Victory)
+        self.assertNotIn("run-3-0", os.listdir(self.directory.name))
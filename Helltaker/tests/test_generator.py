@@ -0,0 +1,60 @@
+## Test Utility
+import unittest
+## Test Target
+from Helltaker import AVAILABLERULES, GameplaySequence
+from Helltaker.generator import LevelGenerator
+
+from Helltaker.tests.test_solver import replay
+
+## Builtin
+import random
+
+class LevelGeneratorTestCase(unittest.TestCase):
+    def test_grid(self):
+        """ Tests that grids contain the required entities """
+        generator = LevelGenerator(4, 3, keys = True, targets = 2)
+        grid = generator.grid(random.Random(0))
+        cells = [cell for row in grid for cell in row]
+        self.assertEqual((len(grid), len(grid[0])), (3, 4))
+        self.assertEqual(cells.count("C"), 1)
+        self.assertGreaterEqual(cells.count("T"), 2)
+        self.assertIn("K", cells)
+        self.assertIn("G", cells)
+
+    def test_validate(self):
+        """ Tests the cheap rejection of invalid grids """
+        generator = LevelGenerator(3, 1)
+        self.assertTrue(generator.validate([["C", "", "T"]]))
+        self.assertFalse(generator.validate([["C", "C", "T"]]))
+        ## Target is behind a Wall
+        self.assertFalse(generator.validate([["C", "W", "T"]]))
+        ## Character starts in a laser
+        self.assertFalse(generator.validate([["1", "C", "T"]]))
+
+    def test_generate(self):
+        """ Tests that generated levels are winnable with exactly the minimum Willpower """
+        generator = LevelGenerator(3, 3, difficulty = (3, 8))
+        levels = list(generator.generate(2, processes = 1))
+        self.assertEqual(len(levels), 2)
+        self.assertEqual(generator.stats['accepted'] + generator.stats['invalid'] + generator.stats['unsolvable'] + generator.stats['offtarget'],
+                         generator.stats['attempts'])
+        for level in levels:
+            with self.subTest(level = level):
+                rulesets = [AVAILABLERULES[rule] for rule in level['rules']]
+                self.assertTrue(3 <= level['willpower'] <= 8)
+                self.assertIsInstance(replay(GameplaySequence(level['grid'], level['willpower'], rulesets), level['solution']), GameplaySequence.Victory)
+        self.assertGreater(generator.throughput(), 0)
+
+    def test_generate_processes(self):
+        """ Tests that levels are reproducible when generated across multiple processes """
+        generator = LevelGenerator(3, 3, difficulty = (3, 8))
+        expected = list(generator.generate(2, processes = 1, batch = 4))
+        self.assertEqual(list(LevelGenerator(3, 3, difficulty = (3, 8)).generate(2, processes = 2, batch = 4)), expected)
+
+    def test_generate_closed(self):
+        """ Tests that closing the generator early cancels the pending attempts and shuts down the pool """
+        generator = LevelGenerator(3, 3, difficulty = (3, 8))
+        levels = generator.generate(5, processes = 2, batch = 32)
+        next(levels)
+        levels.close()
+        self.assertLess(generator.stats['attempts'], 32)
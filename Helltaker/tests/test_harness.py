@@ -0,0 +1,45 @@
+## Test Utility
+import unittest
+from unittest import mock
+## Test Target
+from Helltaker import SparseMap
+from Helltaker import harness
+
+from Helltaker.tests.test_gameplay import MAP
+from Helltaker.tests.test_run import MAP_IV
+
+LEVELS = [(MAP, 9, True), (MAP_IV, 23, True)]
+
+class FrozenSpikesMap(SparseMap):
+    """ A broken backend whose spikes never cycle """
+    def cyclespikes(self): pass
+
+class HarnessTestCase(unittest.TestCase):
+    def test_throughput(self):
+        levels = LEVELS + harness.generatedlevels(2, seed = 1)
+        for backend in harness.BACKENDS:
+            stats = harness.throughput(levels, backend, walks = 20, steps = 30, allocations = 50)
+            self.assertEqual(stats['walks'], 20 * len(levels))
+            self.assertGreater(stats['moves'], 0)
+            self.assertGreater(stats['kicks'], 0)
+            self.assertLessEqual(stats['kicks'], stats['actions'])
+            self.assertGreater(stats['moves_per_second'], 0)
+            self.assertGreater(stats['allocated_per_move'], 0)
+
+    def test_differential(self):
+        """ Tests that the backends agree on every step """
+        stats = harness.differential(LEVELS + harness.generatedlevels(3, seed = 2), walks = 30, steps = 40)
+        self.assertEqual(stats['walks'], 30 * 5)
+        self.assertEqual(stats['divergences'], [])
+
+    def test_minimize(self):
+        """ Tests that a diverging walk is found and minimized """
+        with mock.patch.dict(harness.BACKENDS, frozen = FrozenSpikesMap):
+            stats = harness.differential([(MAP, 9, True)], backends = ("dense", "frozen"), walks = 10, steps = 20)
+            self.assertTrue(stats['divergences'])
+            for divergence in stats['divergences']:
+                reproducer = divergence['reproducer']
+                self.assertLessEqual(len(reproducer), divergence['step'] + 1)
+                self.assertEqual(harness.diverges((MAP, 9, True), reproducer, ("dense", "frozen")), len(reproducer) - 1)
+            ## The spikes cycle after the first action
+            self.assertEqual(min(len(divergence['reproducer']) for divergence in stats['divergences']), 1)
@@ -0,0 +1,64 @@
+## Test Utility
+import unittest
+## Test Target
+from Helltaker import GameplaySequence
+from Helltaker import solver
+from Helltaker.hints import HintService
+
+from Helltaker.tests.test_gameplay import MAP
+from Helltaker.tests.test_run import MAP_IV
+
+class HintServiceTestCase(unittest.TestCase):
+    def test_proven(self):
+        """ Tests that following proven hints wins with the minimum Willpower """
+        willpower, actions = solver.minimum_willpower(MAP)
+        gameplay = GameplaySequence(MAP, willpower)
+        service = HintService()
+        hint = service.hint(gameplay, budget = 10)
+        self.assertTrue(hint.proven)
+        self.assertEqual(hint.willpower, willpower)
+        with self.assertRaises(GameplaySequence.Victory):
+            while True:
+                hint = service.hint(gameplay, budget = 10)
+                self.assertTrue(hint.proven)
+                gameplay.move(hint.direction)
+
+    def test_reroot(self):
+        """ Tests that the graph is reused after the player moves """
+        gameplay = GameplaySequence(MAP, 9)
+        service = HintService()
+        hint = service.hint(gameplay, budget = 10)
+        expanded = service.stats['expanded']
+        gameplay.move(hint.direction)
+        service.hint(gameplay, budget = 10)
+        self.assertEqual(service.stats['expanded'], expanded)
+        self.assertGreater(service.stats['reused'], 0)
+
+    def test_unwinnable(self):
+        """ Tests that unwinnable gamestates are proven to have no hint """
+        hint = HintService().hint(GameplaySequence(MAP, 4), budget = 10)
+        self.assertEqual(hint, (None, True, None))
+
+    def test_budget(self):
+        """ Tests that a heuristic direction is returned when the budget runs out """
+        hint = HintService().hint(GameplaySequence(MAP_IV, 23), budget = 0)
+        self.assertFalse(hint.proven)
+        self.assertIn(hint.direction, ["up", "right", "down", "left"])
+
+    def test_maxnodes(self):
+        """ Tests that a single search does not grow the graph past maxnodes """
+        service = HintService(maxnodes = 50)
+        hint = service.hint(GameplaySequence(MAP_IV, 23), budget = 10)
+        self.assertFalse(hint.proven)
+        self.assertIn(hint.direction, ["up", "right", "down", "left"])
+        ## The last expansion adds at most one Node per direction
+        self.assertLessEqual(len(service.nodes), 50 + 4)
+        self.assertEqual(service.stats['truncated'], 1)
+
+    def test_willpower_cut(self):
+        """ Tests that states without Willpower remaining are not expanded """
+        service = HintService()
+        self.assertEqual(service.hint(GameplaySequence(MAP, 0), budget = 10), (None, True, None))
+        self.assertEqual(service.stats['expanded'], 0)
+        service.hint(GameplaySequence(MAP, 1), budget = 10)
+        self.assertEqual(service.stats['expanded'], 1)
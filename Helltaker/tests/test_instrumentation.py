@@ -0,0 +1,117 @@
+## Test Utility
+import unittest
+## Test Target
+from Helltaker import GameplaySequence, Map, SparseMap
+from Helltaker.compiled import CompiledMap
+from Helltaker import instrumentation, solver
+from Helltaker.instrumentation import Instrumentation
+
+from Helltaker.tests.test_gameplay import MAP
+
+## Builtin
+import json
+import os
+import tempfile
+
+class InstrumentationTestCase(unittest.TestCase):
+    def test_engine_counters(self):
+        """ Tests the counters for a known sequence of actions """
+        with Instrumentation() as instrument:
+            gameplay = GameplaySequence(MAP, 9)
+            for direction in ["up", "right", "right", "right", "down", "down", "left", "left"]:
+                gameplay.move(direction)
+        counters = instrument.asdict()['counters']
+        self.assertEqual(counters['moves'], 8)
+        ## Moving up (off the map) is not an action
+        self.assertEqual(counters['actions'], 7)
+        ## Skeleton and immovable Block
+        self.assertEqual(counters['kicks'], 2)
+        ## The Skeleton is kicked onto Spikes (which kill it) rather than being destroyed by the kick
+        self.assertNotIn('destroys', counters)
+        self.assertEqual(counters['keys'], 1)
+        self.assertEqual(counters['gate_unlocks'], 1)
+        self.assertEqual(counters['premove_checks'], 8)
+        self.assertEqual(counters['postmove_checks'], 8)
+        rules = instrument.asdict()['rules']
+        self.assertEqual(rules['StandardRules.gameover_noactions']['calls'], 8)
+        self.assertEqual(rules['TargetSquareRules.victory_isattarget']['calls'], 8)
+
+    def test_mapclasses(self):
+        """ Tests that Map subclasses which override instrumented methods are counted the same """
+        for mapclass in (Map, SparseMap, CompiledMap):
+            with self.subTest(mapclass = mapclass):
+                with Instrumentation() as instrument:
+                    gameplay = GameplaySequence(MAP, 9, mapclass = mapclass)
+                    for direction in ["right", "right", "down", "left"]:
+                        gameplay.move(direction)
+                    self.assertRaises(GameplaySequence.Victory, gameplay.down)
+                counters = instrument.asdict()['counters']
+                self.assertEqual((counters['keys'], counters['gate_unlocks'], counters['kicks']), (1, 1, 1))
+        self.assertIs(SparseMap.removeentity, SparseMap.__dict__['removeentity'])
+        self.assertNotIn("__wrapped__", vars(SparseMap.removeentity))
+
+    def test_rules(self):
+        """ Tests that GameplaySequence.runchecks is still called and each GameplayRule's callbacks are restored """
+        from Helltaker import StandardRules, TargetSquareRules
+        class CustomRules(StandardRules): pass
+        premove, postmove = StandardRules.__dict__['PREMOVE'], StandardRules.__dict__['POSTMOVE']
+        original, calls = GameplaySequence.runchecks, []
+        def runchecks(gameplay, phase):
+            calls.append(phase)
+            return original(gameplay, phase)
+        GameplaySequence.runchecks = runchecks
+        try:
+            with Instrumentation() as instrument:
+                gameplay = GameplaySequence("C,T", 9, rulesets = [StandardRules, CustomRules, TargetSquareRules])
+                self.assertRaisesRegex(GameplaySequence.Victory, "Waifu Getto!", gameplay.right)
+        finally:
+            GameplaySequence.runchecks = original
+        self.assertEqual(calls, ["PREMOVE", "POSTMOVE"])
+        rules = instrument.asdict()['rules']
+        self.assertEqual((rules['StandardRules.gameover_noactions']['calls'], rules['CustomRules.gameover_noactions']['calls']), (1, 1))
+        self.assertEqual(rules['TargetSquareRules.victory_isattarget']['calls'], 1)
+        self.assertIs(StandardRules.__dict__['PREMOVE'], premove)
+        self.assertIs(StandardRules.__dict__['POSTMOVE'], postmove)
+        self.assertNotIn('PREMOVE', CustomRules.__dict__)
+
+    def test_destroys(self):
+        """ Tests that kicks which destroy the kicked entity are counted """
+        with Instrumentation() as instrument:
+            GameplaySequence("C,S", 9).right()
+        self.assertEqual(instrument.counters['destroys'], 1)
+
+    def test_disable(self):
+        """ Tests that the original methods are restored """
+        original = GameplaySequence.__dict__['move']
+        with Instrumentation():
+            self.assertIsNot(GameplaySequence.__dict__['move'], original)
+            self.assertRaises(RuntimeError, Instrumentation().enable)
+        self.assertIs(GameplaySequence.__dict__['move'], original)
+        self.assertIsNone(instrumentation.ACTIVE)
+
+    def test_search_counters(self):
+        """ Tests that the solver reports to the active Instrumentation """
+        with Instrumentation() as instrument:
+            result = solver.solve(GameplaySequence(MAP, 9))
+        counters = instrument.asdict()['counters']
+        self.assertEqual(counters['duplicates'], result.stats['duplicates'])
+        self.assertGreater(counters['expanded'], 0)
+        self.assertIn('frontier', instrument.gauges)
+
+    def test_export(self):
+        """ Tests the json lines and Prometheus exports """
+        with tempfile.TemporaryDirectory() as directory:
+            jsonl = os.path.join(directory, "counters.jsonl")
+            with Instrumentation(jsonl = jsonl, interval = 0) as instrument:
+                solver.solve(GameplaySequence(MAP, 9))
+            with open(jsonl, 'r') as f:
+                snapshots = [json.loads(line) for line in f]
+            self.assertGreater(len(snapshots), 1)
+            self.assertLessEqual(snapshots[0]['counters']['expanded'], snapshots[-1]['counters']['expanded'])
+
+            prometheus = os.path.join(directory, "helltaker.prom")
+            instrument.writeprometheus(prometheus)
+            with open(prometheus, 'r') as f:
+                text = f.read()
+            self.assertIn("helltaker_moves_total", text)
+            self.assertIn('helltaker_rule_seconds_total{rule="StandardRules",callback="gameover_lasered"}', text)
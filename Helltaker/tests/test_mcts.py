@@ -0,0 +1,60 @@
+## Test Utility
+import unittest
+## Test Target
+from Helltaker import GameplaySequence
+from Helltaker.mcts import MonteCarloTreeSearch
+
+from Helltaker.tests.test_gameplay import MAP
+from Helltaker.tests.test_solver import replay
+
+class MonteCarloTreeSearchTestCase(unittest.TestCase):
+    def test_solution(self):
+        """ Tests that a fixed simulation budget finds a solution which replays to Victory """
+        gameplay = GameplaySequence(MAP, 15)
+        search = MonteCarloTreeSearch(gameplay, seed = 0)
+        stats = search.run(simulations = 300)
+        self.assertEqual(stats['simulations'], 300)
+        self.assertGreater(stats['victories'], 0)
+        self.assertIsNotNone(search.solution)
+        self.assertIsInstance(replay(GameplaySequence(MAP, 15), search.solution), GameplaySequence.Victory)
+        self.assertGreater(search.rollouts_per_second(), 0)
+        self.assertIn(search.bestdirection(), ["right", "down"])
+        ## The search does not modify the given gameplay
+        self.assertEqual(gameplay.actions, [])
+
+    def test_greedy(self):
+        """ Tests that the greedy rollout policy wins more often than the random policy """
+        gameplay = GameplaySequence(MAP, 15)
+        uniform = MonteCarloTreeSearch(gameplay, policy = "random", seed = 1)
+        uniform.run(simulations = 200)
+        greedy = MonteCarloTreeSearch(gameplay, policy = "greedy", epsilon = 0.1, seed = 1)
+        greedy.run(simulations = 200)
+        self.assertGreater(greedy.winrate(), uniform.winrate())
+
+    def test_unwinnable(self):
+        """ Tests that an unwinnable level is never won """
+        search = MonteCarloTreeSearch(GameplaySequence(MAP, 4), seed = 0)
+        search.run(simulations = 50)
+        self.assertEqual(search.winrate(), 0)
+        self.assertIsNone(search.solution)
+
+    def test_arguments(self):
+        gameplay = GameplaySequence(MAP, 15)
+        self.assertRaises(ValueError, MonteCarloTreeSearch, gameplay, policy = "other")
+        self.assertRaises(ValueError, MonteCarloTreeSearch(gameplay).run)
+        ## A zero second budget runs no simulations
+        self.assertEqual(MonteCarloTreeSearch(gameplay).run(budget = 0)["simulations"], 0)
+
+    def test_cheapest(self):
+        """ Tests that the solution is the cheapest in Willpower rather than the shortest """
+        ## Walking straight to the Target takes 4 actions but is damaged by the spikes (costing 7)
+        grid = [
+            ["C", "p", "P", "p", "T"],
+            ["",  "",  "",  "",  "" ],
+        ]
+        ## A high exploration constant makes the tree reach the detour as well
+        search = MonteCarloTreeSearch(GameplaySequence(grid, 7), exploration = 5, seed = 0)
+        search.run(simulations = 1000)
+        self.assertEqual(search.willpower, 6)
+        self.assertEqual(len(search.solution), 6)
+        self.assertIsInstance(replay(GameplaySequence(grid, 6), search.solution), GameplaySequence.Victory)
@@ -0,0 +1,87 @@
+## Test Utility
+import math
+import os
+import tempfile
+import unittest
+## Test Target
+from Helltaker import GameplaySequence, StandardRules, TargetSquareRules, DestroyTerminalsRules
+from Helltaker import patterns, solver
+
+from Helltaker.tests.test_gameplay import MAP
+from Helltaker.tests.test_run import MAP_IV
+
+class PatternDatabaseTestCase(unittest.TestCase):
+    def test_relaxed(self):
+        """ Tests the relaxed costs of a small level """
+        database = patterns.PatternDatabase(*patterns.level(GameplaySequence([["C", "B", ""], ["", "", "T"]], 10).map), size = 1)
+        ## Walking around the Block
+        self.assertEqual(database.lookup(0, (1,)), 3)
+        self.assertEqual(database.lookup(4, (1,)), 1)
+        ## Kicking the Block would push it onto the Target
+        self.assertEqual(database.lookup(3, (4,)), 4)
+        ## The Block is on the Target and cannot be kicked off it
+        self.assertEqual(database.lookup(4, (5,)), math.inf)
+
+    def test_deadlock(self):
+        """ Tests that a Block kicked onto the only Target makes the level unwinnable """
+        gameplay = GameplaySequence([["C", "B", "T"]], 10)
+        databases = patterns.PatternDatabases(gameplay)
+        self.assertEqual(databases.heuristic(gameplay), math.inf)
+        self.assertTrue(databases.unwinnable(gameplay))
+        self.assertIsNone(solver.uniformcost(gameplay).actions)
+
+    def test_admissible(self):
+        """ Tests that the heuristic never exceeds the Willpower remaining along the cheapest solution """
+        for grid in [MAP, MAP_IV, [["C", "B", "", ""], ["", "B", "", "T"]]]:
+            with self.subTest(grid = grid):
+                willpower, actions = solver.minimum_willpower(grid) if grid is not MAP_IV else (19, MAP_IV_SOLUTION)
+                gameplay = GameplaySequence(grid, willpower)
+                databases = patterns.PatternDatabases(gameplay)
+                for action in actions[:-1]:
+                    self.assertLessEqual(databases(gameplay), willpower - gameplay.action_length())
+                    gameplay.move(action.lower())
+        self.assertGreater(patterns.PatternDatabases(GameplaySequence(MAP_IV, 23))(GameplaySequence(MAP_IV, 23)),
+                           GameplaySequence(MAP_IV, 23).map.distance_to_coord((0, 0), (6, 2)))
+
+    def test_cache(self):
+        """ Tests that databases are cached by fingerprint and that parallel builds match """
+        gameplay = GameplaySequence(MAP_IV, 23)
+        with tempfile.TemporaryDirectory() as directory:
+            built = patterns.PatternDatabases(gameplay, directory = directory, processes = 2)
+            self.assertEqual(built.stats, dict(built = 3, loaded = 0))
+            self.assertEqual(len(os.listdir(directory)), 3)
+            ## The databases do not depend on the movable entities
+            gameplay.move("down")
+            loaded = patterns.PatternDatabases(gameplay, directory = directory)
+            self.assertEqual(loaded.stats, dict(built = 0, loaded = 3))
+            for size, database in built.databases.items():
+                self.assertEqual(loaded.databases[size].table, database.table)
+
+    def test_parallel(self):
+        """ Tests that splitting the layers of the search across processes builds the same tables """
+        level = patterns.level(GameplaySequence(MAP_IV, 23).map)
+        chunksize = patterns.CHUNKSIZE
+        try:
+            ## Every layer is split into chunks
+            patterns.CHUNKSIZE = 1
+            for size in (0, 1, 2):
+                with self.subTest(size = size):
+                    self.assertEqual(patterns.build(*level, size, processes = 3), patterns.build(*level, size))
+        finally:
+            patterns.CHUNKSIZE = chunksize
+
+    def test_rule(self):
+        """ Tests that the databases can prune a search through GameplaySequence.unwinnable """
+        gameplay = GameplaySequence(MAP, 5)
+        databases = patterns.PatternDatabases(gameplay)
+        pruned = GameplaySequence(MAP, 5, rulesets = [StandardRules, TargetSquareRules, databases.rule()])
+        result = solver.solve(pruned)
+        self.assertEqual(result.actions, solver.solve(gameplay).actions)
+        self.assertFalse(pruned.unwinnable())
+        ## Manhattan distance alone does not show that the Block has to be walked around
+        rulesets = [StandardRules, TargetSquareRules, patterns.PatternDatabases(GameplaySequence([["C", "B", "T"], ["", "", ""]], 10)).rule()]
+        self.assertFalse(GameplaySequence([["C", "B", "T"], ["", "", ""]], 3).unwinnable())
+        self.assertTrue(GameplaySequence([["C", "B", "T"], ["", "", ""]], 3, rulesets = rulesets).unwinnable())
+        self.assertRaises(ValueError, patterns.PatternDatabases, GameplaySequence("C,E", 5, rulesets = [StandardRules, DestroyTerminalsRules]))
+
+MAP_IV_SOLUTION = ["down", "down", "down", "right", "down", "down", "right", "up", "up", "right", "down", "down", "right", "up", "up", "right", "right", "right", "right"]
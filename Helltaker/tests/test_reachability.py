@@ -0,0 +1,56 @@
+## Test Utility
+import unittest
+## Test Target
+from Helltaker import GameplaySequence
+from Helltaker import reachability, solver
+
+from Helltaker.tests.test_gameplay import MAP
+from Helltaker.tests.test_solver import replay
+
+class ReachabilityTestCase(unittest.TestCase):
+    def test_region(self):
+        """ Tests the walking cost and spike damage of each cell in the Region """
+        walk = reachability.region(GameplaySequence([["C", "p", "P"], ["", "", "W"]], 10))
+        self.assertTrue(walk.stable)
+        self.assertEqual(walk.costs, {(0, 0): 0, (1, 0): 2, (2, 0): 4, (0, 1): 1, (1, 1): 2})
+        self.assertEqual(walk.paths[(2, 0)], ["RIGHT", "RIGHT"])
+        self.assertEqual(walk.paths[(1, 1)], ["down", "right"])
+        ## Walking is limited by the remaining Willpower
+        self.assertEqual(set(reachability.region(GameplaySequence([["C", "p", "P"], ["", "", "W"]], 2)).costs),
+                         {(0, 0), (1, 0), (0, 1), (1, 1)})
+
+    def test_unstable(self):
+        """ Tests that a Skeleton on spikes prevents normalization """
+        walk = reachability.region(GameplaySequence([["C", "", "Sp"]], 10))
+        self.assertFalse(walk.stable)
+        self.assertEqual(walk.costs, {(0, 0): 0})
+
+    def test_normalize(self):
+        """ Tests that states which differ only by the Character's position in its Region are collapsed """
+        grid = [["C", "", "B", ""], ["", "", "", "T"]]
+        a, b = GameplaySequence(grid, 10), GameplaySequence(grid, 10)
+        b.down(), b.right()
+        akey, awalk = reachability.normalize(a)
+        bkey, bwalk = reachability.normalize(b)
+        self.assertEqual(akey, bkey)
+        self.assertEqual(bwalk.costs[(0, 0)], 2)
+        ## Kicking the Block changes the layout
+        a.right(), a.right()
+        self.assertNotEqual(reachability.normalize(a)[0], bkey)
+
+    def test_solve(self):
+        """ Tests that searching push macro-moves finds the cheapest concrete solution """
+        grids = [
+            MAP,
+            [["C", "", "", ""], ["", "B", "S", ""], ["", "", "B", "T"]],
+            [["C", "p", "P", "p", "T"], ["",  "",  "",  "",  "" ]],
+        ]
+        for grid in grids:
+            with self.subTest(grid = grid):
+                willpower = solver.minimum_willpower(grid)[0]
+                result = reachability.solve(GameplaySequence(grid, willpower))
+                self.assertEqual(result.stats['willpower'], willpower)
+                self.assertIsInstance(replay(GameplaySequence(grid, willpower), result.actions), GameplaySequence.Victory)
+                self.assertIsNone(reachability.solve(GameplaySequence(grid, willpower - 1)).actions)
+        result = reachability.solve(GameplaySequence(grids[1], 10))
+        self.assertGreater(result.stats['collapsed'], 0)
@@ -0,0 +1,77 @@
+## Test Utility
+import unittest
+## Test Target
+from Helltaker import GameplaySequence
+from Helltaker import scheduler, solver
+
+from Helltaker.tests.test_gameplay import MAP
+from Helltaker.tests.test_run import MAP_IV
+from Helltaker.tests.test_solver import replay
+
+## Builtin
+import time
+
+def hog(gameplay):
+    """ A solve function which allocates more memory than the tests allow """
+    return bytearray(2**30), {}
+
+def stall(gameplay):
+    """ A solve function which never finishes levels with more than 10 Willpower (and solves the others) """
+    if gameplay.character.willpower > 10: time.sleep(3600)
+    return solver.uniformcost(gameplay)
+
+class SchedulerTestCase(unittest.TestCase):
+    def test_estimate(self):
+        ## The only action wins, so every probe sees the whole tree
+        estimate = scheduler.estimate(GameplaySequence([["C", "T"]], 1))
+        self.assertEqual(estimate['treesize'], 2)
+        self.assertEqual(estimate['cost'], 2)
+        first, second = (scheduler.estimate(GameplaySequence(MAP, 9), seed = 1) for i in range(2))
+        del first['elapsed'], second['elapsed']
+        self.assertEqual(first, second)
+
+    def test_features(self):
+        counts = scheduler.features(GameplaySequence(MAP, 9))
+        self.assertEqual((counts['willpower'], counts['area'], counts['open'], counts['kickables'], counts['key']), (9, 12, 10, 3, True))
+        self.assertLess(scheduler.estimate(GameplaySequence(MAP, 9))['cost'], scheduler.estimate(GameplaySequence(MAP, 15))['cost'])
+        self.assertLessEqual(scheduler.estimate(GameplaySequence(MAP, 15))['cost'], scheduler.statebound(counts))
+
+    def test_order(self):
+        batch = scheduler.Scheduler(probes = 8)
+        hard = batch.add(GameplaySequence(MAP_IV, 23), "IV")
+        easy = batch.add(GameplaySequence([["C", "", "T"]], 2), "easy")
+        middle = batch.add(GameplaySequence(MAP, 9), "middle")
+        self.assertEqual(batch.order(), [easy, middle, hard])
+        shards = batch.shards(2)
+        self.assertEqual(shards[0], [hard])
+        self.assertEqual(sorted(shards[1]), sorted([middle, easy]))
+
+    def test_run(self):
+        batch = scheduler.Scheduler(workers = 2, timeout = 30, probes = 8)
+        batch.add(GameplaySequence(MAP, 9), "solvable")
+        batch.add(GameplaySequence([["C", "W", "T"]], 3), "unsolvable")
+        results = {result['name']: result for result in batch.run()}
+        self.assertEqual(results['solvable']['result'], "solved")
+        self.assertIsInstance(replay(GameplaySequence(MAP, 9), results['solvable']['actions']), GameplaySequence.Victory)
+        self.assertEqual(results['unsolvable']['result'], "unsolvable")
+        self.assertEqual((batch.stats['solved'], batch.stats['unsolvable'], batch.stats['attempts']), (1, 1, 2))
+
+    def test_timeout(self):
+        """ Levels which exceed their time limit are requeued behind the other levels with a larger budget """
+        batch = scheduler.Scheduler(stall, workers = 1, timeout = 0.5, backoff = 2, retries = 1, probes = 4)
+        ## The stalled level is the cheapest, so it is attempted first and then requeued behind the other level
+        batch.add(GameplaySequence([["C", "", "T"]], 11), "stalled")
+        batch.add(GameplaySequence(MAP, 9), "other")
+        self.assertEqual([job.name for job in batch.order()], ["stalled", "other"])
+        results = list(batch.run())
+        self.assertEqual([result['name'] for result in results], ["other", "stalled"])
+        self.assertEqual(results[0]['result'], "solved")
+        self.assertEqual((results[1]['result'], results[1]['attempts'], results[1]['timeout']), ("timeout", 2, 1.0))
+        self.assertEqual((batch.stats['timeout'], batch.stats['requeued'], batch.stats['attempts']), (2, 1, 3))
+
+    @unittest.skipIf(scheduler.resource is None, "Memory limits require the resource module")
+    def test_memory(self):
+        batch = scheduler.Scheduler(hog, workers = 1, timeout = 30, memory = 256 * 2**20, retries = 1, probes = 1)
+        batch.add(GameplaySequence(MAP, 9))
+        (result,) = batch.run()
+        self.assertEqual((result['result'], result['attempts'], result['memory']), ("memory", 2, 512 * 2**20))
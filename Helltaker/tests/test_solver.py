@@ -0,0 +1,163 @@
+## Test Utility
+import unittest
+## Test Target
+from Helltaker import GameplaySequence
+from Helltaker import solver
+
+from Helltaker.tests.test_gameplay import MAP
+
+def replay(gameplay, actions):
+    """ Plays the actions on the gameplay, returning the Exception raised by the final action """
+    for action in actions[:-1]:
+        gameplay.move(action.lower())
+    try:
+        gameplay.move(actions[-1].lower())
+    except (GameplaySequence.Victory, GameplaySequence.GameOver) as e:
+        return e
+
+class SolverTestCase(unittest.TestCase):
+    def test_solve(self):
+        """ Tests that solve returns a winning sequence of actions """
+        result = solver.solve(GameplaySequence(MAP, 9))
+        self.assertIsNotNone(result.actions)
+        self.assertIsInstance(replay(GameplaySequence(MAP, 9), result.actions), GameplaySequence.Victory)
+        self.assertGreater(result.stats['expanded'], 0)
+
+    def test_solve_unwinnable(self):
+        """ Tests that solve returns None when there is not enough Willpower """
+        result = solver.solve(GameplaySequence(MAP, 4))
+        self.assertIsNone(result.actions)
+
+    def test_solve_prepopulated(self):
+        """ Tests that solve only returns the actions taken after the gameplay's existing actions """
+        gameplay = GameplaySequence(MAP, 9)
+        gameplay.right()
+        result = solver.solve(gameplay)
+        self.assertIsInstance(replay(gameplay.copy(), result.actions), GameplaySequence.Victory)
+
+    def test_explore(self):
+        """ Tests that explore finds the minimum Willpower """
+        result = solver.explore(GameplaySequence(MAP, 12))
+        self.assertEqual(result.stats['willpower'], 5)
+        self.assertIsInstance(replay(GameplaySequence(MAP, 5), result.actions), GameplaySequence.Victory)
+        self.assertEqual(result.stats['states'], result.stats['expanded'])
+
+    def test_statekey(self):
+        """ Tests that statekey does not depend on the order of entities within a cell """
+        a = GameplaySequence([["C", "BP"]], 5)
+        b = GameplaySequence([["C", "P"]], 5)
+        b.map.createentity("B", (1,0))
+        self.assertNotEqual(a.map.grid, b.map.grid)
+        self.assertEqual(solver.statekey(a), solver.statekey(b))
+
+    def test_dominancetable(self):
+        """ Tests that only the states which are not dominated are kept for each layout """
+        table = solver.DominanceTable()
+        self.assertTrue(table.add("layout", 5, False))
+        self.assertFalse(table.add("layout", 4, False))
+        self.assertFalse(table.add("layout", 5, False))
+        ## Having the key is not dominated by more Willpower
+        self.assertTrue(table.add("layout", 3, True))
+        self.assertEqual(len(table), 2)
+        ## Dominates both visited states
+        self.assertTrue(table.add("layout", 6, True))
+        self.assertEqual(table.frontiers["layout"], ((6, True),))
+        self.assertTrue(table.add("other", 1, False))
+        self.assertEqual(table.stats, dict(inserted = 4, dominated = 2, discarded = 2))
+
+        gameplay = GameplaySequence(MAP, 9)
+        table.addstate(gameplay)
+        self.assertIn(gameplay, table)
+        self.assertNotIn(GameplaySequence(MAP, 10), table)
+        self.assertTrue(table.kept(gameplay))
+        table.addstate(GameplaySequence(MAP, 10))
+        self.assertFalse(table.kept(gameplay))
+
+    def test_dominance_spikes(self):
+        """ Tests that reaching a layout with less Willpower (through spike damage) is not explored again """
+        grid = [
+            ["C", "P", "p", "P", ""],
+            ["p", "B", "P", "p", "P"],
+            ["P", "p", "",  "P", "T"],
+        ]
+        result = solver.explore(GameplaySequence(grid, 14))
+        self.assertEqual(result.stats['willpower'], solver.minimum_willpower(grid)[0])
+        self.assertIsInstance(replay(GameplaySequence(grid, 14), result.actions), GameplaySequence.Victory)
+        ## Counting states by statekey instead keeps every Willpower each layout is reached with
+        visited, frontier = {solver.statekey(GameplaySequence(grid, 14))}, [GameplaySequence(grid, 14)]
+        while frontier:
+            for direction, child, outcome in solver.successors(frontier.pop()):
+                if outcome is None and (key := solver.statekey(child)) not in visited:
+                    visited.add(key)
+                    if not child.unwinnable(): frontier.append(child)
+        self.assertLess(result.stats['states'], len(visited) / 2)
+        ## States dominated by a state found after them are not expanded
+        self.assertGreater(result.stats['discarded'], 0)
+        self.assertEqual(result.stats['states'], result.stats['expanded'])
+
+    def test_minimum_willpower(self):
+        """ Tests that minimum_willpower matches the exhaustive search and accounts for spike damage """
+        willpower, actions = solver.minimum_willpower(MAP)
+        self.assertEqual(willpower, solver.explore(GameplaySequence(MAP, 12)).stats['willpower'])
+        self.assertIsInstance(replay(GameplaySequence(MAP, willpower), actions), GameplaySequence.Victory)
+        self.assertIsNone(solver.solve(GameplaySequence(MAP, willpower - 1)).actions)
+        ## Spikes become active after the first action
+        self.assertEqual(solver.minimum_willpower([["C", "p", "T"]]), (3, ["RIGHT", "right"]))
+        ## Damage from the winning action does not matter
+        self.assertEqual(solver.minimum_willpower([["C", "pT"]]), (1, ["RIGHT"]))
+
+    def test_minimum_willpower_detour(self):
+        """ Tests that a longer path is preferred when it avoids spike damage """
+        ## Walking straight to the Target is damaged by every spike (costing 7)
+        grid = [
+            ["C", "p", "P", "p", "T"],
+            ["",  "",  "",  "",  "" ],
+        ]
+        willpower, actions = solver.minimum_willpower(grid)
+        self.assertEqual(willpower, 6)
+        self.assertEqual(len(actions), 6)
+        self.assertIsNone(solver.solve(GameplaySequence(grid, 5)).actions)
+
+    def test_minimum_willpower_limit(self):
+        """ Tests that the search stops at the limit """
+        self.assertEqual(solver.minimum_willpower(MAP, limit = 4), (None, None))
+        self.assertEqual(solver.minimum_willpower(MAP, limit = 5)[0], 5)
+
+    def test_optimalsolutions(self):
+        """ Tests that the counted and enumerated cheapest solutions match a brute-force enumeration """
+        def bruteforce(gameplay, willpower):
+            for direction, child, outcome in solver.successors(gameplay):
+                if isinstance(outcome, GameplaySequence.Victory):
+                    if gameplay.action_length() + 1 == willpower: yield child.actions
+                elif outcome is None:
+                    yield from bruteforce(child, willpower)
+
+        grids = [
+            MAP,
+            [["C", "", ""], ["", "", ""], ["", "", "T"]],
+            [["C", "p", "P", "p", "T"], ["", "", "", "", ""]],
+        ]
+        for grid in grids:
+            with self.subTest(grid = grid):
+                willpower, actions = solver.minimum_willpower(grid)
+                result = solver.optimalsolutions(GameplaySequence(grid, willpower + 3))
+                self.assertEqual(result.willpower, willpower)
+                expected = sorted(bruteforce(GameplaySequence(grid, willpower), willpower))
+                self.assertEqual(sorted(result), expected)
+                self.assertEqual(result.count, len(expected))
+        ## Open 3x3 grid: every monotone path to the opposite corner
+        self.assertEqual(solver.optimalsolutions(GameplaySequence(grids[1], 10)).count, 6)
+
+    def test_optimalsolutions_count(self):
+        """ Tests that counts are computed without enumerating the solutions """
+        grid = [[""] * 9 for row in range(9)]
+        grid[0][0], grid[8][8] = "C", "T"
+        result = solver.optimalsolutions(GameplaySequence(grid, 20))
+        ## 16 choose 8
+        self.assertEqual((result.willpower, result.count), (16, 12870))
+        self.assertEqual(len(next(iter(result))), 16)
+
+    def test_optimalsolutions_unwinnable(self):
+        result = solver.optimalsolutions(GameplaySequence(MAP, 4))
+        self.assertEqual((result.willpower, result.count, list(result)), (None, 0, []))
+        self.assertEqual(solver.optimalsolutions(GameplaySequence(MAP, 20), limit = 4).count, 0)
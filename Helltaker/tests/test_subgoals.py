@@ -0,0 +1,69 @@
+## Test Utility
+import unittest
+## Test Target
+from Helltaker import GameplaySequence
+from Helltaker import solver, subgoals
+
+from Helltaker.tests.test_gameplay import MAP
+from Helltaker.tests.test_solver import replay
+
+## The Gate must be opened and the Blocks on both sides of it have to be kicked out of the way
+ROOMS = [
+    ["C", "",  "B", "",  "",  "W", "",  "",  "" ],
+    ["",  "B", "",  "B", "K", "W", "",  "B", "" ],
+    ["B", "",  "B", "",  "",  "G", "B", "",  "T"],
+]
+
+class SubgoalSolverTestCase(unittest.TestCase):
+    def test_subgoals(self):
+        """ Tests that the Key and Gate are only subgoals when the Gate must be opened """
+        self.assertEqual(subgoals.subgoals(GameplaySequence(MAP, 10)), ["key", "gate"])
+        self.assertEqual(subgoals.subgoals(GameplaySequence([["C", "K", "G", "T"]], 10)), ["key", "gate"])
+        self.assertEqual(subgoals.subgoals(GameplaySequence([["C", "K", "G", "T"], ["", "", "", ""]], 10)), [])
+        gameplay = GameplaySequence([["C", "K", "G", "T"]], 10)
+        gameplay.right()
+        self.assertEqual(subgoals.subgoals(gameplay), ["gate"])
+
+    def test_proven(self):
+        """ Tests that a solution matching the lower bound is proven optimal """
+        grid = [["C", "", "K"], ["W", "W", "G"], ["T", "", ""]]
+        result = subgoals.solve(GameplaySequence(grid, 10))
+        self.assertEqual(result.stats['willpower'], solver.minimum_willpower(grid)[0])
+        self.assertTrue(result.stats['proven'])
+        self.assertFalse(result.stats['fallback'])
+        self.assertEqual(result.stats['segments'], [1, 1])
+        self.assertIsInstance(replay(GameplaySequence(grid, 10), result.actions), GameplaySequence.Victory)
+
+    def test_speedup(self):
+        """ Tests that searching between subgoals expands fewer states than the full search """
+        result = subgoals.solve(GameplaySequence(ROOMS, 30), compare = True)
+        self.assertEqual(result.stats['willpower'], result.stats['flat']['willpower'])
+        self.assertLess(result.stats['expanded'], result.stats['flat']['expanded'])
+        self.assertIn('speedup', result.stats)
+        self.assertIsInstance(replay(GameplaySequence(ROOMS, 30), result.actions), GameplaySequence.Victory)
+
+    def test_fallback(self):
+        """ Tests that the full search is used when no kept state can finish the level """
+        ## The Key cannot be reached
+        grid = [["C", "", "W", "K"], ["W", "G", "W", "W"], ["T", "", "", ""]]
+        result = subgoals.solve(GameplaySequence(grid, 10))
+        self.assertTrue(result.stats['fallback'])
+        self.assertTrue(result.stats['proven'])
+        self.assertIsNone(result.actions)
+
+    def test_cached(self):
+        """ Tests that kept intermediate states are reused by later searches """
+        search = subgoals.SubgoalSolver()
+        first = search.solve(GameplaySequence(MAP, 10))
+        second = search.solve(GameplaySequence(MAP, 10))
+        self.assertEqual(first.actions, second.actions)
+        self.assertEqual(second.stats['expanded'], 0)
+        self.assertGreater(second.stats['cached'], 0)
+
+    def test_cached_willpower(self):
+        """ Tests that states kept with more Willpower are not reused by a search with less """
+        search = subgoals.SubgoalSolver()
+        self.assertIsNotNone(search.solve(GameplaySequence(MAP, 30)).actions)
+        result = search.solve(GameplaySequence(MAP, 4))
+        self.assertIsNone(result.actions)
+        self.assertIsNone(result.stats['willpower'])
@@ -0,0 +1,70 @@
+## Test Utility
+import os
+import tempfile
+import unittest
+## Test Target
+from Helltaker import GameplaySequence
+from Helltaker import solver, symmetry
+from Helltaker.cache import LevelCache
+
+from Helltaker.tests.test_gameplay import MAP
+from Helltaker.tests.test_solver import replay
+
+## A laser guarding the Target which the Block must be kicked in front of
+LASERS = [
+    ["",  "",  "2", "" ],
+    ["",  "B", "",  "W"],
+    ["C", "",  "",  "P"],
+    ["",  "W", "",  "T"],
+]
+
+class SymmetryTestCase(unittest.TestCase):
+    def test_transforms(self):
+        self.assertEqual(symmetry.transformgrid([["C", "1", "T"]], "mirrorhorizontal"), [["T", "3", "C"]])
+        self.assertEqual(symmetry.transformgrid([["C", "1", "T"]], "rotate90"), [["C"], ["2"], ["T"]])
+        self.assertEqual(symmetry.transformactions(["up", "RIGHT"], "rotate90"), ["right", "DOWN"])
+        for transform in symmetry.TRANSFORMS:
+            inverse = symmetry.INVERSES[transform]
+            self.assertEqual(symmetry.transformgrid(symmetry.transformgrid(LASERS, transform), inverse), LASERS)
+
+    def test_canonicalize(self):
+        """ Tests that every variant of a level has the same canonical form """
+        canonical, transform = symmetry.canonicalize(MAP)
+        self.assertEqual(symmetry.transformgrid(MAP, transform), canonical)
+        for variant in symmetry.TRANSFORMS:
+            self.assertEqual(symmetry.canonicalize(symmetry.transformgrid(MAP, variant))[0], canonical)
+
+    def test_solutions(self):
+        """ Tests that solutions of a transformed level map back onto the original level """
+        for grid, willpower in [(MAP, 9), (LASERS, 10)]:
+            expected = solver.uniformcost(GameplaySequence(grid, willpower)).stats['willpower']
+            for transform in symmetry.TRANSFORMS:
+                transformed = symmetry.transformgameplay(GameplaySequence(grid, willpower), transform)
+                result = solver.uniformcost(transformed)
+                self.assertEqual(result.stats['willpower'], expected)
+                actions = symmetry.restoreactions(result.actions, transform)
+                self.assertIsInstance(replay(GameplaySequence(grid, willpower), actions), GameplaySequence.Victory)
+
+    def test_symmetric_search(self):
+        """ Tests that symmetric states are only expanded once in a symmetric level """
+        ## The Blocks can be kicked either way, but neither Target can be reached
+        grid = [["T", "", "", "B", "C", "B", "", "", "T"]]
+        plain = solver.uniformcost(GameplaySequence(grid, 12))
+        symmetric = solver.uniformcost(GameplaySequence(grid, 12), symmetric = True)
+        self.assertEqual(plain.stats['willpower'], symmetric.stats['willpower'])
+        self.assertLess(symmetric.stats['expanded'], plain.stats['expanded'])
+
+    def test_unique(self):
+        levels = [dict(grid = MAP, willpower = 9), dict(grid = symmetry.transformgrid(MAP, "rotate270"), willpower = 9),
+                  dict(grid = MAP, willpower = 10)]
+        self.assertEqual(symmetry.unique(levels), [levels[0], levels[2]])
+
+    def test_cache(self):
+        """ Tests that a symmetric LevelCache shares results between variants of a level """
+        with tempfile.TemporaryDirectory() as directory:
+            with LevelCache(os.path.join(directory, "cache.db"), symmetric = True) as cache:
+                cache.uniformcost(GameplaySequence(MAP, 9))
+                mirrored = symmetry.transformgrid(MAP, "mirrorvertical")
+                result = cache.uniformcost(GameplaySequence(mirrored, 9))
+                self.assertEqual(len(cache), 1)
+                self.assertIsInstance(replay(GameplaySequence(mirrored, 9), result.actions), GameplaySequence.Victory)
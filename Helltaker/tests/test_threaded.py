@@ -0,0 +1,51 @@
+## Test Utility
+import unittest
+from unittest import mock
+## Test Target
+from Helltaker import GameplaySequence
+from Helltaker import solver, threaded
+
+from Helltaker.tests.test_gameplay import MAP
+from Helltaker.tests.test_solver import replay
+
+class ThreadedSearchTestCase(unittest.TestCase):
+    def test_solve(self):
+        """ Tests that any number of threads finds a winning solution """
+        for threads in (1, 4):
+            result = threaded.solve(GameplaySequence(MAP, 9), threads = threads, force = True)
+            self.assertEqual(result.stats['threads'], threads)
+            self.assertIsInstance(replay(GameplaySequence(MAP, 9), result.actions), GameplaySequence.Victory)
+
+    def test_optimal(self):
+        expected = solver.uniformcost(GameplaySequence(MAP, 12)).stats['willpower']
+        for threads in (1, 3):
+            result = threaded.solve(GameplaySequence(MAP, 12), threads = threads, optimal = True, force = True)
+            self.assertEqual(result.stats['willpower'], expected)
+            self.assertIsInstance(replay(GameplaySequence(MAP, 12), result.actions), GameplaySequence.Victory)
+
+    def test_unwinnable(self):
+        result = threaded.solve(GameplaySequence(MAP, 4), threads = 3, force = True)
+        self.assertIsNone(result.actions)
+        self.assertGreater(result.stats['expanded'], 0)
+
+    def test_fallback(self):
+        """ Tests that a single thread is used when the GIL is enabled """
+        with mock.patch.object(threaded, "gildisabled", return_value = False):
+            search = threaded.ThreadedSearch(GameplaySequence(MAP, 9), threads = 4)
+            self.assertEqual((search.threads, search.stats['fallback']), (1, True))
+        with mock.patch.object(threaded, "gildisabled", return_value = True):
+            search = threaded.ThreadedSearch(GameplaySequence(MAP, 9), threads = 4)
+            self.assertEqual((search.threads, search.stats['fallback']), (4, False))
+
+    def test_scaling(self):
+        results = threaded.scaling(GameplaySequence(MAP, 9), maxthreads = 3)
+        self.assertEqual([result['threads'] for result in results], [1, 2, 3])
+        self.assertEqual(results[0]['efficiency'], 1.0)
+        self.assertEqual({result['willpower'] for result in results}, {5})
+
+    def test_stripedset(self):
+        keys = threaded.StripedSet(4)
+        self.assertTrue(keys.add(("a", 1)))
+        self.assertFalse(keys.add(("a", 1)))
+        self.assertIn(("a", 1), keys)
+        self.assertEqual(len(keys), 1)
@@ -0,0 +1,66 @@
+## Test Utility
+import unittest
+## Test Target
+from Helltaker import GameplaySequence, Map
+from Helltaker.timeline import Timeline
+
+from Helltaker.tests.test_gameplay import MAP
+
+INPUTS = ["up", "right", "right", "right", "down", "down", "left", "down", "left", "down"]
+
+class TimelineTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        ## Recording every intermediate Map for comparison
+        self.maps = []
+        gameplay = GameplaySequence(MAP, 9)
+        self.maps.append(gameplay.map.copy())
+        for inp in INPUTS:
+            length = len(gameplay.actions)
+            try: gameplay.move(inp)
+            except GameplaySequence.Victory: pass
+            if len(gameplay.actions) != length: self.maps.append(gameplay.map.copy())
+        self.actions = gameplay.actions
+        return super().setUp()
+
+    def test_build(self):
+        """ Tests that the Timeline drops non-actions and records the outcome """
+        for interval in [1, 3, 16]:
+            with self.subTest(interval = interval):
+                timeline = Timeline(MAP, 9, INPUTS, interval = interval)
+                self.assertEqual(timeline.actions, self.actions)
+                self.assertEqual(len(timeline), len(self.actions))
+                self.assertIsInstance(timeline.outcome, GameplaySequence.Victory)
+                self.assertEqual(len(timeline.checkpoints), len(self.actions) // interval + 1)
+
+    def test_seek(self):
+        """ Tests that seeking in any order results in the correct Map """
+        for interval in [1, 3, 16]:
+            timeline = Timeline(MAP, 9, self.actions, interval = interval)
+            for index in [0, 8, 3, 4, 2, 7, 7, 1, 5, -1]:
+                with self.subTest(interval = interval, index = index):
+                    timeline.seek(index)
+                    self.assertEqual(timeline.map, self.maps[index])
+
+    def test_step(self):
+        """ Tests stepping forward and backward through the Timeline """
+        timeline = Timeline(MAP, 9, self.actions, interval = 4)
+        timeline.seek(0)
+        for index in range(1, len(timeline) + 1):
+            self.assertEqual(timeline.forward(), index)
+            self.assertEqual(timeline.map, self.maps[index])
+        for index in reversed(range(len(timeline))):
+            self.assertEqual(timeline.back(), index)
+            self.assertEqual(timeline.map, self.maps[index])
+        self.assertRaises(IndexError, timeline.back)
+        ## Key is picked up by the 6th action
+        self.assertFalse(timeline.haskey)
+        timeline.seek(6)
+        self.assertTrue(timeline.haskey)
+
+    def test_gameplay(self):
+        """ Tests that the GameplaySequence from the Timeline can be continued """
+        timeline = Timeline(MAP, 9, self.actions)
+        timeline.seek(-2)
+        gameplay = timeline.gameplay()
+        self.assertEqual(gameplay.actions, self.actions[:-1])
+        self.assertRaises(GameplaySequence.Victory, gameplay.down)
@@ -0,0 +1,99 @@
+## Test Utility
+import unittest
+## Test Target
+from Helltaker import GameplaySequence
+from Helltaker import solver
+from Helltaker.transposition import ENTRYBYTES, EXACT, LOWER, Entry, TranspositionTable, statehash
+
+from Helltaker.tests.test_gameplay import MAP
+
+def table(policy, ways = 2):
+    """ Returns a table with a single bucket """
+    return TranspositionTable(ENTRYBYTES * ways, policy, ways = ways)
+
+class TranspositionTableTestCase(unittest.TestCase):
+    def test_statehash(self):
+        """ Tests that the hash only depends on the layout and the key """
+        gameplay = GameplaySequence(MAP, 9)
+        self.assertEqual(statehash(gameplay), statehash(GameplaySequence(MAP, 20)))
+        child = gameplay.copy()
+        child.right()
+        self.assertNotEqual(statehash(gameplay), statehash(child))
+        keyed = gameplay.copy()
+        keyed.character.haskey = True
+        self.assertNotEqual(statehash(gameplay), statehash(keyed))
+
+    def test_memory_cap(self):
+        table = TranspositionTable(10000, ways = 4)
+        self.assertLessEqual(table.nbytes, 10000)
+        for key in range(1, 5000): table.store(key, key % 7, 10)
+        self.assertLessEqual(len(table), table.size)
+        self.assertGreater(table.stats['evictions'], 0)
+        self.assertRaises(ValueError, TranspositionTable, ENTRYBYTES)
+        self.assertRaises(ValueError, TranspositionTable, policy = "random")
+
+    def test_lookup(self):
+        tt = table("depth")
+        self.assertIsNone(tt.lookup(5))
+        self.assertTrue(tt.store(5, 3, 10, LOWER))
+        self.assertEqual(tt.lookup(5), Entry(3, 10, LOWER))
+        ## Shallower entries with less Willpower do not replace the existing entry
+        self.assertFalse(tt.store(5, 2, 9))
+        self.assertTrue(tt.store(5, 2, 11))
+        self.assertEqual(tt.lookup(5), Entry(2, 11, EXACT))
+        self.assertEqual((tt.stats['hits'], tt.stats['misses'], tt.stats['updates']), (2, 1, 1))
+
+    def test_policies(self):
+        tt = table("always")
+        for key, depth in [(1, 5), (2, 5), (3, 0)]: tt.store(key, depth, 0)
+        self.assertIn(3, tt)
+        self.assertEqual((len(tt), tt.stats['collisions'], tt.stats['evictions']), (2, 1, 1))
+
+        tt = table("depth")
+        for key, depth in [(1, 5), (2, 4)]: tt.store(key, depth, 0)
+        self.assertFalse(tt.store(3, 3, 0))
+        self.assertEqual(tt.stats['rejected'], 1)
+        self.assertTrue(tt.store(3, 4, 0))
+        self.assertNotIn(2, tt)
+
+        tt = table("lru")
+        for key in (1, 2): tt.store(key, 0, 0)
+        tt.lookup(1)
+        tt.store(3, 0, 0)
+        self.assertEqual((1 in tt, 2 in tt, 3 in tt), (True, False, True))
+
+        tt = table("twotier")
+        tt.store(1, 5, 0)
+        tt.store(2, 1, 0)
+        ## Shallower entries go to the always-replace tier
+        tt.store(3, 2, 0)
+        self.assertEqual((1 in tt, 2 in tt, 3 in tt), (True, False, True))
+        ## Deeper entries demote the depth-preferred entry
+        tt.store(4, 6, 0)
+        self.assertEqual((1 in tt, 3 in tt, 4 in tt), (True, False, True))
+        self.assertEqual(tt.stats['evictions'], 2)
+
+    def test_uniformcost(self):
+        """ Tests that a tiny table changes the work done but not the result """
+        expected = solver.uniformcost(GameplaySequence(MAP, 9))
+        for policy in ("always", "depth", "lru", "twotier"):
+            tt = TranspositionTable(ENTRYBYTES * 2, policy, ways = 2)
+            result = solver.uniformcost(GameplaySequence(MAP, 9), table = tt)
+            self.assertEqual(result.stats['willpower'], expected.stats['willpower'])
+            self.assertLessEqual(len(tt), 2)
+
+    def test_uniformcost_unlimited(self):
+        """ Tests that a table cannot be used to search unlimited Willpower without a limit """
+        gameplay = GameplaySequence(MAP, solver.UNLIMITED)
+        self.assertRaisesRegex(ValueError, "limit", solver.uniformcost, gameplay, table = TranspositionTable(ENTRYBYTES * 2, ways = 2))
+        result = solver.uniformcost(gameplay, limit = 8, table = TranspositionTable(ENTRYBYTES * 2, ways = 2))
+        self.assertEqual(result.stats['willpower'], 5)
+
+    def test_uniformcost_symmetric(self):
+        """ Tests that symmetric states share table entries """
+        grid = [["T", "", "", "B", "C", "B", "", "", "T"]]
+        plain = solver.uniformcost(GameplaySequence(grid, 12), table = TranspositionTable())
+        symmetric = solver.uniformcost(GameplaySequence(grid, 12), table = TranspositionTable(), symmetric = True)
+        self.assertIsNone(symmetric.actions)
+        self.assertLess(symmetric.stats['expanded'], plain.stats['expanded'])
+        self.assertEqual(symmetric.stats['expanded'], solver.uniformcost(GameplaySequence(grid, 12), symmetric = True).stats['expanded'])
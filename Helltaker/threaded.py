@@ -0,0 +1,163 @@
+""" Helltaker.threaded
+
+    Parallel search over GameplaySequence states using threads.
+
+    Unlike a process pool, threads share the level and the visited set, so states never have to be pickled.
+    Each thread owns a deque of states: it pushes and pops its own states at one end (searching depth-first)
+    and steals from the other end of another thread's deque when its own is empty. The visited set is split
+    into lock-striped shards so threads only contend when their states hash to the same stripe.
+
+    Threads only run Python code in parallel on free-threaded (no-GIL) CPython builds: on other builds the
+    search falls back to a single thread unless it is forced to use more (see gildisabled).
+"""
+## Builtin
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import os
+import random
+import sys
+import threading
+import time
+## This Module
+from Helltaker import GameplaySequence
+from Helltaker.solver import SearchResult, statekey, successors
+
+def gildisabled():
+    """ Returns whether the GIL is disabled (CPython 3.13+ free-threaded builds) """
+    return hasattr(sys, "_is_gil_enabled") and not sys._is_gil_enabled()
+
+class StripedSet():
+    """ A set split into stripes, each guarded by its own lock """
+    def __init__(self, stripes: int = 64):
+        self.stripes = [set() for stripe in range(stripes)]
+        self.locks = [threading.Lock() for stripe in range(stripes)]
+
+    def add(self, key):
+        """ Adds the key, returning whether it was not already in the set """
+        index = hash(key) % len(self.stripes)
+        with self.locks[index]:
+            stripe = self.stripes[index]
+            if key in stripe: return False
+            stripe.add(key)
+            return True
+
+    def __contains__(self, key):
+        return key in self.stripes[hash(key) % len(self.stripes)]
+
+    def __len__(self):
+        return sum(len(stripe) for stripe in self.stripes)
+
+class ThreadedSearch():
+    """ A work-stealing search from the gameplay (see the module documentation).
+
+        threads is the number of threads to use (default: every CPU). Unless force is True, a single thread
+            is used when the GIL is enabled (stats['fallback'] records whether that happened).
+        stripes is the number of stripes of the shared visited set.
+    """
+    def __init__(self, gameplay: GameplaySequence, threads: int = None, stripes: int = 64, force: bool = False):
+        self.gameplay = gameplay
+        requested = threads or os.cpu_count() or 1
+        self.threads = requested if force or gildisabled() else 1
+        self.stripes = stripes
+        self.stats = dict(threads = self.threads, requested = requested, gil = not gildisabled(), fallback = self.threads < requested,
+                          expanded = 0, generated = 0, duplicates = 0, steals = 0, elapsed = 0.0, willpower = None)
+
+    def run(self, optimal: bool = False):
+        """ Searches for a sequence of actions which results in Victory.
+
+            If optimal is True every state is searched (pruning states which cannot be cheaper than the best solution
+                found) and the cheapest solution is returned, otherwise the search stops at the first solution.
+            Returns a SearchResult whose actions are the actions taken after the given gameplay's current actions
+                (None if the level cannot be won) and whose stats include the Willpower they require.
+        """
+        gameplay, count = self.gameplay, self.threads
+        offset, spent = len(gameplay.actions), gameplay.action_length()
+        visited = StripedSet(self.stripes)
+        visited.add(statekey(gameplay))
+        deques = [deque() for thread in range(count)]
+        deques[0].append(gameplay)
+        ## pending is the number of states which have been pushed but not yet expanded
+        lock, stop = threading.Lock(), threading.Event()
+        shared = dict(pending = 1, willpower = None, actions = None)
+        counters = [dict(expanded = 0, generated = 0, duplicates = 0, steals = 0) for thread in range(count)]
+
+        def steal(index, rng):
+            victims = list(range(count))
+            rng.shuffle(victims)
+            for victim in victims:
+                if victim == index: continue
+                try:
+                    return deques[victim].popleft()
+                except IndexError:
+                    continue
+            return None
+
+        def worker(index):
+            own, counts, rng = deques[index], counters[index], random.Random(index)
+            try:
+                while not stop.is_set():
+                    try:
+                        current = own.pop()
+                    except IndexError:
+                        if (current := steal(index, rng)) is None:
+                            with lock:
+                                if shared['pending'] == 0: return
+                            time.sleep(0)
+                            continue
+                        counts['steals'] += 1
+                    counts['expanded'] += 1
+                    cost = current.action_length() - spent
+                    children = []
+                    for direction, child, outcome in successors(current):
+                        counts['generated'] += 1
+                        if isinstance(outcome, GameplaySequence.Victory):
+                            ## The winning action only requires 1 Willpower
+                            with lock:
+                                if shared['willpower'] is None or cost + 1 < shared['willpower']:
+                                    shared['willpower'], shared['actions'] = cost + 1, child.actions[offset:]
+                            if not optimal: stop.set()
+                            continue
+                        if outcome is not None: continue
+                        ## Every further solution requires at least 1 more Willpower
+                        if optimal and (best := shared['willpower']) is not None and child.action_length() - spent + 1 >= best: continue
+                        if not visited.add(statekey(child)):
+                            counts['duplicates'] += 1
+                            continue
+                        if child.unwinnable(): continue
+                        children.append(child)
+                    with lock:
+                        shared['pending'] += len(children) - 1
+                    own.extend(children)
+            except BaseException:
+                stop.set()
+                raise
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(count) as pool:
+            futures = [pool.submit(worker, index) for index in range(count)]
+            for future in futures: future.result()
+        self.stats['elapsed'] = time.perf_counter() - start
+        for counts in counters:
+            for name, value in counts.items(): self.stats[name] += value
+        self.stats['willpower'] = shared['willpower']
+        return SearchResult(shared['actions'], self.stats)
+
+def solve(gameplay: GameplaySequence, threads: int = None, optimal: bool = False, force: bool = False):
+    """ Solves the gameplay with a new ThreadedSearch (see ThreadedSearch.run) """
+    return ThreadedSearch(gameplay, threads = threads, force = force).run(optimal = optimal)
+
+def scaling(gameplay: GameplaySequence, maxthreads: int = None, optimal: bool = True):
+    """ Runs the search with 1 to maxthreads threads (default: every CPU), forcing the number of threads.
+
+        Returns a list with a dict for each number of threads: threads, elapsed, expanded, speedup (relative to 1 thread),
+            efficiency (speedup divided by the number of threads) and willpower.
+        Without free-threading the efficiency is expected to fall as threads are added.
+    """
+    results = []
+    for threads in range(1, (maxthreads or os.cpu_count() or 1) + 1):
+        result = ThreadedSearch(gameplay, threads = threads, force = True).run(optimal = optimal)
+        elapsed = result.stats['elapsed']
+        speedup = results[0]['elapsed'] / elapsed if results and elapsed else 1.0
+        results.append(dict(threads = threads, elapsed = elapsed, expanded = result.stats['expanded'], speedup = speedup,
+                            efficiency = speedup / threads, willpower = result.stats['willpower']))
+    return results
@@ -0,0 +1,140 @@
+""" Helltaker.timeline
+
+    Seekable replays of recorded Gameplay.
+
+    A Timeline replays a list of actions once, storing a compact checkpoint of the gamestate every
+    interval actions and the cells that changed with each action. Any action index can then be
+    reached by restoring the nearest checkpoint (or the current position) and applying at most
+    interval deltas, instead of re-running GameplaySequence.move from the start of the level.
+"""
+## This Module
+from Helltaker import Coordinate, Map, GameplaySequence
+
+class Timeline():
+    """ A replay of a GameplaySequence which can be sought to any action index.
+
+        The Timeline is built by replaying the actions through a GameplaySequence. Actions which do not
+            result in an action (moving into a wall) are dropped, so indexes refer to the resulting
+            GameplaySequence.actions list. Replaying stops at the first Victory or GameOver, which is
+            stored on the outcome attribute.
+
+        interval determines how often checkpoints are stored: lower intervals cost a copy of the grid
+            every interval actions but make seeking cheaper (seek applies at most interval-1 deltas
+            from a checkpoint, or fewer if the current position is closer).
+    """
+    def __init__(self, mapgrid: list, willpower: int, actions: list, rulesets: list = True, interval: int = 16):
+        if interval < 1: raise ValueError("interval must be a positive integer")
+        self.interval = interval
+        self.willpower = willpower
+        gameplay = GameplaySequence(mapgrid, willpower, rulesets = rulesets)
+        self.rulesets = gameplay.rulesets
+
+        ## Checkpoints are (grid, character coord, haskey) tuples taken before the action at index*interval
+        self.checkpoints = []
+        ## Deltas are (changed cells, haskey before, haskey after, coord before, coord after) tuples where changed
+        ## cells are (row, column, before, after) tuples
+        self.deltas = []
+        self.outcome = None
+
+        grid = [list(row) for row in gameplay.map.grid]
+        self.checkpoints.append(Timeline._checkpoint(grid, gameplay.character))
+        for action in actions:
+            coord, haskey = gameplay.character.coord, gameplay.character.haskey
+            length = len(gameplay.actions)
+            try:
+                gameplay.move(action.lower())
+            except (GameplaySequence.Victory, GameplaySequence.GameOver) as e:
+                self.outcome = e
+            ## Moves into walls are not actions
+            if len(gameplay.actions) != length:
+                self.deltas.append(Timeline._delta(grid, gameplay, coord, haskey))
+                if len(self.deltas) % interval == 0:
+                    self.checkpoints.append(Timeline._checkpoint(grid, gameplay.character))
+            if self.outcome is not None: break
+
+        self.actions = list(gameplay.actions)
+        ## Current position: the gamestate before the action at self.index
+        self.index = len(self.actions)
+        self._grid = grid
+        self._coord, self._haskey = gameplay.character.coord, gameplay.character.haskey
+
+    @classmethod
+    def _checkpoint(cls, grid, character):
+        return tuple(tuple(row) for row in grid), character.coord, character.haskey
+
+    @classmethod
+    def _delta(cls, grid, gameplay, coord, haskey):
+        """ Determines which cells changed between grid and gameplay's map and updates grid to match gameplay's map """
+        cells = []
+        for r, (old, new) in enumerate(zip(grid, gameplay.map.grid)):
+            if old == new: continue
+            for c, (before, after) in enumerate(zip(old, new)):
+                if before != after:
+                    cells.append((r, c, before, after))
+            grid[r] = list(new)
+        return tuple(cells), haskey, gameplay.character.haskey, coord, gameplay.character.coord
+
+    def __len__(self):
+        return len(self.actions)
+
+    def seek(self, index: int):
+        """ Moves the Timeline to the gamestate before the action at the given index (len(Timeline) being the final gamestate).
+
+            Negative indexes count from the end, as they do with lists.
+            Returns the new index.
+        """
+        if index < 0: index += len(self) + 1
+        if not 0 <= index <= len(self): raise IndexError(f"Timeline index out of range: {index}")
+
+        checkpoint = index // self.interval
+        if abs(index - self.index) > index - checkpoint * self.interval:
+            grid, self._coord, self._haskey = self.checkpoints[checkpoint]
+            self._grid = [list(row) for row in grid]
+            self.index = checkpoint * self.interval
+
+        while self.index < index:
+            cells, _, self._haskey, _, self._coord = self.deltas[self.index]
+            for r, c, before, after in cells:
+                self._grid[r][c] = after
+            self.index += 1
+        while self.index > index:
+            self.index -= 1
+            cells, self._haskey, _, self._coord, _ = self.deltas[self.index]
+            for r, c, before, after in cells:
+                self._grid[r][c] = before
+        return self.index
+
+    def forward(self):
+        """ Steps forward one action. Returns the new index. """
+        return self.seek(self.index + 1)
+
+    def back(self):
+        """ Steps back one action. Returns the new index. """
+        if self.index == 0: raise IndexError("Timeline is already at its first index")
+        return self.seek(self.index - 1)
+
+    def scrub(self, indices):
+        """ Seeks to each index in turn, yielding the Map at that index """
+        for index in indices:
+            self.seek(index)
+            yield self.map
+
+    @property
+    def map(self):
+        """ Returns a copy of the Map at the current index """
+        return Map([list(row) for row in self._grid])
+
+    @property
+    def coord(self):
+        return Coordinate(*self._coord)
+
+    @property
+    def haskey(self):
+        return self._haskey
+
+    def gameplay(self):
+        """ Returns a new GameplaySequence representing the gamestate at the current index """
+        gp = GameplaySequence([list(row) for row in self._grid], self.willpower, self.rulesets)
+        gp.actions = self.actions[:self.index]
+        gp.character.haskey = self._haskey
+        return gp
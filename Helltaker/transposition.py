@@ -0,0 +1,175 @@
+""" Helltaker.transposition
+
+    A bounded transposition table for searches over GameplaySequence states.
+
+    States are identified by a 64-bit hash of their layout and whether the Character has the key (see
+    statehash). Entries are stored in preallocated arrays whose size is fixed by a memory cap, grouped
+    into buckets of a few entries (ways): a state can only be stored in the bucket its hash selects, so
+    when the bucket is full one of its entries is evicted (or the new entry is rejected) according to the
+    replacement policy:
+        always: the new entry always replaces the entry in the slot its hash selects
+        depth: the entry with the smallest depth is replaced, unless it is deeper than the new entry
+        lru: the least recently stored or looked up entry is replaced
+        twotier: the first half of each bucket is depth-preferred and the second half always replaces; entries
+            evicted from the depth-preferred tier are moved to the always-replace tier
+
+    Each entry stores the depth of the search that produced it, the best remaining Willpower the state was
+    reached with and a bound flag (EXACT, LOWER or UPPER) describing the Willpower.
+"""
+## Builtin
+from array import array
+from collections import namedtuple
+import hashlib
+## This Module
+from Helltaker import GameplaySequence
+
+POLICIES = ("always", "depth", "lru", "twotier")
+## Bound flags
+EXACT, LOWER, UPPER = 1, 2, 3
+## keys (Q), depths (i), willpower (i), flags (B) and ages (I)
+ENTRYBYTES = 8 + 4 + 4 + 1 + 4
+## The largest Willpower an entry can hold (more, e.g. solver.UNLIMITED, is stored as this)
+MAXWILLPOWER = 2**31 - 1
+
+Entry = namedtuple("entry", ["depth", "willpower", "flag"])
+
+def statehash(gameplay: GameplaySequence):
+    """ Returns a nonzero 64-bit hash of the gameplay's layout (with the entities in each cell sorted) and whether the Character has the key """
+    layout = "|".join("".join(sorted(cell)) for row in gameplay.map.grid for cell in row)
+    digest = hashlib.blake2b(layout.encode(), digest_size = 8, person = b"K" if gameplay.character.haskey else b"")
+    ## 0 marks empty slots
+    return int.from_bytes(digest.digest(), "little") or 1
+
+class TranspositionTable():
+    """ A fixed-size table of search entries keyed by statehash (see the module documentation).
+
+        maxbytes is the hard cap on the memory used by the entries.
+        policy is the replacement policy (one of POLICIES) and ways the number of entries in each bucket.
+        Raises a ValueError if the policy is unknown or maxbytes cannot hold a single bucket.
+
+        stats:
+            probes/hits/misses: calls to lookup and whether the state was found
+            collisions: lookups and stores which found their bucket occupied only by other states
+            stores/updates: new entries stored, and stores which updated an existing entry for the state
+            evictions/rejected: entries replaced by a new entry, and stores which were rejected by the policy
+    """
+    def __init__(self, maxbytes: int = 64 * 2**20, policy: str = "depth", ways: int = 4):
+        if policy not in POLICIES: raise ValueError(f"Unknown replacement policy: {policy}")
+        if policy == "twotier" and ways < 2: raise ValueError("The twotier policy requires at least 2 ways")
+        self.policy = policy
+        self.ways = ways
+        self.buckets = maxbytes // (ENTRYBYTES * ways)
+        if self.buckets < 1: raise ValueError(f"maxbytes is too small for a bucket of {ways} entries")
+        self.size = self.buckets * ways
+        self.keys = array("Q", bytes(8 * self.size))
+        self.depths = array("i", bytes(4 * self.size))
+        self.willpower = array("i", bytes(4 * self.size))
+        self.flags = array("B", bytes(self.size))
+        self.ages = array("I", bytes(4 * self.size))
+        self.clock = 0
+        self.count = 0
+        self.stats = dict(probes = 0, hits = 0, misses = 0, collisions = 0, stores = 0, updates = 0, evictions = 0, rejected = 0)
+
+    @property
+    def nbytes(self):
+        """ The memory used by the entries """
+        return self.size * ENTRYBYTES
+
+    def bucket(self, key: int):
+        """ Returns the index of the first slot of the key's bucket """
+        return (key % self.buckets) * self.ways
+
+    def find(self, key: int):
+        """ Returns the slot containing the key (None if it is not stored) """
+        start = self.bucket(key)
+        keys = self.keys
+        for slot in range(start, start + self.ways):
+            if keys[slot] == key: return slot
+        return None
+
+    def lookup(self, key: int):
+        """ Returns the Entry stored for the key (None if it is not stored) """
+        stats = self.stats
+        stats['probes'] += 1
+        slot = self.find(key)
+        if slot is None:
+            stats['misses'] += 1
+            start = self.bucket(key)
+            if all(self.keys[start: start + self.ways]): stats['collisions'] += 1
+            return None
+        stats['hits'] += 1
+        if self.policy == "lru": self.touch(slot)
+        return Entry(self.depths[slot], self.willpower[slot], self.flags[slot])
+
+    def touch(self, slot: int):
+        self.clock += 1
+        self.ages[slot] = self.clock & 0xFFFFFFFF
+
+    def write(self, slot: int, key: int, depth: int, willpower: int, flag: int):
+        self.keys[slot], self.depths[slot], self.willpower[slot], self.flags[slot] = key, depth, min(willpower, MAXWILLPOWER), flag
+        self.touch(slot)
+
+    def victim(self, key: int, depth: int, start: int):
+        """ Returns the slot the policy replaces with a new entry in a full bucket (None if the new entry is rejected) """
+        ways, depths = self.ways, self.depths
+        if self.policy == "always":
+            return start + (key // self.buckets) % ways
+        if self.policy == "lru":
+            return min(range(start, start + ways), key = lambda slot: self.ages[slot])
+        if self.policy == "depth":
+            slot = min(range(start, start + ways), key = lambda slot: depths[slot])
+            return slot if depth >= depths[slot] else None
+        ## twotier
+        tier = ways // 2
+        always = start + tier + (key // self.buckets) % (ways - tier)
+        slot = min(range(start, start + tier), key = lambda slot: depths[slot])
+        if depth >= depths[slot]:
+            ## The depth-preferred entry is demoted to the always-replace tier
+            self.write(always, self.keys[slot], depths[slot], self.willpower[slot], self.flags[slot])
+            return slot
+        return always
+
+    def store(self, key: int, depth: int, willpower: int, flag: int = EXACT):
+        """ Stores an entry for the key. Returns whether the entry was stored.
+
+            An existing entry for the key is replaced if the new entry is at least as deep or reaches the state with
+                more remaining Willpower.
+        """
+        stats = self.stats
+        slot = self.find(key)
+        if slot is not None:
+            if depth < self.depths[slot] and willpower <= self.willpower[slot]: return False
+            self.write(slot, key, depth, willpower, flag)
+            stats['updates'] += 1
+            return True
+        start = self.bucket(key)
+        for slot in range(start, start + self.ways):
+            if not self.keys[slot]:
+                self.write(slot, key, depth, willpower, flag)
+                self.count += 1
+                stats['stores'] += 1
+                return True
+        stats['collisions'] += 1
+        if (slot := self.victim(key, depth, start)) is None:
+            stats['rejected'] += 1
+            return False
+        self.write(slot, key, depth, willpower, flag)
+        stats['stores'] += 1
+        stats['evictions'] += 1
+        return True
+
+    def __contains__(self, key: int):
+        return self.find(key) is not None
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        """ Removes every entry (the stats are kept) """
+        for values in (self.keys, self.depths, self.willpower, self.flags, self.ages):
+            values[:] = array(values.typecode, bytes(values.itemsize * self.size))
+        self.count = 0
+        self.clock = 0
+
+    def hitrate(self):
+        return self.stats['hits'] / self.stats['probes'] if self.stats['probes'] else 0.0